@@ -1,3 +1,4 @@
+import functools
 import glob
 import json
 import os
@@ -12,12 +13,35 @@ from PyQt6.QtWidgets import (QCheckBox, QComboBox, QGraphicsItem,
                              QGraphicsProxyWidget, QGraphicsScene,
                              QGraphicsTextItem, QLineEdit, QSpinBox)
 
+from .node_map import write_node_map
+
 
 BLOCK_WIDTH = 286
 HEADER_HEIGHT = 40
 INPUT_ROW_HEIGHT = 38
 SOCKET_RADIUS = 7
 VARIABLE_TOKEN_RE = re.compile(r"^%var\[([^\]]+)\]$")
+# Memory-to-memory operands that variable choices can produce, lowered by
+# VisualBlock._normalize_line into valid 16-bit NASM.
+EXPLICIT_MEMORY_RE = re.compile(
+    r"^(\s*)(mov|add|sub|cmp|and|or|xor|test)\s+(byte|word)\s+"
+    r"(\[[^,]+\])\s*,\s*(\[[^\]]+\])(\s*;.*)?$",
+    re.IGNORECASE,
+)
+IMPLICIT_MOVE_RE = re.compile(
+    r"^(\s*)mov\s+(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\]"
+    r"(\s*;.*)?$",
+    re.IGNORECASE,
+)
+VARIABLE_SHIFT_RE = re.compile(
+    r"^(\s*)(shl|shr|sal|sar|rol|ror)\s+(byte|word)\s+"
+    r"(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\](\s*;.*)?$",
+    re.IGNORECASE,
+)
+REWRITTEN_OPCODES = {
+    "mov", "add", "sub", "cmp", "and", "or", "xor", "test",
+    "shl", "shr", "sal", "sar", "rol", "ror",
+}
 
 
 def _assembly_string_bytes(value):
@@ -98,7 +122,153 @@ def load_block_definitions(paths):
             order.append(key)
         if key not in unique or block.get("override"):
             unique[key] = block
-    return [unique[key] for key in order], errors
+    result = [unique[key] for key in order]
+    for block in result:
+        input_variable_types(block["name"], block.get("asm_code", ""), block.get("inputs", []))
+    return result, errors
+
+
+class CompiledTemplate:
+    """An asm template split once into literal text and {input} placeholders.
+
+    chunks holds (parts, normalize) pairs, where parts alternates literal text
+    and input names. Only lines that can turn into memory-to-memory operands
+    once their inputs are filled in are marked for normalization; every other
+    line is copied through as it is.
+    """
+
+    def __init__(self, template, keys):
+        self.keys = set()
+        self.chunks = []
+        placeholder = re.compile("|".join(re.escape("{" + key + "}") for key in keys)) if keys else None
+        for line in str(template).splitlines():
+            parts = [""]
+            position = 0
+            for match in placeholder.finditer(line) if placeholder else ():
+                parts[-1] += line[position:match.start()]
+                parts.extend((match.group()[1:-1], ""))
+                position = match.end()
+            parts[-1] += line[position:]
+            self.keys.update(parts[1::2])
+            self._append(parts, self._may_normalize(parts))
+
+    @staticmethod
+    def _may_normalize(parts):
+        if len(parts) == 1:
+            line = parts[0]
+            return bool(EXPLICIT_MEMORY_RE.match(line) or IMPLICIT_MOVE_RE.match(line)
+                        or VARIABLE_SHIFT_RE.match(line))
+        head = parts[0].lstrip()
+        words = head.split(None, 1)
+        if not words or (len(words) == 1 and not head[-1].isspace()):
+            # The opcode itself comes from, or runs into, an input.
+            return True
+        return words[0].lower() in REWRITTEN_OPCODES
+
+    def _append(self, parts, normalize):
+        if self.chunks and not normalize and not self.chunks[-1][1]:
+            previous = self.chunks[-1][0]
+            previous[-1] += "\n" + parts[0]
+            previous.extend(parts[1:])
+            return
+        if self.chunks:
+            # The newline between chunks goes at the start of the new chunk.
+            parts[0] = "\n" + parts[0]
+        self.chunks.append((parts, normalize))
+
+    def render(self, values, normalize_line):
+        output = []
+        for parts, normalize in self.chunks:
+            text = parts[0] if len(parts) == 1 else "".join(
+                values[part] if index % 2 else part for index, part in enumerate(parts)
+            )
+            if normalize:
+                lead = "\n" if text.startswith("\n") else ""
+                text = lead + "\n".join(
+                    normalized
+                    for line in text[len(lead):].splitlines() or [""]
+                    for normalized in normalize_line(line)
+                )
+            output.append(text)
+        return "".join(output)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template, keys):
+    """The CompiledTemplate for template with the given input names, built once per definition."""
+    return CompiledTemplate(template, keys)
+
+
+def input_variable_types(block_name, template, inputs):
+    """{input name: (variable mode, expected variable types)} for a block definition.
+
+    The answer depends only on the block name, its template and each input's
+    name and explicit variable_mode, so the table is built once per definition
+    and shared by every block created from it.
+    """
+    key = tuple(
+        (str(item.get("name", "")), str(item.get("variable_mode", "")).strip().lower())
+        for item in inputs if isinstance(item, dict)
+    )
+    return _input_variable_types(str(block_name), str(template), key)
+
+
+@functools.lru_cache(maxsize=None)
+def _input_variable_types(block_name, template, inputs):
+    table = {}
+    for name, explicit in inputs:
+        if name not in table:
+            mode = explicit or _variable_mode(block_name, template, name)
+            table[name] = (mode, frozenset(_expected_variable_types(template, name, mode)))
+    return table
+
+
+def _variable_mode(block_name, template, name):
+    upper_name = name.upper()
+    if upper_name in VariableInputCombo.STRUCTURAL_INPUTS:
+        return "structural"
+    if block_name in {"Print to Screen (Text)", "Print to Screen (Graphics)"} \
+            and upper_name == "TEXT":
+        return "text"
+    placeholder = re.escape("{" + name + "}")
+    if re.search(
+            rf"(?mi)^\s*[^;]*(?:db|dw|dd|dq|equ|times|align|incbin)\b[^\n]*{placeholder}",
+            template):
+        return "none"
+    if re.search(rf"(?:{placeholder}\s*[-+*/]|[-+*/]\s*{placeholder})", template):
+        return "none"
+    if re.search(
+            rf"(?mi)^\s*{placeholder}\s+(?:equ|db|dw|dd|dq|times|incbin)\b",
+            template):
+        return "definition"
+    if re.search(rf"\[\s*{placeholder}\s*(?:\]|\+|-)", template):
+        return "symbol"
+    if upper_name in {
+        "ADDRESS", "BUFFER", "STRING", "SOURCE", "DESTINATION", "ARRAY",
+        "DATA", "SPRITE", "LOCAL_VAR", "LEFT_STRING", "RIGHT_STRING",
+    }:
+        return "address"
+    if re.search(rf"(?mi)^\s*mov\s+(?:si|di)\s*,\s*{placeholder}\s*$", template):
+        return "address"
+    return "value"
+
+
+def _expected_variable_types(template, name, mode):
+    if mode == "text":
+        return {"text", "buffer", "byte", "word"}
+    if mode == "address":
+        return {"text", "buffer", "byte-array", "word-array"}
+
+    placeholder = re.escape("{" + name + "}")
+    if re.search(rf"(?i)\bbyte\s*\[\s*{placeholder}", template) \
+            or re.search(rf"(?i)\bmov\s+\[\s*{placeholder}\s*\]\s*,\s*(?:al|bl|cl|dl)\b", template) \
+            or re.search(rf"(?i)\bmov\s+(?:al|bl|cl|dl)\s*,\s*{placeholder}\b", template):
+        return {"byte"}
+    if re.search(rf"(?i)\bword\s*\[\s*{placeholder}", template) \
+            or re.search(rf"(?i)\bmov\s+\[\s*{placeholder}\s*\]\s*,\s*(?:ax|bx|cx|dx|si|di|bp|sp)\b", template) \
+            or re.search(rf"(?i)\bmov\s+(?:ax|bx|cx|dx|si|di|bp|sp)\s*,\s*{placeholder}\b", template):
+        return {"word"}
+    return set()
 
 
 def _safe_color(value, fallback="#3b82f6"):
@@ -565,6 +735,16 @@ class VisualBlock(QGraphicsObject):
         self.theme_color = None
         self.theme_accent = QColor("#6ee7f9")
         self.is_vibrant = False
+        # Share of profiler samples (0..1) spent in this node, or None when not profiled.
+        self.heat = None
+        self.heat_label = ""
+        # Static size/cycle estimate from the last build, or "" when there is none.
+        self.cost_label = ""
+        # (variable types looked up, (asm, helpers)) from the last render; None marks the node dirty.
+        self._code_cache = None
+        self._variable_lookups = None
+        # (variable mode, expected variable types) per input, shared by every instance of the definition.
+        self.input_types = input_variable_types(name, asm_code, self.input_list)
         self.input_widgets = {}
         self.node_id = str(self.metadata.get("node_id") or uuid.uuid4().hex)
         self._is_updating = False
@@ -771,6 +951,44 @@ class VisualBlock(QGraphicsObject):
         painter.setPen(QPen(QColor(255, 255, 255, 34), 1))
         painter.drawLine(QPointF(1, HEADER_HEIGHT), QPointF(self.node_width - 1, HEADER_HEIGHT))
 
+        if self.cost_label:
+            self.paint_cost(painter)
+        if self.heat is not None:
+            self.paint_heat(painter, body_rect)
+
+    def paint_cost(self, painter):
+        cost_font = QFont("Segoe UI", 7)
+        cost_font.setBold(True)
+        painter.setFont(cost_font)
+        badge = QRectF(42, HEADER_HEIGHT + 7, self.node_width - 84, 15)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 110))
+        painter.drawRoundedRect(badge, 5, 5)
+        painter.setPen(QColor("#c7d2e0"))
+        painter.drawText(badge, Qt.AlignmentFlag.AlignCenter, self.cost_label)
+
+    def paint_heat(self, painter, body_rect):
+        heat = max(0.0, min(1.0, self.heat))
+        # Cold nodes fade to blue, hot ones glow red.
+        color = QColor.fromHsvF((1.0 - heat) * 0.66, 0.85, 1.0)
+        overlay = QColor(color)
+        overlay.setAlpha(int(25 + heat * 95))
+        heat_path = QPainterPath()
+        heat_path.addRoundedRect(body_rect, 9, 9)
+        painter.fillPath(heat_path, overlay)
+        painter.setPen(QPen(color, 3))
+        painter.drawRoundedRect(body_rect, 9, 9)
+        if self.heat_label:
+            badge_font = QFont("Segoe UI", 8)
+            badge_font.setBold(True)
+            painter.setFont(badge_font)
+            badge = QRectF(self.node_width - 86, self.node_height - 22, 78, 16)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(0, 0, 0, 170))
+            painter.drawRoundedRect(badge, 5, 5)
+            painter.setPen(color)
+            painter.drawText(badge, Qt.AlignmentFlag.AlignCenter, self.heat_label)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Delete and not self.is_start:
             scene = self.scene()
@@ -803,12 +1021,24 @@ class VisualBlock(QGraphicsObject):
         return super().itemChange(change, value)
 
     def on_input_changed(self, *args):
+        self._code_cache = None
         scene = self.scene()
         if scene:
             if hasattr(scene, "update_callback") and scene.update_callback:
                 scene.update_callback()
             scene.save_blocks_to_project()
 
+    def set_heat(self, heat, label=""):
+        if self.heat != heat or self.heat_label != label:
+            self.heat = heat
+            self.heat_label = label
+            self.update()
+
+    def set_cost(self, label):
+        if self.cost_label != label:
+            self.cost_label = label
+            self.update()
+
     def set_vibrant(self, active):
         if self.is_vibrant != active:
             self.is_vibrant = active
@@ -882,62 +1112,20 @@ class VisualBlock(QGraphicsObject):
 
     def variable_mode(self, name):
         """Describe how a selected variable is used by this template input."""
-        definition = self.input_definition(name)
-        explicit = str(definition.get("variable_mode", "")).strip().lower()
-        if explicit:
-            return explicit
-
-        upper_name = str(name).upper()
-        if upper_name in VariableInputCombo.STRUCTURAL_INPUTS:
-            return "structural"
-        if self.block_name in {"Print to Screen (Text)", "Print to Screen (Graphics)"} \
-                and upper_name == "TEXT":
-            return "text"
-        placeholder = re.escape("{" + str(name) + "}")
-        if re.search(
-                rf"(?mi)^\s*[^;]*(?:db|dw|dd|dq|equ|times|align|incbin)\b[^\n]*{placeholder}",
-                self.asm_template):
-            return "none"
-        if re.search(rf"(?:{placeholder}\s*[-+*/]|[-+*/]\s*{placeholder})",
-                     self.asm_template):
-            return "none"
-        if re.search(
-                rf"(?mi)^\s*{placeholder}\s+(?:equ|db|dw|dd|dq|times|incbin)\b",
-                self.asm_template):
-            return "definition"
-        if re.search(rf"\[\s*{placeholder}\s*(?:\]|\+|-)", self.asm_template):
-            return "symbol"
-        if upper_name in {
-            "ADDRESS", "BUFFER", "STRING", "SOURCE", "DESTINATION", "ARRAY",
-            "DATA", "SPRITE", "LOCAL_VAR", "LEFT_STRING", "RIGHT_STRING",
-        }:
-            return "address"
-        if re.search(rf"(?mi)^\s*mov\s+(?:si|di)\s*,\s*{placeholder}\s*$",
-                     self.asm_template):
-            return "address"
-        return "value"
+        entry = self.input_types.get(str(name))
+        if entry:
+            return entry[0]
+        return _variable_mode(self.block_name, self.asm_template, str(name))
 
     def input_allows_variables(self, name):
         return self.variable_mode(name) not in {"structural", "definition", "none"}
 
     def expected_variable_types(self, name):
+        entry = self.input_types.get(str(name))
+        if entry:
+            return set(entry[1])
         mode = self.variable_mode(name)
-        if mode == "text":
-            return {"text", "buffer", "byte", "word"}
-        if mode == "address":
-            return {"text", "buffer", "byte-array", "word-array"}
-
-        placeholder = re.escape("{" + str(name) + "}")
-        template = self.asm_template
-        if re.search(rf"(?i)\bbyte\s*\[\s*{placeholder}", template) \
-                or re.search(rf"(?i)\bmov\s+\[\s*{placeholder}\s*\]\s*,\s*(?:al|bl|cl|dl)\b", template) \
-                or re.search(rf"(?i)\bmov\s+(?:al|bl|cl|dl)\s*,\s*{placeholder}\b", template):
-            return {"byte"}
-        if re.search(rf"(?i)\bword\s*\[\s*{placeholder}", template) \
-                or re.search(rf"(?i)\bmov\s+\[\s*{placeholder}\s*\]\s*,\s*(?:ax|bx|cx|dx|si|di|bp|sp)\b", template) \
-                or re.search(rf"(?i)\bmov\s+(?:ax|bx|cx|dx|si|di|bp|sp)\s*,\s*{placeholder}\b", template):
-            return {"word"}
-        return set()
+        return _expected_variable_types(self.asm_template, str(name), mode)
 
     def compatible_variables(self, name, variables):
         expected = self.expected_variable_types(name)
@@ -948,15 +1136,18 @@ class VisualBlock(QGraphicsObject):
 
     def variable_info(self, variable_name):
         scene = self.scene()
-        provider = getattr(scene, "variable_provider", None) if scene else None
-        variables = provider() if callable(provider) else []
-        return next(
-            (item for item in variables
-             if str(item.get("name", "")).casefold() == variable_name.casefold()),
-            {"name": variable_name, "type": "byte"},
-        )
+        if scene is not None and hasattr(scene, "variable_info"):
+            info = scene.variable_info(variable_name)
+        else:
+            info = {"name": variable_name, "type": "byte"}
+        if self._variable_lookups is not None:
+            self._variable_lookups[variable_name.casefold()] = info.get("type")
+        return info
 
     def render_input_value(self, name, value):
+        if self.input_definition(name).get("encoding") == "bytes":
+            # Text placed in a db line as numbers, so quotes cannot break the string.
+            return _assembly_string_bytes(value) if str(value) else "''"
         match = VARIABLE_TOKEN_RE.fullmatch(str(value).strip())
         if not match:
             return str(value)
@@ -969,66 +1160,44 @@ class VisualBlock(QGraphicsObject):
         return f"[{variable_name}]"
 
     def render_template(self, template):
-        code = str(template)
-        for key, value in self.input_values().items():
-            code = code.replace(f"{{{key}}}", self.render_input_value(key, value))
-        return self._normalize_variable_operands(code)
-
-    def _normalize_variable_operands(self, code):
-        """Lower memory-to-memory variable choices into valid 16-bit NASM."""
-        output = []
-        explicit_memory = re.compile(
-            r"^(\s*)(mov|add|sub|cmp|and|or|xor|test)\s+(byte|word)\s+"
-            r"(\[[^,]+\])\s*,\s*(\[[^\]]+\])(\s*;.*)?$",
-            re.IGNORECASE,
-        )
-        implicit_move = re.compile(
-            r"^(\s*)mov\s+(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\]"
-            r"(\s*;.*)?$",
-            re.IGNORECASE,
-        )
-        variable_shift = re.compile(
-            r"^(\s*)(shl|shr|sal|sar|rol|ror)\s+(byte|word)\s+"
-            r"(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\](\s*;.*)?$",
-            re.IGNORECASE,
-        )
-        for line in str(code).splitlines():
-            match = explicit_memory.match(line)
-            if match:
-                indent, opcode, size, destination, source, comment = match.groups()
-                register = "al" if size.lower() == "byte" else "ax"
-                output.extend((
-                    f"{indent}push ax",
-                    f"{indent}mov {register}, {source}",
-                    f"{indent}{opcode} {size} {destination}, {register}{comment or ''}",
-                    f"{indent}pop ax",
-                ))
-                continue
-            match = implicit_move.match(line)
-            if match:
-                indent, destination, source_name, comment = match.groups()
-                source_type = self.variable_info(source_name).get("type", "byte")
-                size = "word" if source_type == "word" else "byte"
-                register = "ax" if size == "word" else "al"
-                output.extend((
-                    f"{indent}push ax",
-                    f"{indent}mov {register}, [{source_name}]",
-                    f"{indent}mov {size} {destination}, {register}{comment or ''}",
-                    f"{indent}pop ax",
-                ))
-                continue
-            match = variable_shift.match(line)
-            if match:
-                indent, opcode, size, destination, source_name, comment = match.groups()
-                output.extend((
-                    f"{indent}push cx",
-                    f"{indent}mov cl, [{source_name}]",
-                    f"{indent}{opcode} {size} {destination}, cl{comment or ''}",
-                    f"{indent}pop cx",
-                ))
-                continue
-            output.append(line)
-        return "\n".join(output)
+        compiled = compile_template(str(template), tuple(self.input_widgets))
+        values = {key: self.render_input_value(key, self.get_input_value(key)) for key in compiled.keys}
+        return compiled.render(values, self._normalize_line)
+
+    def _normalize_line(self, line):
+        """Lower a memory-to-memory variable choice into valid 16-bit NASM."""
+        match = EXPLICIT_MEMORY_RE.match(line)
+        if match:
+            indent, opcode, size, destination, source, comment = match.groups()
+            register = "al" if size.lower() == "byte" else "ax"
+            return (
+                f"{indent}push ax",
+                f"{indent}mov {register}, {source}",
+                f"{indent}{opcode} {size} {destination}, {register}{comment or ''}",
+                f"{indent}pop ax",
+            )
+        match = IMPLICIT_MOVE_RE.match(line)
+        if match:
+            indent, destination, source_name, comment = match.groups()
+            source_type = self.variable_info(source_name).get("type", "byte")
+            size = "word" if source_type == "word" else "byte"
+            register = "ax" if size == "word" else "al"
+            return (
+                f"{indent}push ax",
+                f"{indent}mov {register}, [{source_name}]",
+                f"{indent}mov {size} {destination}, {register}{comment or ''}",
+                f"{indent}pop ax",
+            )
+        match = VARIABLE_SHIFT_RE.match(line)
+        if match:
+            indent, opcode, size, destination, source_name, comment = match.groups()
+            return (
+                f"{indent}push cx",
+                f"{indent}mov cl, [{source_name}]",
+                f"{indent}{opcode} {size} {destination}, cl{comment or ''}",
+                f"{indent}pop cx",
+            )
+        return (line,)
 
     @staticmethod
     def _string_print_routine(function_name, graphics=False):
@@ -1141,6 +1310,22 @@ class VisualBlock(QGraphicsObject):
         if scene and hasattr(scene, "remove_node"):
             scene.remove_node(self)
 
+    def rendered_code(self):
+        """(asm, helpers) for this node, rendered again only after one of its inputs
+        changed or a variable it looked up has a different type."""
+        cache = self._code_cache
+        if cache is not None and all(
+                self.variable_info(name).get("type") == value_type
+                for name, value_type in cache[0].items()):
+            return cache[1]
+        self._variable_lookups = {}
+        try:
+            code = (self.get_asm(), [self.render_template(helper) for helper in self.req_funcs])
+        finally:
+            lookups, self._variable_lookups = self._variable_lookups, None
+        self._code_cache = (lookups, code)
+        return code
+
     def get_asm(self):
         if self.is_start or self.is_entry:
             label_text = self.get_input_value("Function").strip()
@@ -1160,6 +1345,9 @@ class BlockCanvas(QGraphicsScene):
         super().__init__(-2500, -2500, 5000, 5000, parent)
         self.update_callback = None
         self.variable_provider = None
+        # name.casefold() -> variable, read from the provider once per generate_code.
+        self._variable_index = None
+        self._generating = False
         self.definition_provider = None
         self.start_block = None
         self.project_dir = None
@@ -1167,9 +1355,25 @@ class BlockCanvas(QGraphicsScene):
         self.pending_edge = None
         self.pending_socket = None
         self.active_theme = None
+        self.node_spans = []
+        # Function entry nodes, kept up to date so regeneration need not scan every scene item.
+        self.entry_blocks = set()
         self.setBackgroundBrush(QBrush(QColor("#071421")))
         self.reset_canvas()
 
+    def addItem(self, item):
+        super().addItem(item)
+        if isinstance(item, VisualBlock) and item.is_entry:
+            self.entry_blocks.add(item)
+
+    def removeItem(self, item):
+        self.entry_blocks.discard(item)
+        super().removeItem(item)
+
+    def clear(self):
+        self.entry_blocks.clear()
+        super().clear()
+
     def _new_start_block(self):
         definition = {
             "name": "START",
@@ -1357,10 +1561,7 @@ class BlockCanvas(QGraphicsScene):
 
     def execution_roots(self):
         roots = [self.start_block] if self.start_block else []
-        entries = [
-            item for item in self.items()
-            if isinstance(item, VisualBlock) and item.is_entry
-        ]
+        entries = list(self.entry_blocks)
         entries.sort(key=lambda item: (item.pos().y(), item.pos().x(), item.node_id))
         roots.extend(entries)
         return roots
@@ -1390,10 +1591,36 @@ class BlockCanvas(QGraphicsScene):
         self.refresh_vibrancy()
         self.save_blocks_to_project()
 
+    def variable_info(self, variable_name):
+        index = self._variable_index
+        if index is None:
+            variables = self.variable_provider() if callable(self.variable_provider) else []
+            index = {}
+            for item in variables:
+                index.setdefault(str(item.get("name", "")).casefold(), item)
+            if self._generating:
+                self._variable_index = index
+        return index.get(variable_name.casefold(), {"name": variable_name, "type": "byte"})
+
     def generate_code(self):
+        """Return the assembly for every chain and record node_spans.
+
+        node_spans lists (node_id, first_line, last_line) for the 1-based lines
+        each node produced; shared helpers count towards the first node that
+        required them. Nodes whose inputs have not changed reuse their last
+        rendered fragments.
+        """
+        self.node_spans = []
         if not self.start_block:
             return ""
+        self._generating = True
+        try:
+            return self._generate_code()
+        finally:
+            self._generating = False
+            self._variable_index = None
 
+    def _generate_code(self):
         chain_codes = []
         helpers = []
         helper_set = set()
@@ -1401,33 +1628,49 @@ class BlockCanvas(QGraphicsScene):
         roots = self.execution_roots()
         for root in roots:
             chain_output = []
+            chain_spans = []
+            line = 0
             current = root
             while current and current not in visited:
                 visited.add(current)
-                block_asm = current.get_asm()
+                block_asm, rendered_helpers = current.rendered_code()
                 if block_asm:
+                    count = block_asm.count("\n") + 1
+                    chain_spans.append((current.node_id, line, line + count - 1))
+                    line += count
                     chain_output.append(block_asm)
-                for helper in current.req_funcs:
-                    rendered = current.render_template(helper)
+                for rendered in rendered_helpers:
                     if rendered not in helper_set:
-                        helpers.append(rendered)
+                        helpers.append((current.node_id, rendered))
                         helper_set.add(rendered)
                 current = self.next_block(current)
             if chain_output:
-                chain_codes.append((root, "\n".join(chain_output)))
+                chain_codes.append((root, "\n".join(chain_output), chain_spans))
 
-        main_chains = [code for root, code in chain_codes if root is self.start_block]
-        function_chains = [code for root, code in chain_codes if root is not self.start_block]
+        main_chains = [(code, spans) for root, code, spans in chain_codes if root is self.start_block]
+        function_chains = [(code, spans) for root, code, spans in chain_codes if root is not self.start_block]
         output_sections = list(main_chains)
         if function_chains:
-            output_sections.append("jmp __oc_functions_end")
+            output_sections.append(("jmp __oc_functions_end", []))
             output_sections.extend(function_chains)
-            output_sections.append("__oc_functions_end:")
-        full_code = "\n".join(output_sections)
+            output_sections.append(("__oc_functions_end:", []))
+        offset = 0
+        for code, spans in output_sections:
+            self.node_spans.extend(
+                (node_id, offset + first + 1, offset + last + 1) for node_id, first, last in spans
+            )
+            offset += code.count("\n") + 1
+        full_code = "\n".join(code for code, spans in output_sections)
         if helpers:
+            # A blank line and the jump come first, so helpers start two lines further down.
+            offset += 2
+            for node_id, rendered in helpers:
+                count = rendered.count("\n") + 1
+                self.node_spans.append((node_id, offset + 1, offset + count))
+                offset += count
             full_code += (
                 "\n\njmp __oc_helpers_end\n"
-                + "\n".join(helpers)
+                + "\n".join(rendered for node_id, rendered in helpers)
                 + "\n__oc_helpers_end:"
             )
 
@@ -1436,6 +1679,26 @@ class BlockCanvas(QGraphicsScene):
         full_code = re.sub(r"%var\[([^\]]+)\]", r"[\1]", full_code)
         return full_code
 
+    def save_node_map(self, code, project_dir=None, current_file_name=None):
+        """Store node_spans for code next to the saved graph."""
+        project_dir = project_dir or self.project_dir
+        file_name = current_file_name or self.current_filename
+        if project_dir and file_name:
+            write_node_map(project_dir, file_name, code, self.node_spans)
+
+    def apply_heat(self, heat_by_node):
+        """Tint nodes by profiler heat; heat_by_node maps node_id to (heat, label)."""
+        for item in self.items():
+            if isinstance(item, VisualBlock):
+                heat, label = heat_by_node.get(item.node_id, (None, ""))
+                item.set_heat(heat, label)
+
+    def apply_costs(self, cost_by_node):
+        """Show size/cycle badges; cost_by_node maps node_id to a label from CostReport.node_badges."""
+        for item in self.items():
+            if isinstance(item, VisualBlock):
+                item.set_cost(cost_by_node.get(item.node_id, ""))
+
     def save_blocks_to_project(self, project_dir=None, current_file_name=None):
         project_dir = project_dir or self.project_dir
         file_name = current_file_name or self.current_filename
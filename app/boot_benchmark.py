@@ -0,0 +1,274 @@
+"""Boot-to-marker latency benchmark with a per-project history in build/perf-history.jsonl.
+
+QEMU starts paused; the clock starts when QMP resumes it, so emulator start-up
+is not counted. The boot time ends at the first byte the guest writes to the
+debug console (port 0xE9), or at the first configured marker byte. Frame time
+is the median interval between later frame marker bytes.
+"""
+
+import hashlib
+import json
+import math
+import os
+import statistics
+import subprocess
+import threading
+import time
+
+from .boot_image import has_boot_image
+from .debugcon import DebugConsoleListener
+from .emulator import DEFAULT_BOOT_DRIVE, boot_drive_args
+from .qmp import QMPClient, QMPError, free_port, qmp_argument
+
+HISTORY_NAME = "perf-history.jsonl"
+DEFAULT_SETTINGS = {
+    "marker": None,
+    "frame_marker": None,
+    "frames": 10,
+    "repeats": 5,
+    "timeout": 10.0,
+    "threshold": 0.10,
+}
+# Differences below this many seconds are treated as noise, whatever the ratio.
+MIN_REGRESSION = 0.002
+
+
+def parse_marker(value):
+    """Accept a one-character string, a number, or a string such as "0x2a"; None means any byte."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value & 0xFF
+    text = str(value)
+    if len(text) == 1:
+        return ord(text) & 0xFF
+    try:
+        return int(text, 0) & 0xFF
+    except ValueError:
+        raise ValueError(f"Marker must be one character or a byte value, not {value!r}.")
+
+
+def benchmark_settings(project_settings, **overrides):
+    """Merge the project's "benchmark" entry and any non-None overrides over the defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    configured = project_settings.get("benchmark")
+    if isinstance(configured, dict):
+        settings.update({key: value for key, value in configured.items() if key in settings})
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    settings["marker"] = parse_marker(settings["marker"])
+    settings["frame_marker"] = parse_marker(settings["frame_marker"])
+    settings["frames"] = max(1, int(settings["frames"]))
+    settings["repeats"] = max(1, int(settings["repeats"]))
+    settings["timeout"] = float(settings["timeout"])
+    settings["threshold"] = float(settings["threshold"])
+    return settings
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered), math.ceil(fraction * len(ordered))) - 1)]
+
+
+class MarkerClock(DebugConsoleListener):
+    """Debug console listener that timestamps marker bytes instead of collecting lines."""
+
+    def __init__(self, marker=None, frame_marker=None, frames=0):
+        super().__init__(on_line=None)
+        self.marker = marker
+        self.frame_marker = frame_marker
+        self.frames = frames
+        self.started = None
+        self.boot_time = None
+        self.frame_times = []
+        self.done = threading.Event()
+
+    def _read(self, connection):
+        # Output before started is set cannot come from the paused guest; it is ignored.
+        while True:
+            try:
+                data = connection.recv(4096)
+            except OSError:
+                data = b""
+            stamp = time.monotonic()
+            if not data:
+                self.done.set()
+                return
+            if self.started is None:
+                continue
+            for byte in data:
+                if self.boot_time is None:
+                    if self.marker is None or byte == self.marker:
+                        self.boot_time = stamp
+                elif byte == self.frame_marker:
+                    self.frame_times.append(stamp)
+            if self.boot_time is not None and (
+                self.frame_marker is None or len(self.frame_times) > self.frames
+            ):
+                self.done.set()
+
+    def frame_intervals(self):
+        return [later - earlier for earlier, later in zip(self.frame_times, self.frame_times[1:])]
+
+
+def measure_boot(launcher, img_path, settings, profile=None, boot_drive=DEFAULT_BOOT_DRIVE):
+    """Boot img_path once; return (boot seconds, median frame seconds or None)."""
+    clock = MarkerClock(settings["marker"], settings["frame_marker"], settings["frames"]).start()
+    port = free_port()
+    cmd = launcher.machine_args(headless=True, profile=profile) + [
+        *boot_drive_args(img_path, boot_drive, snapshot=True),
+        "-no-reboot",
+        "-S",
+        "-qmp", qmp_argument(port),
+        *clock.qemu_args(),
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    qmp = QMPClient(port)
+    try:
+        try:
+            qmp.connect(timeout=settings["timeout"], proc=proc)
+        except QMPError as error:
+            if proc.poll() is not None and proc.stderr is not None:
+                raise QMPError(proc.stderr.read().decode(errors="replace").strip() or str(error))
+            raise
+        clock.started = time.monotonic()
+        qmp.command("cont")
+        if not clock.done.wait(settings["timeout"]) or clock.boot_time is None:
+            raise QMPError(f"No marker reached port 0xE9 within {settings['timeout']:g}s.")
+        if settings["frame_marker"] is not None and len(clock.frame_times) <= settings["frames"]:
+            raise QMPError("The guest stopped before writing enough frame markers.")
+        intervals = clock.frame_intervals()
+        frame = statistics.median(intervals) if intervals else None
+        return clock.boot_time - clock.started, frame
+    finally:
+        if qmp.sock is not None:
+            try:
+                qmp.command("quit")
+            except (QMPError, OSError):
+                pass
+        qmp.close()
+        clock.close()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        if proc.stderr is not None:
+            proc.stderr.close()
+
+
+def build_key(project_dir, img_path):
+    """Identify the measured build by git commit, when the project is in a repository, and image hash."""
+    digest = hashlib.sha256()
+    with open(img_path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 16), b""):
+            digest.update(chunk)
+    image = digest.hexdigest()[:16]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_dir,
+            shell=False, capture_output=True, text=True, timeout=5,
+        )
+        commit = commit.stdout.strip() if commit.returncode == 0 else None
+    except (OSError, subprocess.TimeoutExpired):
+        commit = None
+    return {"key": commit or f"image:{image}", "commit": commit, "image": image}
+
+
+def run_benchmark(launcher, project_dir, settings, profile=None, progress=None, cancel_event=None):
+    """Measure the project's boot.img settings["repeats"] times and return a history entry.
+
+    Raises QMPError or OSError when a run fails or is cancelled. The project's
+    emulator profile is used unless another one is given.
+    """
+    img_path = os.path.join(project_dir, "build", "boot.img")
+    if not has_boot_image(img_path):
+        raise OSError("boot.img not found. Run Build first.")
+    if profile is None:
+        profile = launcher.project_profile(project_dir)
+    boot_drive = launcher.project_boot_drive(project_dir)
+    boots = []
+    frames = []
+    for run in range(settings["repeats"]):
+        if cancel_event is not None and cancel_event.is_set():
+            raise OSError("Benchmark cancelled.")
+        boot, frame = measure_boot(launcher, img_path, settings, profile, boot_drive)
+        boots.append(boot)
+        if frame is not None:
+            frames.append(frame)
+        if progress is not None:
+            progress(run + 1, settings["repeats"], boot, frame)
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        **build_key(project_dir, img_path),
+        "repeats": settings["repeats"],
+        "marker": settings["marker"],
+        "boot_median": round(statistics.median(boots), 6),
+        "boot_p95": round(percentile(boots, 0.95), 6),
+    }
+    if frames:
+        entry["frame_marker"] = settings["frame_marker"]
+        entry["frame_median"] = round(statistics.median(frames), 6)
+        entry["frame_p95"] = round(percentile(frames, 0.95), 6)
+    return entry
+
+
+def history_path(project_dir):
+    return os.path.join(project_dir, "build", HISTORY_NAME)
+
+
+def load_history(project_dir):
+    entries = []
+    try:
+        with open(history_path(project_dir), "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def append_history(project_dir, entry):
+    path = history_path(project_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(entry) + "\n")
+
+
+def find_regressions(history, entry, threshold):
+    """Compare entry with the latest earlier build of a different image measured the same way."""
+    baseline = next(
+        (item for item in reversed(history)
+         if item.get("image") != entry["image"] and item.get("marker") == entry.get("marker")),
+        None,
+    )
+    if baseline is None:
+        return None, []
+    messages = []
+    for field, label in (("boot_median", "Boot time"), ("frame_median", "Frame time")):
+        before = baseline.get(field)
+        after = entry.get(field)
+        if before is None or after is None or before <= 0:
+            continue
+        if after > before * (1 + threshold) and after - before >= MIN_REGRESSION:
+            messages.append(
+                f"{label} rose from {before * 1000:.1f} ms to {after * 1000:.1f} ms "
+                f"(+{(after / before - 1) * 100:.0f}%) since {baseline.get('key')}."
+            )
+    return baseline, messages
+
+
+def summary_line(entry):
+    line = (
+        f"Boot to marker: median {entry['boot_median'] * 1000:.1f} ms, "
+        f"p95 {entry['boot_p95'] * 1000:.1f} ms over {entry['repeats']} run(s)"
+    )
+    if "frame_median" in entry:
+        line += (
+            f"; frame median {entry['frame_median'] * 1000:.2f} ms, "
+            f"p95 {entry['frame_p95'] * 1000:.2f} ms"
+        )
+    return line + f" [{entry['key']}]."
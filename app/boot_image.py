@@ -0,0 +1,125 @@
+"""Boot image assembly without staging binaries or padding through Python memory."""
+
+import os
+import sys
+
+FLOPPY_SIZE = 1474560
+SECTOR_SIZE = 512
+# 1.44 MB geometry: 80 cylinders, 2 heads, 18 sectors per track.
+FLOPPY_SECTORS_PER_TRACK = 18
+# Multiple of SECTOR_SIZE so update_image chunks stay sector aligned.
+COPY_CHUNK = 1 << 16
+
+
+def has_boot_image(path):
+    """True when path holds an image; a failed build may leave it empty instead of removing it."""
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+def _copy_into(source, target, length, offset):
+    """Copy length bytes of source to target at offset inside the kernel when possible."""
+    source_fd = source.fileno()
+    target_fd = target.fileno()
+    copied = 0
+    # A short result from one method falls through to the next for the remainder.
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < length:
+                count = os.copy_file_range(
+                    source_fd, target_fd, length - copied, copied, offset + copied
+                )
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass
+    if copied < length and sys.platform.startswith("linux"):
+        try:
+            os.lseek(target_fd, offset + copied, os.SEEK_SET)
+            while copied < length:
+                count = os.sendfile(target_fd, source_fd, copied, length - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass
+    if copied < length:
+        source.seek(copied)
+        target.seek(offset + copied)
+        while copied < length:
+            block = source.read(min(COPY_CHUNK, length - copied))
+            if not block:
+                break
+            target.write(block)
+            copied += len(block)
+        target.flush()
+    if copied != length:
+        raise OSError(f"{source.name} ended after {copied} of {length} bytes")
+    return copied
+
+
+def write_image(target, members, size=FLOPPY_SIZE):
+    """Concatenate members into a new image and extend it sparsely to size."""
+    offset = 0
+    with open(target, "wb") as image:
+        for member in members:
+            with open(member, "rb") as source:
+                length = os.fstat(source.fileno()).st_size
+                offset += _copy_into(source, image, length, offset)
+        image.truncate(max(size, offset))
+    return offset
+
+
+def _member_chunks(members, chunk_size):
+    """Yield the concatenated members in chunk_size pieces without reading them whole."""
+    pending = b""
+    for member in members:
+        with open(member, "rb") as source:
+            for block in iter(lambda: source.read(chunk_size), b""):
+                pending += block
+                while len(pending) >= chunk_size:
+                    yield pending[:chunk_size]
+                    pending = pending[chunk_size:]
+    if pending:
+        yield pending
+
+
+def update_image(target, members, size=FLOPPY_SIZE, previous_end=None):
+    """Rewrite only the sectors of an existing image that changed.
+
+    previous_end is where the last build's content stopped; everything past it
+    is known to be zero. Without it the whole image is compared. Returns the
+    number of sectors written, or None when the previous image cannot be
+    reused and write_image should be used instead.
+    """
+    try:
+        if os.path.getsize(target) != size:
+            return None
+        length = sum(os.path.getsize(member) for member in members)
+    except OSError:
+        return None
+    if length > size:
+        return None
+
+    end = size if previous_end is None else max(length, min(size, previous_end))
+    end = min(size, -(-end // SECTOR_SIZE) * SECTOR_SIZE)
+    chunks = _member_chunks(members, COPY_CHUNK)
+    written = 0
+    offset = 0
+    with open(target, "r+b") as image:
+        while offset < end:
+            count = min(COPY_CHUNK, end - offset)
+            content = next(chunks, b"")[:count].ljust(count, b"\0")
+            image.seek(offset)
+            previous = image.read(count)
+            for start in range(0, count, SECTOR_SIZE):
+                sector = content[start:start + SECTOR_SIZE]
+                if previous[start:start + SECTOR_SIZE] != sector:
+                    image.seek(offset + start)
+                    image.write(sector)
+                    written += 1
+            offset += count
+    return written
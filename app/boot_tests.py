@@ -0,0 +1,131 @@
+"""Concurrent headless boot tests with JUnit and JSON reports. Nothing here may import Qt."""
+
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BootTestCase:
+    def __init__(self, project_dir, config="default", qemu_args=(), timeout=10.0, allow_timeout=False):
+        self.project_dir = os.path.abspath(project_dir)
+        self.config = config
+        self.qemu_args = list(qemu_args)
+        self.timeout = timeout
+        self.allow_timeout = allow_timeout
+
+    @property
+    def name(self):
+        return f"{os.path.basename(self.project_dir)}[{self.config}]"
+
+    def output_dir(self):
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.config)
+        return os.path.join(self.project_dir, "build", "run", safe)
+
+
+class BootTestRunner:
+    """Boot every case as its own QEMU process, at most jobs at a time."""
+
+    def __init__(self, launcher, jobs=None):
+        self.launcher = launcher
+        self.jobs = jobs
+
+    def worker_count(self, case_count):
+        limit = self.jobs if self.jobs and self.jobs > 0 else (os.cpu_count() or 1)
+        return max(1, min(limit, case_count))
+
+    def run_case(self, case):
+        return self.launcher.run_headless(
+            case.project_dir, timeout=case.timeout,
+            output_dir=case.output_dir(), extra_args=case.qemu_args,
+        )
+
+    def run(self, cases, progress=None):
+        """Return [(case, HeadlessResult)] in case order; progress(done, total, case, result) per finish."""
+        lock = threading.Lock()
+        finished = [0]
+
+        def run_one(case):
+            result = self.run_case(case)
+            if progress is not None:
+                with lock:
+                    finished[0] += 1
+                    progress(finished[0], len(cases), case, result)
+            return result
+
+        if not cases:
+            return []
+        with ThreadPoolExecutor(max_workers=self.worker_count(len(cases))) as pool:
+            results = list(pool.map(run_one, cases))
+        return list(zip(cases, results))
+
+
+def outcome(case, result):
+    if result.passed(allow_timeout=case.allow_timeout):
+        return "passed"
+    return "error" if result.status == "error" else "failed"
+
+
+def failure_message(case, result):
+    if result.status == "error":
+        return result.message or result.stderr or "QEMU failed."
+    if result.status == "timeout":
+        return f"No exit within {case.timeout:g}s."
+    code = result.guest_exit_code
+    if code is None:
+        return f"QEMU exited with status {result.returncode} without a guest exit code."
+    return f"Guest exited with code {code}."
+
+
+def report_dict(results):
+    cases = []
+    for case, result in results:
+        entry = {
+            "name": case.name,
+            "project": case.project_dir,
+            "config": case.config,
+            "qemu_args": case.qemu_args,
+            "outcome": outcome(case, result),
+            **result.to_dict(),
+        }
+        if entry["outcome"] != "passed":
+            entry["failure"] = failure_message(case, result)
+        cases.append(entry)
+    counts = {name: sum(1 for entry in cases if entry["outcome"] == name)
+              for name in ("passed", "failed", "error")}
+    return {"success": counts["passed"] == len(cases), "counts": counts, "cases": cases}
+
+
+def write_json(results, path):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(report_dict(results), handle, indent=2)
+
+
+def write_junit(results, path, suite_name="boot-tests"):
+    report = report_dict(results)
+    suite = ET.Element("testsuite", {
+        "name": suite_name,
+        "tests": str(len(report["cases"])),
+        "failures": str(report["counts"]["failed"]),
+        "errors": str(report["counts"]["error"]),
+        "time": f"{sum(entry['elapsed'] for entry in report['cases']):.3f}",
+    })
+    for entry in report["cases"]:
+        testcase = ET.SubElement(suite, "testcase", {
+            "classname": os.path.basename(entry["project"]),
+            "name": entry["config"],
+            "time": f"{entry['elapsed']:.3f}",
+        })
+        if entry["outcome"] != "passed":
+            tag = "error" if entry["outcome"] == "error" else "failure"
+            ET.SubElement(testcase, tag, {"message": entry["failure"]}).text = entry["stderr"]
+        output = "".join(
+            f"--- {name} ---\n{entry[name]}" for name in ("serial", "debugcon") if entry[name]
+        )
+        if output:
+            ET.SubElement(testcase, "system-out").text = output
+    root = ET.Element("testsuites")
+    root.append(suite)
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
@@ -0,0 +1,173 @@
+"""Persistent content-hashed manifest that lets builds skip unchanged NASM work."""
+
+import hashlib
+import json
+import os
+
+from .dependencies import read_directives
+
+
+class BuildCache:
+    VERSION = 1
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.cache_dir = os.path.join(build_dir, ".cache")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        self.files = {}
+        self.outputs = {}
+        self.assets = []
+        self.image = {}
+        self._checked = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return
+        self.files = data.get("files", {}) if isinstance(data.get("files"), dict) else {}
+        self.outputs = data.get("outputs", {}) if isinstance(data.get("outputs"), dict) else {}
+        self.assets = data.get("assets", []) if isinstance(data.get("assets"), list) else []
+        self.image = data.get("image", {}) if isinstance(data.get("image"), dict) else {}
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump({
+                "version": self.VERSION,
+                "files": self.files,
+                "outputs": self.outputs,
+                "assets": self.assets,
+                "image": self.image,
+            }, handle, indent=1, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+
+    def file_record(self, path):
+        """Return the hash (and directives for sources) of a file, rehashing only on stat changes."""
+        path = os.path.normpath(os.path.abspath(path))
+        if path in self._checked:
+            return self._checked[path]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.files.pop(path, None)
+            self._checked[path] = None
+            return None
+
+        record = self.files.get(path)
+        if not record or record.get("size") != stat.st_size \
+                or record.get("mtime_ns") != stat.st_mtime_ns:
+            digest = hashlib.sha256()
+            with open(path, "rb") as handle:
+                for chunk in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(chunk)
+            record = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest.hexdigest(),
+            }
+            if path.lower().endswith((".asm", ".inc", ".s", ".nasm")):
+                includes, incbins = read_directives(path)
+                record["includes"] = includes
+                record["incbins"] = incbins
+            self.files[path] = record
+        self._checked[path] = record
+        return record
+
+    def directives(self, path):
+        record = self.file_record(path)
+        if not record:
+            return [], []
+        if "includes" not in record:
+            return read_directives(path)
+        return record["includes"], record["incbins"]
+
+    def fingerprint(self, source_path, dependencies, toolchain):
+        digest = hashlib.sha256()
+        digest.update(json.dumps(toolchain, sort_keys=True).encode("utf-8"))
+        for path in [source_path, *dependencies]:
+            record = self.file_record(path)
+            digest.update(os.path.normpath(os.path.abspath(path)).encode("utf-8"))
+            digest.update(b"\0")
+            digest.update((record["sha256"] if record else "missing").encode("ascii"))
+        return digest.hexdigest()
+
+    def _output_key(self, output_path):
+        return os.path.relpath(output_path, self.build_dir).replace(os.sep, "/")
+
+    def lookup(self, output_path, fingerprint):
+        """Return the cached entry when output_path is still exactly what fingerprint produced."""
+        entry = self.outputs.get(self._output_key(output_path))
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return None
+        if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime_ns"):
+            return None
+        return entry
+
+    def record(self, output_path, fingerprint, warnings=""):
+        stat = os.stat(output_path)
+        self.outputs[self._output_key(output_path)] = {
+            "fingerprint": fingerprint,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "warnings": warnings,
+        }
+
+    def image_end(self, image_path):
+        """Return where the last recorded build's content ended, if the image is unchanged since."""
+        entry = self.image
+        if entry.get("path") != self._output_key(image_path):
+            return None
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime_ns"):
+            return None
+        return entry.get("content_size")
+
+    def record_image(self, image_path, content_size):
+        stat = os.stat(image_path)
+        self.image = {
+            "path": self._output_key(image_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "content_size": content_size,
+        }
+
+    def forget(self, output_path):
+        self.outputs.pop(self._output_key(output_path), None)
+        if os.path.isfile(output_path):
+            os.remove(output_path)
+
+    def prune(self, live_outputs):
+        """Delete outputs whose sources disappeared since the previous build."""
+        live_keys = {self._output_key(path) for path in live_outputs}
+        for key in list(self.outputs):
+            if key not in live_keys:
+                stale = os.path.join(self.build_dir, *key.split("/"))
+                if os.path.isfile(stale):
+                    os.remove(stale)
+                del self.outputs[key]
+        self.files = {
+            path: record for path, record in self.files.items()
+            if path in self._checked
+        }
+
+    def prune_assets(self, staged_paths):
+        """Remove assets staged by an earlier build that are no longer referenced."""
+        live_keys = sorted(self._output_key(path) for path in staged_paths)
+        for key in set(self.assets) - set(live_keys):
+            stale = os.path.join(self.build_dir, *key.split("/"))
+            if os.path.isfile(stale):
+                os.remove(stale)
+        self.assets = live_keys
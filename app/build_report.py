@@ -0,0 +1,92 @@
+"""Wall-clock timing and cache statistics for one build."""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+class BuildReport:
+    VERSION = 1
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.started = time.perf_counter()
+        self.created = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self.stages = {}
+        self.files = []
+        self.assets = []
+        self.image = {}
+        self.success = False
+        self.message = ""
+        self.total = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def add_file(self, source, output, status, seconds):
+        self.files.append({
+            "source": source,
+            "output": output,
+            "status": status,
+            "seconds": round(seconds, 6),
+            "size": os.path.getsize(output) if os.path.isfile(output) else None,
+        })
+
+    def add_asset(self, source, action, seconds):
+        self.assets.append({
+            "source": source,
+            "action": action,
+            "seconds": round(seconds, 6),
+            "size": os.path.getsize(source) if os.path.isfile(source) else None,
+        })
+
+    def finish(self, success, message=""):
+        self.success = success
+        self.message = message
+        self.total = time.perf_counter() - self.started
+
+    def cache_counts(self):
+        hits = sum(1 for item in self.files if item["status"] == "hit")
+        return hits, len(self.files) - hits
+
+    def summary_lines(self, slowest=5):
+        stages = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+        hits, misses = self.cache_counts()
+        lines = [
+            f"Build timing: {self.total:.3f}s total ("
+            + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in stages)
+            + f"); cache {hits} hit(s), {misses} miss(es)."
+        ]
+        assembled = sorted(
+            (item for item in self.files if item["status"] != "hit"),
+            key=lambda item: item["seconds"], reverse=True,
+        )
+        for item in assembled[:slowest]:
+            size = f", {item['size']} bytes" if item["size"] is not None else ""
+            lines.append(f"  {item['seconds']:.3f}s  {item['source']} ({item['status']}{size})")
+        return lines
+
+    def to_dict(self):
+        return {
+            "version": self.VERSION,
+            "project": self.project_dir,
+            "created": self.created,
+            "success": self.success,
+            "message": self.message,
+            "total_seconds": round(self.total, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "files": self.files,
+            "assets": self.assets,
+            "image": self.image,
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, indent=2)
@@ -0,0 +1,137 @@
+"""Background build, run, benchmark and watch threads so NASM, QEMU and file scans never block the IDE's event loop."""
+
+import threading
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from .boot_benchmark import (append_history, benchmark_settings, find_regressions,
+                             load_history, run_benchmark, summary_line)
+from .qmp import QMPError
+from .watch import ProjectWatcher, affects_build
+
+
+class _SignalTerminal:
+    """Terminal stand-in that forwards Compiler output to the UI thread."""
+
+    def __init__(self, signal):
+        self.signal = signal
+
+    def append(self, message):
+        self.signal.emit(str(message))
+
+
+class BuildWorker(QThread):
+    message = pyqtSignal(str)
+    progress = pyqtSignal(int, int, str, str)
+    build_finished = pyqtSignal(bool, str, str)
+
+    def __init__(self, compiler, parent=None):
+        super().__init__(parent)
+        self.compiler = compiler
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        terminal = _SignalTerminal(self.message)
+        try:
+            result = self.compiler.compile_to_img(
+                terminal, progress=self.progress.emit, cancel_event=self.cancel_event
+            )
+        except PermissionError:
+            message = "Could not write to the image file. It is locked by another program."
+            terminal.append(f"Error: {message}")
+            self.build_finished.emit(False, "Access Denied", message)
+            return
+        except Exception as e:
+            terminal.append(f"Error: {str(e)}")
+            self.build_finished.emit(False, "Build Error", f"A serious error occurred:\n\n{str(e)}")
+            return
+        if isinstance(result, tuple) and result and result[0] is False:
+            message = result[1] if len(result) > 1 else "The image could not be created."
+            terminal.append(message)
+            title = "Build Cancelled" if self.cancel_event.is_set() else "Build Error"
+            self.build_finished.emit(False, title, message)
+        else:
+            terminal.append("Build finished successfully.")
+            self.build_finished.emit(True, "", "")
+
+
+class RunWorker(QThread):
+    """Starts the emulator, including a warm start's POST boot and snapshot, off the UI thread."""
+
+    message = pyqtSignal(str)
+    run_finished = pyqtSignal(bool)
+
+    def __init__(self, launcher, project_dir, extra_args=(), parent=None):
+        super().__init__(parent)
+        self.launcher = launcher
+        self.project_dir = project_dir
+        self.extra_args = list(extra_args)
+
+    def run(self):
+        terminal = _SignalTerminal(self.message)
+        try:
+            self.launcher.run(self.project_dir, terminal.append, self.extra_args)
+        except Exception as e:
+            terminal.append(f"QEMU failed: {e}")
+        self.run_finished.emit(self.launcher.is_running())
+
+
+class BenchmarkWorker(QThread):
+    """Times boot to the debug console marker after a build and records it in the history."""
+
+    message = pyqtSignal(str)
+    benchmark_finished = pyqtSignal(list)
+
+    def __init__(self, launcher, project_dir, parent=None):
+        super().__init__(parent)
+        self.launcher = launcher
+        self.project_dir = project_dir
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            settings = benchmark_settings(self.launcher.project_settings(self.project_dir))
+            entry = run_benchmark(
+                self.launcher, self.project_dir, settings,
+                profile=self.launcher.project_profile(self.project_dir, self.message.emit),
+                cancel_event=self.cancel_event,
+            )
+        except (QMPError, OSError, ValueError) as e:
+            if not self.cancel_event.is_set():
+                self.message.emit(f"Boot benchmark failed: {e}")
+            self.benchmark_finished.emit([])
+            return
+        regressions = find_regressions(
+            load_history(self.project_dir), entry, settings["threshold"]
+        )[1]
+        append_history(self.project_dir, entry)
+        self.message.emit(summary_line(entry))
+        self.benchmark_finished.emit(regressions)
+
+
+class WatchWorker(QThread):
+    """Scans the project off the UI thread and reports settled changes to build inputs."""
+
+    sources_changed = pyqtSignal(list)
+
+    def __init__(self, compiler, interval=0.25, parent=None):
+        super().__init__(parent)
+        self.compiler = compiler
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def run(self):
+        watcher = ProjectWatcher(self.compiler.project_dir)
+        while not self.stop_event.wait(self.interval):
+            changed = watcher.poll()
+            if changed and affects_build(changed, self.compiler.build_inputs()):
+                self.sources_changed.emit(changed)
@@ -0,0 +1,718 @@
+"""Headless command-line entry points. Nothing here may import Qt."""
+
+import argparse
+import contextlib
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+from .boot_benchmark import (append_history, benchmark_settings, find_regressions,
+                             load_history, run_benchmark, summary_line)
+from .boot_tests import (BootTestCase, BootTestRunner, failure_message, outcome,
+                         write_json, write_junit)
+from .compiler import Compiler
+from .cost_estimate import CPUS, CostReport
+from .emulator import HeadlessResult, OSLauncher
+from .emulator_profiles import available_profiles, benchmark_profiles, kvm_available
+from .gdbstub import gdb_argument
+from .profiler import DEFAULT_RATE, ProfileResult, SamplingProfiler
+from .qmp import QMPError, free_port
+from .raster import write_png
+from .screenshot_tests import DEFAULT_TICKS, load_screenshot_tests, run_screenshot_test
+from .virtual_pc import DEFAULT_SPEED, VirtualPC
+from .watch import ProjectWatcher, affects_build
+
+
+class StreamTerminal:
+    """Plain-text stand-in for the IDE terminal that Compiler appends to."""
+
+    def __init__(self, stream=None, echo=True):
+        self.stream = stream
+        self.echo = echo
+        self.lines = []
+
+    def append(self, message):
+        self.lines.append(str(message))
+        if self.echo and self.stream is not None:
+            print(message, file=self.stream, flush=True)
+
+
+def resolve_project(path):
+    """Accept a project directory or its .projectdata file, like the launcher."""
+    path = os.path.abspath(path)
+    if os.path.basename(path).casefold() == ".projectdata":
+        path = os.path.dirname(path)
+    return path
+
+
+def build_project(compiler, project_dir, terminal):
+    compiler.project_dir = project_dir
+    if not os.path.isfile(os.path.join(project_dir, ".projectdata")):
+        return False, f"Error: {project_dir} is not an Operation Crafter project."
+    result = compiler.compile_to_img(terminal)
+    if isinstance(result, tuple) and result and result[0] is False:
+        return False, result[1] if len(result) > 1 else "The image could not be created."
+    return True, "Build finished successfully."
+
+
+def create_compiler(args, root_dir):
+    compiler = Compiler(root_dir, jobs=args.jobs)
+    if args.nasm:
+        compiler.nasm_exe = os.path.abspath(args.nasm)
+    return compiler
+
+
+def command_build(args, root_dir):
+    compiler = create_compiler(args, root_dir)
+
+    results = []
+    for project in args.projects:
+        project_dir = resolve_project(project)
+        compiler.last_report = None
+        terminal = StreamTerminal(sys.stdout, echo=not args.json)
+        if not args.json and len(args.projects) > 1:
+            terminal.append(f"== {project_dir}")
+        success, message = build_project(compiler, project_dir, terminal)
+        terminal.append(message)
+        results.append({
+            "project": project_dir,
+            "success": success,
+            "message": message,
+            "image": os.path.join(project_dir, "build", "boot.img") if success else None,
+            "report": os.path.join(project_dir, "build", "build-report.json")
+            if compiler.last_report is not None else None,
+            "log": terminal.lines[:-1],
+        })
+
+    all_succeeded = all(item["success"] for item in results)
+    if args.json and sys.stdout is not None:
+        json.dump({"success": all_succeeded, "projects": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0 if all_succeeded else 1
+
+
+def command_watch(args, root_dir):
+    compiler = create_compiler(args, root_dir)
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout)
+
+    def rebuild():
+        started = time.perf_counter()
+        success, message = build_project(compiler, project_dir, terminal)
+        terminal.append(f"{message} ({time.perf_counter() - started:.2f}s)")
+        return success
+
+    rebuild()
+    watcher = ProjectWatcher(project_dir, debounce=args.debounce)
+    terminal.append(f"Watching {project_dir} for changes. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            changed = watcher.poll()
+            if changed and affects_build(changed, compiler.build_inputs()):
+                names = ", ".join(os.path.relpath(path, project_dir) for path in changed[:4])
+                more = f" and {len(changed) - 4} more" if len(changed) > 4 else ""
+                terminal.append(f"Changed: {names}{more}")
+                rebuild()
+    except KeyboardInterrupt:
+        return 0
+
+
+def command_run(args, root_dir):
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    if not args.no_build:
+        success, message = build_project(create_compiler(args, root_dir), project_dir, terminal)
+        if not success:
+            terminal.append(message)
+            if args.json:
+                json.dump({"success": False, "build": message, "log": terminal.lines}, sys.stdout, indent=2)
+                sys.stdout.write("\n")
+            return 1
+
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    result = launcher.run_headless(
+        project_dir, timeout=args.timeout, screendump=args.screendump,
+        profile=launcher.project_profile(project_dir, terminal.append, args.profile),
+    )
+    passed = result.passed(allow_timeout=args.timeout_ok)
+    if args.json:
+        json.dump({"success": passed, "project": project_dir, **result.to_dict()}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0 if passed else 1
+
+    for name, output in (("serial", result.serial), ("debugcon", result.debugcon)):
+        if output:
+            terminal.append(f"--- {name} ---")
+            terminal.append(output.rstrip("\n"))
+    if result.status == "error":
+        terminal.append(f"Error: {result.message or result.stderr or 'QEMU failed.'}")
+    elif result.status == "timeout":
+        terminal.append(f"Timed out after {result.elapsed:.2f}s.")
+    else:
+        code = result.guest_exit_code
+        detail = f"guest exit code {code}" if code is not None else f"QEMU status {result.returncode}"
+        terminal.append(f"Emulator exited after {result.elapsed:.2f}s ({detail}).")
+    if result.screendump:
+        terminal.append(f"Screendump written to {result.screendump}")
+    return 0 if passed else 1
+
+
+def command_profile(args, root_dir):
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    compiler = create_compiler(args, root_dir)
+    compiler.project_dir = project_dir
+    if not args.no_build:
+        success, message = build_project(compiler, project_dir, terminal)
+        if not success:
+            terminal.append(message)
+            return 1
+
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    port = free_port()
+    profiler = SamplingProfiler(port, args.rate).start(connect_timeout=args.duration)
+    run = launcher.run_headless(
+        project_dir, timeout=args.duration, extra_args=["-gdb", gdb_argument(port)]
+    )
+    profiler.stop()
+    if run.status == "error":
+        terminal.append(f"Error: {run.message or run.stderr or 'QEMU failed.'}")
+        return 1
+    if not profiler.samples:
+        terminal.append(f"Profiling collected no samples. {profiler.error}".rstrip())
+        return 1
+
+    result = ProfileResult(project_dir, profiler.samples, compiler.member_listings(), profiler.elapsed)
+    result.write(os.path.join(project_dir, "build", "profile.json"))
+    if args.json:
+        json.dump(result.to_dict(), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in result.table_lines(limit=args.top):
+            terminal.append(line)
+    return 0
+
+
+def command_cost(args, root_dir):
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    compiler = create_compiler(args, root_dir)
+    compiler.project_dir = project_dir
+    if not args.no_build:
+        success, message = build_project(compiler, project_dir, StreamTerminal(echo=False))
+        if not success:
+            terminal.append(message)
+            return 1
+
+    report = CostReport(project_dir, compiler.member_listings())
+    if not report.units:
+        terminal.append("No NASM listings found. Run Build first.")
+        return 1
+    report.write(os.path.join(project_dir, "build", "cost.json"))
+    if args.json:
+        json.dump(report.to_dict(), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in report.table_lines(cpu=CPUS.index(args.cpu), limit=args.top):
+            terminal.append(line)
+    return 0
+
+
+def command_boot_bench(args, root_dir):
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    if not args.no_build:
+        success, message = build_project(create_compiler(args, root_dir), project_dir, StreamTerminal(echo=False))
+        if not success:
+            terminal.append(message)
+            return 1
+
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    try:
+        settings = benchmark_settings(
+            launcher.project_settings(project_dir), marker=args.marker,
+            frame_marker=args.frame_marker, frames=args.frames, repeats=args.repeats,
+            timeout=args.timeout, threshold=args.threshold,
+        )
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+    def report_run(run, total, boot, frame):
+        detail = f", frame {frame * 1000:.2f} ms" if frame is not None else ""
+        terminal.append(f"  run {run}/{total}: boot {boot * 1000:.1f} ms{detail}")
+
+    try:
+        entry = run_benchmark(launcher, project_dir, settings, progress=report_run)
+    except (QMPError, OSError) as e:
+        terminal.append(f"Error: {e}")
+        return 1
+    baseline, regressions = find_regressions(load_history(project_dir), entry, settings["threshold"])
+    if not args.no_history:
+        append_history(project_dir, entry)
+
+    if args.json:
+        json.dump({"result": entry, "baseline": baseline, "regressions": regressions}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        terminal.append(summary_line(entry))
+        for message in regressions:
+            terminal.append(f"Performance regression: {message}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def command_screenshot_test(args, root_dir):
+    project_dir = resolve_project(args.project)
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    if not args.no_build:
+        success, message = build_project(create_compiler(args, root_dir), project_dir, StreamTerminal(echo=False))
+        if not success:
+            terminal.append(message)
+            return 1
+
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    try:
+        tests = load_screenshot_tests(
+            launcher.project_settings(project_dir), names=args.name or (),
+            marker=args.marker, ticks=args.ticks, tolerance=args.tolerance,
+            max_pixels=args.max_pixels, timeout=args.timeout,
+        )
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+    profile = launcher.project_profile(project_dir, terminal.append, args.profile)
+    results = []
+    for test in tests:
+        result = run_screenshot_test(launcher, project_dir, test, update=args.update, profile=profile)
+        results.append(result)
+        line = f"{result.outcome.upper():7s} {test.name} ({result.elapsed:.2f}s)"
+        terminal.append(f"{line}: {result.message}" if result.message else line)
+
+    if args.json:
+        json.dump([result.to_dict() for result in results], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        failed = sum(1 for result in results if result.outcome in ("failed", "error"))
+        terminal.append(f"{len(results) - failed} of {len(results)} screenshot test(s) passed.")
+    return 0 if all(result.outcome in ("passed", "updated") for result in results) else 1
+
+
+def command_emulate(args, root_dir):
+    terminal = StreamTerminal(sys.stdout, echo=not args.json)
+    path = os.path.abspath(args.target)
+    binary = path.lower().endswith((".bin", ".com"))
+    if not os.path.isfile(path):
+        project_dir = resolve_project(path)
+        if not args.no_build:
+            success, message = build_project(create_compiler(args, root_dir), project_dir, StreamTerminal(echo=False))
+            if not success:
+                terminal.append(message)
+                return 1
+        path = os.path.join(project_dir, "build", "boot.img")
+        if not os.path.isfile(path):
+            raise SystemExit("error: boot.img not found. Run Build first.")
+
+    pc = VirtualPC(speed=args.speed)
+    try:
+        with open(path, "rb") as handle:
+            data = handle.read()
+        if binary:
+            pc.load_binary(data, int(args.org, 0))
+        else:
+            pc.load_floppy(data)
+        if args.keys:
+            pc.type_keys(args.keys)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"error: {e}")
+
+    started = time.monotonic()
+    reason = pc.run(args.instructions)
+    elapsed = time.monotonic() - started
+    screenshot = None
+    if args.screenshot:
+        try:
+            write_png(pc.screen_image(args.scale), args.screenshot)
+            screenshot = os.path.abspath(args.screenshot)
+        except (OSError, ValueError) as e:
+            terminal.append(f"Screenshot not written: {e}")
+    passed = pc.exit_code == 0 or (args.limit_ok and reason in ("limit", "keyboard"))
+    if args.json:
+        json.dump({
+            "success": passed,
+            "image": path,
+            "stop_reason": reason,
+            "message": pc.stop_message,
+            "guest_exit_code": pc.exit_code,
+            "instructions": pc.instructions,
+            "guest_seconds": round(pc.seconds, 3),
+            "elapsed": round(elapsed, 3),
+            "debugcon": pc.debugcon.decode("latin-1"),
+            "teletype": pc.teletype_text(),
+            "screen": pc.text_lines() if pc.video_mode != 0x13 else None,
+            "screenshot": screenshot,
+        }, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0 if passed else 1
+
+    if pc.debugcon:
+        terminal.append("--- debugcon ---")
+        terminal.append(pc.debugcon.decode("latin-1").rstrip("\n"))
+    if pc.video_mode != 0x13:
+        lines = pc.text_lines()
+        while lines and not lines[-1]:
+            lines.pop()
+        if lines:
+            terminal.append("--- screen ---")
+            terminal.append("\n".join(lines))
+    elif pc.teletype:
+        terminal.append("--- teletype ---")
+        terminal.append(pc.teletype_text().rstrip("\n"))
+    terminal.append(
+        f"Stopped ({reason}) after {pc.instructions} instructions, "
+        f"{pc.seconds:.2f}s of guest time in {elapsed:.2f}s: {pc.stop_message}"
+    )
+    if screenshot:
+        terminal.append(f"Screenshot written to {screenshot}")
+    return 0 if passed else 1
+
+
+def parse_configs(values):
+    """Turn NAME=QEMU_ARGS options into (name, argument list) pairs."""
+    configs = []
+    for value in values or ["default="]:
+        name, separator, qemu_args = value.partition("=")
+        if not separator or not name:
+            raise SystemExit(f"error: --config expects NAME=QEMU_ARGS, got {value!r}")
+        configs.append((name, shlex.split(qemu_args)))
+    return configs
+
+
+def command_test(args, root_dir):
+    configs = parse_configs(args.config)
+    terminal = StreamTerminal(sys.stdout)
+    compiler = None if args.no_build else create_compiler(args, root_dir)
+
+    all_cases = []
+    cases = []
+    build_failures = {}
+    for project in args.projects:
+        project_dir = resolve_project(project)
+        project_cases = [
+            BootTestCase(project_dir, name, qemu_args, args.timeout, args.timeout_ok)
+            for name, qemu_args in configs
+        ]
+        all_cases.extend(project_cases)
+        if compiler is not None:
+            success, message = build_project(compiler, project_dir, StreamTerminal(echo=False))
+            if not success:
+                terminal.append(f"BUILD FAILED {os.path.basename(project_dir)}: {message}")
+                for case in project_cases:
+                    build_failures[case] = HeadlessResult("error", message=f"Build failed: {message}")
+                continue
+        cases.extend(project_cases)
+
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    runner = BootTestRunner(launcher, jobs=args.parallel)
+
+    def report_case(done, total, case, result):
+        state = outcome(case, result)
+        detail = "" if state == "passed" else f": {failure_message(case, result)}"
+        terminal.append(f"[{done}/{total}] {state.upper()} {case.name} ({result.elapsed:.2f}s){detail}")
+
+    started = time.perf_counter()
+    booted = dict(runner.run(cases, progress=report_case))
+    results = [(case, build_failures.get(case) or booted[case]) for case in all_cases]
+    passed = sum(1 for case, result in results if outcome(case, result) == "passed")
+    terminal.append(
+        f"{passed}/{len(results)} boot test(s) passed in {time.perf_counter() - started:.2f}s."
+    )
+    if args.junit:
+        write_junit(results, args.junit)
+    if args.json_report:
+        write_json(results, args.json_report)
+    return 0 if passed == len(results) else 1
+
+
+def command_bench(args, root_dir):
+    launcher = OSLauncher(root_dir)
+    if args.qemu:
+        launcher.qemu_path = os.path.abspath(args.qemu)
+    settings = {}
+    if args.project:
+        project_dir = resolve_project(args.project)
+        settings = launcher.project_settings(project_dir)
+        work_area = contextlib.nullcontext(os.path.join(project_dir, "build", "bench"))
+    else:
+        # Without a project the reference image only lives for this run.
+        work_area = tempfile.TemporaryDirectory(prefix="oc-bench-")
+    profiles = available_profiles(settings)
+    if args.profile:
+        unknown = [name for name in args.profile if name not in profiles]
+        if unknown:
+            raise SystemExit(f"error: unknown emulator profile(s): {', '.join(unknown)}")
+        profiles = {name: profiles[name] for name in args.profile}
+
+    terminal = StreamTerminal(sys.stdout)
+    terminal.append(
+        f"Booting the reference image {args.repeats} time(s) per profile "
+        f"(KVM {'available' if kvm_available() else 'not available'})."
+    )
+
+    def report_profile(name, median, error):
+        terminal.append(f"  {name:<12} {f'{median:.3f}s' if median is not None else 'skipped'}"
+                        + (f"  ({error})" if error else ""))
+
+    with work_area as work_dir:
+        results = benchmark_profiles(
+            launcher, profiles, work_dir, repeats=args.repeats, timeout=args.timeout,
+            progress=report_profile,
+        )
+    if not results or results[0][1] is None:
+        terminal.append("No profile booted the reference image.")
+        return 1
+    terminal.append(f"Fastest profile: {results[0][0]} ({results[0][1]:.3f}s median).")
+    return 0
+
+
+COMMANDS = {
+    "build": command_build,
+    "watch": command_watch,
+    "run": command_run,
+    "test": command_test,
+    "bench": command_bench,
+    "profile": command_profile,
+    "cost": command_cost,
+    "boot-bench": command_boot_bench,
+    "screenshot-test": command_screenshot_test,
+    "emulate": command_emulate,
+}
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Operation Crafter headless tools. Run without arguments to open the IDE.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Assemble one or more projects into build/boot.img.")
+    build.add_argument("projects", nargs="+", metavar="project",
+                       help="Project directory or its .projectdata file.")
+    build.add_argument("--jobs", "-j", type=int, default=None,
+                       help="Maximum concurrent NASM processes (default: CPU count).")
+    build.add_argument("--json", action="store_true",
+                       help="Print a machine-readable result instead of the build log.")
+    build.add_argument("--nasm", default=None,
+                       help="NASM executable to use instead of the bundled nasm/ directory.")
+
+    watch = subparsers.add_parser("watch", help="Rebuild a project whenever its sources are saved.")
+    watch.add_argument("project", help="Project directory or its .projectdata file.")
+    watch.add_argument("--jobs", "-j", type=int, default=None,
+                       help="Maximum concurrent NASM processes (default: CPU count).")
+    watch.add_argument("--nasm", default=None,
+                       help="NASM executable to use instead of the bundled nasm/ directory.")
+    watch.add_argument("--interval", type=float, default=0.25,
+                       help="Seconds between file scans (default: 0.25).")
+    watch.add_argument("--debounce", type=float, default=0.75,
+                       help="Quiet seconds required before a burst of saves rebuilds (default: 0.75).")
+
+    run_parser = subparsers.add_parser("run", help="Build a project and boot it in QEMU with no window.")
+    run_parser.add_argument("project", help="Project directory or its .projectdata file.")
+    run_parser.add_argument("--jobs", "-j", type=int, default=None,
+                            help="Maximum concurrent NASM processes (default: CPU count).")
+    run_parser.add_argument("--nasm", default=None,
+                            help="NASM executable to use instead of the bundled nasm/ directory.")
+    run_parser.add_argument("--qemu", default=None,
+                            help="qemu-system-x86_64 executable to use instead of the detected one.")
+    run_parser.add_argument("--no-build", action="store_true",
+                            help="Boot the existing build/boot.img without building first.")
+    run_parser.add_argument("--timeout", type=float, default=10.0,
+                            help="Seconds to let the guest run before stopping it (default: 10).")
+    run_parser.add_argument("--timeout-ok", action="store_true",
+                            help="Treat reaching the timeout as success, for images that never exit.")
+    run_parser.add_argument("--profile", default=None, metavar="NAME",
+                            help="Emulator profile for this run instead of the project's (default: legacy).")
+    run_parser.add_argument("--screendump", default=None,
+                            help="Save the screen to this PPM file when the timeout is reached.")
+    run_parser.add_argument("--json", action="store_true",
+                            help="Print a machine-readable result instead of the captured output.")
+
+    test = subparsers.add_parser("test", help="Boot-test many projects or QEMU configurations in parallel.")
+    test.add_argument("projects", nargs="+", metavar="project",
+                      help="Project directory or its .projectdata file.")
+    test.add_argument("--config", action="append", metavar="NAME=QEMU_ARGS",
+                      help="Boot every project once per configuration, e.g. lowmem='-m 2'. Repeatable.")
+    test.add_argument("--parallel", "-p", type=int, default=None,
+                      help="Maximum concurrent QEMU processes (default: CPU count).")
+    test.add_argument("--jobs", "-j", type=int, default=None,
+                      help="Maximum concurrent NASM processes (default: CPU count).")
+    test.add_argument("--nasm", default=None,
+                      help="NASM executable to use instead of the bundled nasm/ directory.")
+    test.add_argument("--qemu", default=None,
+                      help="qemu-system-x86_64 executable to use instead of the detected one.")
+    test.add_argument("--no-build", action="store_true",
+                      help="Boot the existing build/boot.img files without building first.")
+    test.add_argument("--timeout", type=float, default=10.0,
+                      help="Seconds each guest may run before it is stopped (default: 10).")
+    test.add_argument("--timeout-ok", action="store_true",
+                      help="Treat reaching the timeout as a pass, for images that never exit.")
+    test.add_argument("--junit", default=None, help="Write a JUnit XML report to this file.")
+    test.add_argument("--json", dest="json_report", default=None,
+                      help="Write a JSON report to this file.")
+
+    bench = subparsers.add_parser("bench", help="Find the emulator profile that boots fastest here.")
+    bench.add_argument("project", nargs="?", default=None,
+                       help="Project whose custom emulator_profiles are included as well.")
+    bench.add_argument("--profile", action="append", metavar="NAME",
+                       help="Only benchmark this profile. Repeatable.")
+    bench.add_argument("--repeats", type=int, default=3,
+                       help="Boots per profile; the median is reported (default: 3).")
+    bench.add_argument("--timeout", type=float, default=30.0,
+                       help="Seconds a single boot may take before it counts as failed (default: 30).")
+    bench.add_argument("--qemu", default=None,
+                       help="qemu-system-x86_64 executable to use instead of the detected one.")
+
+    profile = subparsers.add_parser("profile", help="Sample where a headless run spends its time.")
+    profile.add_argument("project", help="Project directory or its .projectdata file.")
+    profile.add_argument("--duration", type=float, default=10.0,
+                         help="Seconds to sample before stopping the guest (default: 10).")
+    profile.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                         help=f"Samples per second (default: {DEFAULT_RATE:g}).")
+    profile.add_argument("--top", type=int, default=15,
+                         help="Rows to print for the hottest nodes and lines (default: 15).")
+    profile.add_argument("--jobs", "-j", type=int, default=None,
+                         help="Maximum concurrent NASM processes (default: CPU count).")
+    profile.add_argument("--nasm", default=None,
+                         help="NASM executable to use instead of the bundled nasm/ directory.")
+    profile.add_argument("--qemu", default=None,
+                         help="qemu-system-x86_64 executable to use instead of the detected one.")
+    profile.add_argument("--no-build", action="store_true",
+                         help="Profile the existing build/boot.img without building first.")
+    profile.add_argument("--json", action="store_true",
+                         help="Print the profile as JSON instead of tables.")
+
+    cost = subparsers.add_parser("cost", help="Estimate code size and clock cycles per node from NASM listings.")
+    cost.add_argument("project", help="Project directory or its .projectdata file.")
+    cost.add_argument("--cpu", choices=CPUS, default="8086",
+                      help="Timing table for the cycle columns (default: 8086).")
+    cost.add_argument("--top", type=int, default=15,
+                      help="Rows to print for the costliest nodes and loops (default: 15).")
+    cost.add_argument("--jobs", "-j", type=int, default=None,
+                      help="Maximum concurrent NASM processes (default: CPU count).")
+    cost.add_argument("--nasm", default=None,
+                      help="NASM executable to use instead of the bundled nasm/ directory.")
+    cost.add_argument("--no-build", action="store_true",
+                      help="Use the existing listings in build/ without building first.")
+    cost.add_argument("--json", action="store_true",
+                      help="Print the estimates as JSON instead of tables.")
+
+    boot_bench = subparsers.add_parser(
+        "boot-bench", help="Time boot to the first debug console marker and track it over builds."
+    )
+    boot_bench.add_argument("project", help="Project directory or its .projectdata file.")
+    boot_bench.add_argument("--repeats", type=int, default=None,
+                            help="Boots to measure; median and p95 are reported (default: 5).")
+    boot_bench.add_argument("--marker", default=None,
+                            help="Byte that ends the boot time, e.g. '*' or 0x2a (default: any byte).")
+    boot_bench.add_argument("--frame-marker", default=None,
+                            help="Byte written once per frame; reports the median frame time.")
+    boot_bench.add_argument("--frames", type=int, default=None,
+                            help="Frame intervals to measure per boot (default: 10).")
+    boot_bench.add_argument("--timeout", type=float, default=None,
+                            help="Seconds each boot may take to reach its markers (default: 10).")
+    boot_bench.add_argument("--threshold", type=float, default=None,
+                            help="Slowdown ratio reported as a regression (default: 0.10).")
+    boot_bench.add_argument("--fail-on-regression", action="store_true",
+                            help="Exit with status 1 when a regression is found.")
+    boot_bench.add_argument("--no-history", action="store_true",
+                            help="Do not append the result to build/perf-history.jsonl.")
+    boot_bench.add_argument("--jobs", "-j", type=int, default=None,
+                            help="Maximum concurrent NASM processes (default: CPU count).")
+    boot_bench.add_argument("--nasm", default=None,
+                            help="NASM executable to use instead of the bundled nasm/ directory.")
+    boot_bench.add_argument("--qemu", default=None,
+                            help="qemu-system-x86_64 executable to use instead of the detected one.")
+    boot_bench.add_argument("--no-build", action="store_true",
+                            help="Measure the existing build/boot.img without building first.")
+    boot_bench.add_argument("--json", action="store_true",
+                            help="Print the result, baseline and regressions as JSON.")
+
+    screenshot = subparsers.add_parser(
+        "screenshot-test", help="Compare the screen after boot with golden PNG screenshots."
+    )
+    screenshot.add_argument("project", help="Project directory or its .projectdata file.")
+    screenshot.add_argument("--name", action="append", metavar="NAME",
+                            help="Only run this screenshot test from .projectdata. Repeatable.")
+    screenshot.add_argument("--marker", default=None,
+                            help="Capture once the guest writes this byte to port 0xE9, e.g. '*' or 0x2a.")
+    screenshot.add_argument("--ticks", type=int, default=None,
+                            help=f"Capture after this many BIOS timer ticks, 18.2 per second "
+                                 f"(default without a marker: {DEFAULT_TICKS}).")
+    screenshot.add_argument("--tolerance", type=int, default=None,
+                            help="Largest per-channel difference a pixel may have and still match (default: 0).")
+    screenshot.add_argument("--max-pixels", type=int, default=None,
+                            help="Number of mismatched pixels still accepted as a pass (default: 0).")
+    screenshot.add_argument("--timeout", type=float, default=None,
+                            help="Seconds to wait for the marker and ticks (default: 10).")
+    screenshot.add_argument("--profile", default=None, metavar="NAME",
+                            help="Emulator profile for these captures instead of the project's (default: legacy).")
+    screenshot.add_argument("--update", action="store_true",
+                            help="Store the captured screens as the new golden screenshots.")
+    screenshot.add_argument("--jobs", "-j", type=int, default=None,
+                            help="Maximum concurrent NASM processes (default: CPU count).")
+    screenshot.add_argument("--nasm", default=None,
+                            help="NASM executable to use instead of the bundled nasm/ directory.")
+    screenshot.add_argument("--qemu", default=None,
+                            help="qemu-system-x86_64 executable to use instead of the detected one.")
+    screenshot.add_argument("--no-build", action="store_true",
+                            help="Test the existing build/boot.img without building first.")
+    screenshot.add_argument("--json", action="store_true",
+                            help="Print the results as JSON.")
+
+    emulate = subparsers.add_parser(
+        "emulate", help="Run a project, floppy image or flat binary in the built-in 8086 interpreter."
+    )
+    emulate.add_argument("target", help="Project directory, .projectdata file, .img floppy image or .bin binary.")
+    emulate.add_argument("--org", default="0x1000",
+                         help="Load and start address for a .bin binary (default: 0x1000).")
+    emulate.add_argument("--instructions", type=int, default=20_000_000,
+                         help="Instructions to execute before stopping (default: 20000000).")
+    emulate.add_argument("--speed", type=int, default=DEFAULT_SPEED,
+                         help=f"Instructions per second of guest time, for the BIOS clock "
+                              f"(default: {DEFAULT_SPEED}).")
+    emulate.add_argument("--keys", default=None,
+                         help="Keys to press in order, e.g. 'y{enter}'; names: enter esc space tab "
+                              "backspace up down left right.")
+    emulate.add_argument("--limit-ok", action="store_true",
+                         help="Treat running out of instructions or waiting for a key as success.")
+    emulate.add_argument("--screenshot", default=None,
+                         help="Save the mode 13h screen to this PNG file when the run stops.")
+    emulate.add_argument("--scale", type=int, default=2,
+                         help="Screenshot scale; 2 matches QEMU's 640x400 screendumps (default: 2).")
+    emulate.add_argument("--jobs", "-j", type=int, default=None,
+                         help="Maximum concurrent NASM processes (default: CPU count).")
+    emulate.add_argument("--nasm", default=None,
+                         help="NASM executable to use instead of the bundled nasm/ directory.")
+    emulate.add_argument("--no-build", action="store_true",
+                         help="Run the existing build/boot.img without building first.")
+    emulate.add_argument("--json", action="store_true",
+                         help="Print the result as JSON.")
+    return parser
+
+
+def run(argv, root_dir):
+    args = create_parser().parse_args(argv)
+    return COMMANDS[args.command](args, root_dir)
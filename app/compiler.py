@@ -1,12 +1,64 @@
+import json
 import os
-import shutil
+import re
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .boot_image import FLOPPY_SECTORS_PER_TRACK, FLOPPY_SIZE, SECTOR_SIZE, update_image, write_image
+from .build_cache import BuildCache
+from .build_report import BuildReport
+from .dependencies import IncludeGraph
+from .emulator import project_boot_drive
+from .node_map import load_node_map, saved_nodes
+from .staging import STAGING_MODES, stage_file
+
+
+# Preprocessor lines that test, give a fallback for or drop a single-line macro
+# without using its value.
+_MACRO_DIRECTIVE_RE = re.compile(
+    r"^\s*%(?:ifn?def|elifn?def|i?x?define|undef|assign)\s+([A-Za-z_.$?@][\w.$#@~?]*)",
+    re.IGNORECASE,
+)
+
+
+def _code_text(line):
+    """line without its comment and with the contents of string literals removed."""
+    code = []
+    quote = None
+    for character in line:
+        if quote:
+            if character == quote:
+                quote = None
+                code.append(character)
+        elif character in "'\"`":
+            quote = character
+            code.append(character)
+        elif character == ";":
+            break
+        else:
+            code.append(character)
+    return "".join(code)
 
 
 class Compiler:
-    def __init__(self, root_dir):
+    NASM_FLAGS = ("-f", "bin")
+    DEFAULT_IMAGE_MEMBERS = ("main.asm", "kernel.asm")
+    # The starter loader reads the kernel to 0x1000; past 54 sectors it would
+    # overwrite the boot sector running at 0x7c00.
+    KERNEL_MAX_SECTORS = (0x7C00 - 0x1000) // SECTOR_SIZE
+    # Booting from the floppy, the starter loader's single BIOS read from
+    # sector 2 may not run past the end of the first track.
+    FLOPPY_KERNEL_MAX_SECTORS = FLOPPY_SECTORS_PER_TRACK - 1
+
+    def __init__(self, root_dir, jobs=None):
         self.root_dir = root_dir
+        self.jobs = jobs
+        self.last_report = None
+        # Set while a paused emulator has boot.img open, so failed builds keep the file.
+        self.image_in_use = False
+        self._nasm_version = None
 
         if sys.platform == 'win32':
             self.nasm_exe = os.path.join(self.root_dir, "nasm", "nasm.exe")
@@ -14,81 +66,429 @@ class Compiler:
         else:
             self.nasm_exe = os.path.join(self.root_dir, "nasm", "nasm")
 
-    def compile_to_img(self, terminal):
+    def nasm_version(self):
+        """Return NASM's version banner, re-queried only when the executable changes."""
+        try:
+            stat = os.stat(self.nasm_exe)
+            identity = (self.nasm_exe, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return ""
+        if self._nasm_version and self._nasm_version[0] == identity:
+            return self._nasm_version[1]
+        try:
+            result = subprocess.run(
+                [self.nasm_exe, "-v"], shell=False, capture_output=True, text=True
+            )
+            version = (result.stdout or result.stderr).strip()
+        except OSError:
+            version = ""
+        self._nasm_version = (identity, version)
+        return version
+
+    def project_settings(self):
+        try:
+            with open(os.path.join(self.project_dir, ".projectdata"), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def image_members(self):
+        """Return the sources written to boot.img in order; the first is the boot sector."""
+        members = self.project_settings().get("image_members")
+        if not isinstance(members, list) or not members:
+            return list(self.DEFAULT_IMAGE_MEMBERS)
+        return [str(member) for member in members]
+
+    def asset_staging_mode(self):
+        mode = str(self.project_settings().get("asset_staging", "referenced")).lower()
+        return mode if mode in STAGING_MODES else "referenced"
+
+    def updates_image_in_place(self):
+        return str(self.project_settings().get("image_update", "in-place")).lower() != "rewrite"
+
+    def kernel_max_sectors(self):
+        settings = self.project_settings()
+        default = self.KERNEL_MAX_SECTORS
+        if project_boot_drive(settings) == "floppy":
+            default = self.FLOPPY_KERNEL_MAX_SECTORS
+        try:
+            limit = int(settings.get("kernel_max_sectors", default))
+        except (TypeError, ValueError):
+            limit = default
+        return max(1, min(limit, 255))
+
+    def build_inputs(self):
+        """Return every path whose change can alter boot.img, including missing references."""
+        project_dir = os.path.abspath(self.project_dir)
+        inputs = {os.path.join(project_dir, ".projectdata")}
+        graph = IncludeGraph(project_dir, self.image_members())
+        for root_source in graph.roots:
+            inputs.add(root_source)
+            inputs.update(graph.dependencies(root_source))
+        inputs.update(
+            os.path.normpath(os.path.join(project_dir, member))
+            for member in graph.missing_roots
+        )
+        return inputs
+
+    def member_listings(self):
+        """Return (listing, source) pairs that NASM wrote for the image members, in image order."""
+        project_dir = os.path.abspath(self.project_dir)
+        return [
+            (os.path.join(project_dir, "build", os.path.splitext(member)[0] + ".lst"),
+             os.path.normpath(os.path.join(project_dir, member)))
+            for member in self.image_members()
+        ]
+
+    def toolchain_signature(self):
+        return {"nasm": self.nasm_version(), "flags": list(self.NASM_FLAGS), "listing": True}
+
+    def worker_count(self, job_count):
+        limit = self.jobs if self.jobs and self.jobs > 0 else (os.cpu_count() or 1)
+        return max(1, min(limit, job_count))
+
+    def _assemble(self, job, cancel_event=None):
+        defines = [f"-d{name}={value}" for name, value in job.get("defines", {}).items()]
+        cmd = [
+            self.nasm_exe, *self.NASM_FLAGS, *defines, job["file"],
+            "-o", job["target"], "-l", os.path.splitext(job["target"])[0] + ".lst",
+        ]
+        started = time.perf_counter()
+        if cancel_event is not None and cancel_event.is_set():
+            return None, 0.0
+        process = subprocess.Popen(
+            cmd, cwd=job["cwd"], shell=False,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=0.1)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    process.kill()
+                    process.communicate()
+                    return None, time.perf_counter() - started
+        result = subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+        return result, time.perf_counter() - started
+
+    def compile_to_img(self, terminal, progress=None, cancel_event=None):
+        """Build boot.img, reporting progress(done, total, file, status) per image member.
+
+        Setting cancel_event (a threading.Event) stops the build and kills running NASM processes.
+        """
         if not getattr(self, "project_dir", None) or not os.path.isdir(self.project_dir):
             return False, "Error: select or create a valid project before building."
         if not os.path.isfile(self.nasm_exe):
             return False, f"Error: NASM was not found at {self.nasm_exe}."
 
         build_dir = os.path.join(self.project_dir, "build")
-        if os.path.exists(build_dir):
-            shutil.rmtree(build_dir)
         os.makedirs(build_dir, exist_ok=True)
+        report = BuildReport(self.project_dir)
+        self.last_report = report
+        result = self._build(terminal, build_dir, report, progress, cancel_event)
+        if result is True:
+            report.finish(True, "Build finished successfully.")
+        else:
+            report.finish(False, result[1])
+        for line in report.summary_lines():
+            terminal.append(line)
+        try:
+            report.write(os.path.join(build_dir, "build-report.json"))
+        except OSError as error:
+            terminal.append(f"Warning: could not write build-report.json: {error}")
+        return result
 
+    def _build(self, terminal, build_dir, report, progress, cancel_event):
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        output_img = os.path.join(build_dir, "boot.img")
         bin_map = {}
         assembly_failures = []
+        live_outputs = []
 
-        for root, dirs, files in os.walk(self.project_dir):
-            if "build" in dirs: dirs.remove("build")
-            if "blocks" in dirs: dirs.remove("blocks")
+        with report.stage("scan"):
+            cache = BuildCache(build_dir)
+            toolchain = self.toolchain_signature()
+            members = self.image_members()
+            graph = IncludeGraph(self.project_dir, members, cache.directives)
+            reachable = graph.reachable_sources()
+            skipped_sources = 0
 
-            for file in files:
-                if file == ".projectdata":
-                    continue
+            jobs = []
+            for root_source in graph.roots:
+                relative_file = os.path.relpath(root_source, self.project_dir)
+                target_bin = os.path.join(build_dir, os.path.splitext(relative_file)[0] + ".bin")
+                os.makedirs(os.path.dirname(target_bin), exist_ok=True)
+                live_outputs.append(target_bin)
+                fingerprint = cache.fingerprint(
+                    root_source, graph.dependencies(root_source), toolchain
+                )
+                jobs.append({
+                    "source": root_source,
+                    "file": os.path.basename(root_source),
+                    "cwd": os.path.dirname(root_source),
+                    "target": target_bin,
+                    "relative": relative_file,
+                    "fingerprint": fingerprint,
+                    "cached": cache.lookup(target_bin, fingerprint),
+                })
 
-                rel_path = os.path.relpath(root, self.project_dir)
-                target_folder = os.path.join(build_dir, rel_path)
-                os.makedirs(target_folder, exist_ok=True)
+            assets = []
+            for root, dirs, files in os.walk(self.project_dir):
+                if "build" in dirs: dirs.remove("build")
+                if "blocks" in dirs: dirs.remove("blocks")
+                dirs.sort()
 
-                if file.endswith(".asm"):
-                    name_bin = file.replace(".asm", ".bin")
-                    target_bin = os.path.join(target_folder, name_bin)
+                for file in sorted(files):
+                    if file == ".projectdata":
+                        continue
+                    path = os.path.normpath(os.path.join(root, file))
+                    if file.endswith(".asm"):
+                        if path not in reachable:
+                            skipped_sources += 1
+                    else:
+                        assets.append(path)
 
-                    cmd = [self.nasm_exe, "-f", "bin", file, "-o", target_bin]
-                    result = subprocess.run(
-                        cmd, cwd=root, shell=False, capture_output=True, text=True
-                    )
+        if cancelled():
+            return False, "Build cancelled."
 
-                    if result.returncode == 0:
-                        relative_file = os.path.normpath(os.path.join(rel_path, file))
-                        if relative_file.startswith(f".{os.sep}"):
-                            relative_file = relative_file[2:]
-                        bin_map[relative_file.lower()] = target_bin
-                        if result.stderr.strip():
-                            terminal.append(f"NASM warning for {relative_file}: {result.stderr.strip()}")
-                    else:
-                        relative_file = os.path.normpath(os.path.join(rel_path, file))
-                        if relative_file.startswith(f".{os.sep}"):
-                            relative_file = relative_file[2:]
-                        detail = result.stderr.strip() or "NASM returned an unknown error."
-                        assembly_failures.append(f"{relative_file}:\n{detail}")
-                        terminal.append(f"Assembly failed for {relative_file}:\n{detail}")
-                else:
-                    shutil.copy2(os.path.join(root, file), os.path.join(target_folder, file))
+        # NASM reads incbin data from the project itself; build/ only mirrors the
+        # referenced assets so the output folder is self-describing.
+        with report.stage("assets"):
+            staging_mode = self.asset_staging_mode()
+            if staging_mode == "referenced":
+                assets = [
+                    path for path in graph.binary_assets()
+                    if os.path.relpath(path, self.project_dir).split(os.sep)[0] not in ("..", "build")
+                ]
+            elif staging_mode == "none":
+                assets = []
+            staged = []
+            for source in assets:
+                relative_asset = os.path.relpath(source, self.project_dir)
+                target = os.path.join(build_dir, relative_asset)
+                started = time.perf_counter()
+                action = stage_file(source, target)
+                report.add_asset(relative_asset, action, time.perf_counter() - started)
+                staged.append(target)
+            cache.prune_assets(staged)
 
+        if skipped_sources:
+            terminal.append(
+                f"Skipped {skipped_sources} assembly file(s) that no image member "
+                "includes; add them to image_members in .projectdata to assemble them."
+            )
+
+        # NASM runs concurrently, but results are consumed in image order so the
+        # terminal and assembly_failures read the same on every build. The boot
+        # sector goes last because KERNEL_SECTORS depends on everything after it.
+        boot_key = os.path.normpath(members[0]).lower()
+        boot_jobs = [job for job in jobs if job["relative"].lower() == boot_key]
+        payload_jobs = [job for job in jobs if job["relative"].lower() != boot_key]
+        kernel_error = None
+        kernel_sectors = None
+        with report.stage("assemble"):
+            pending = sum(1 for job in payload_jobs if job["cached"] is None)
+            done = 0
+            with ThreadPoolExecutor(max_workers=self.worker_count(pending)) as pool:
+                for wave in (payload_jobs, boot_jobs):
+                    if wave is boot_jobs and wave:
+                        if assembly_failures or cancelled():
+                            break
+                        kernel_sectors, kernel_error = self._prepare_boot_job(
+                            wave[0], payload_jobs, cache, graph, toolchain
+                        )
+                        if kernel_error:
+                            break
+                        if wave[0]["uses_kernel_sectors"]:
+                            terminal.append(
+                                f"KERNEL_SECTORS = {kernel_sectors} for {wave[0]['relative']}."
+                            )
+                        warning = self._short_loader_warning(wave[0], kernel_sectors)
+                        if warning:
+                            terminal.append(warning)
+                    futures = [
+                        pool.submit(self._assemble, job, cancel_event) if job["cached"] is None else None
+                        for job in wave
+                    ]
+                    for job, future in zip(wave, futures):
+                        done += 1
+                        relative_file = job["relative"]
+                        target_bin = job["target"]
+                        cached = job["cached"]
+                        if cached is not None:
+                            bin_map[relative_file.lower()] = target_bin
+                            report.add_file(relative_file, target_bin, "hit", 0.0)
+                            if cached.get("warnings"):
+                                terminal.append(f"NASM warning for {relative_file}: {cached['warnings']}")
+                            if progress is not None:
+                                progress(done, len(jobs), relative_file, "hit")
+                            continue
+
+                        result, seconds = future.result()
+                        if result is None:
+                            # A killed NASM may have left a truncated output behind.
+                            cache.forget(target_bin)
+                            report.add_file(relative_file, target_bin, "cancelled", seconds)
+                            continue
+                        if result.returncode == 0:
+                            bin_map[relative_file.lower()] = target_bin
+                            cache.record(target_bin, job["fingerprint"], result.stderr.strip())
+                            report.add_file(relative_file, target_bin, "miss", seconds)
+                            if result.stderr.strip():
+                                terminal.append(f"NASM warning for {relative_file}: {result.stderr.strip()}")
+                        else:
+                            cache.forget(target_bin)
+                            report.add_file(relative_file, target_bin, "failed", seconds)
+                            detail = result.stderr.strip() or "NASM returned an unknown error."
+                            assembly_failures.append(f"{relative_file}:\n{detail}")
+                            terminal.append(f"Assembly failed for {relative_file}:\n{detail}")
+                        if progress is not None:
+                            progress(done, len(jobs), relative_file,
+                                     "miss" if result.returncode == 0 else "failed")
+
+            cache.prune(live_outputs)
+            cache.save()
+
+        if cancelled():
+            self._discard_image(output_img)
+            return False, "Build cancelled."
         if assembly_failures:
+            self._discard_image(output_img)
             return False, (
                 f"Error: {len(assembly_failures)} assembly file(s) failed. "
                 "No boot image was created; review the NASM errors above."
             )
-        if "main.asm" not in bin_map:
-            return False, "Error: main.bin not created. Check NASM errors."
+        if kernel_error:
+            self._discard_image(output_img)
+            return False, kernel_error
+        boot_sector = os.path.normpath(members[0]).lower()
+        if boot_sector not in bin_map:
+            name = os.path.splitext(members[0])[0] + ".bin"
+            self._discard_image(output_img)
+            return False, f"Error: {name} not created. Check NASM errors."
 
-        output_img = os.path.join(build_dir, "boot.img")
+        image_members = [
+            bin_map[os.path.relpath(root_source, self.project_dir).lower()]
+            for root_source in graph.roots
+        ]
         try:
-            with open(output_img, "wb") as f_out:
-                with open(bin_map["main.asm"], "rb") as f:
-                    f_out.write(f.read())
-
-                if "kernel.asm" in bin_map:
-                    with open(bin_map["kernel.asm"], "rb") as f:
-                        f_out.write(f.read())
-
-                curr_size = f_out.tell()
-                padding = 1474560 - curr_size
-                if padding > 0:
-                    f_out.write(b'\x00' * padding)
-
+            with report.stage("image"):
+                updated = None
+                if self.updates_image_in_place():
+                    updated = update_image(
+                        output_img, image_members, FLOPPY_SIZE, cache.image_end(output_img)
+                    )
+                if updated is None:
+                    content_size = write_image(output_img, image_members, FLOPPY_SIZE)
+                    updated = -(-content_size // SECTOR_SIZE)
+                    mode = "rewrite"
+                else:
+                    mode = "in-place"
+                cache.record_image(
+                    output_img, sum(os.path.getsize(path) for path in image_members)
+                )
+                cache.save()
+            report.image = {
+                "path": output_img,
+                "mode": mode,
+                "sectors_written": updated,
+                "kernel_sectors": kernel_sectors,
+                "members": [os.path.relpath(path, build_dir) for path in image_members],
+            }
             return True
         except OSError as error:
+            self._discard_image(output_img)
             return False, f"Error: could not create boot.img: {error}"
+
+    def _prepare_boot_job(self, boot_job, payload_jobs, cache, graph, toolchain):
+        """Pass the boot sector the sectors it must load; returns (sectors, error)."""
+        payload_bytes = sum(os.path.getsize(job["target"]) for job in payload_jobs)
+        sectors = max(1, -(-payload_bytes // SECTOR_SIZE))
+        dependencies = graph.dependencies(boot_job["source"])
+        limit = self.kernel_max_sectors()
+        boot_job["uses_kernel_sectors"] = self._uses_macro(boot_job["source"], dependencies, "KERNEL_SECTORS")
+        if sectors > limit and boot_job["uses_kernel_sectors"]:
+            names = ", ".join(os.path.basename(job["target"]) for job in payload_jobs)
+            return sectors, (
+                f"Error: {names} is {payload_bytes} bytes ({sectors} sectors), but "
+                f"{boot_job['relative']} can load at most {limit} sectors. Shrink the kernel, "
+                "or raise kernel_max_sectors in .projectdata if your loader reads more."
+                + self._floppy_limit_hint()
+            )
+        boot_job["defines"] = {"KERNEL_SECTORS": sectors}
+        boot_job["fingerprint"] = cache.fingerprint(
+            boot_job["source"], dependencies, dict(toolchain, defines=boot_job["defines"])
+        )
+        boot_job["cached"] = cache.lookup(boot_job["target"], boot_job["fingerprint"])
+        return sectors, None
+
+    def _floppy_limit_hint(self):
+        if project_boot_drive(self.project_settings()) != "floppy":
+            return ""
+        return (
+            f" Booting from the floppy, one BIOS read from sector 2 ends with the first track, "
+            f"{self.FLOPPY_KERNEL_MAX_SECTORS} sectors; read the kernel track by track, or set "
+            '"boot_drive": "disk".'
+        )
+
+    def _short_loader_warning(self, boot_job, sectors):
+        """Warn when a Bootloader node of the boot sector loads a literal count smaller than the kernel."""
+        if boot_job.get("uses_kernel_sectors") or load_node_map(self.project_dir, boot_job["source"]) is None:
+            return None
+        for data in saved_nodes(self.project_dir, os.path.basename(boot_job["source"])).values():
+            if data.get("name") != "Bootloader":
+                continue
+            value = next(
+                (str(item.get("value", item.get("default", ""))).strip()
+                 for item in data.get("inputs", [])
+                 if isinstance(item, dict) and item.get("name") == "SECTORS"),
+                "",
+            )
+            try:
+                loaded = int(value, 0)
+            except ValueError:
+                continue
+            if loaded < sectors:
+                return (
+                    f"Warning: the Bootloader node in {boot_job['relative']} loads {loaded} sector(s), "
+                    f"but the kernel needs {sectors}. Set its Sectors input to KERNEL_SECTORS "
+                    "to load exactly what each build needs."
+                )
+        return None
+
+    @staticmethod
+    def _uses_macro(source, dependencies, name):
+        """True when name is expanded somewhere, not just tested or given a fallback value."""
+        word = re.compile(rf"(?<![\w.$#@~?]){re.escape(name)}(?![\w.$#@~?])")
+        for path in [source, *dependencies]:
+            if not path.lower().endswith((".asm", ".inc", ".s", ".nasm")):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                code = _code_text(line)
+                directive = _MACRO_DIRECTIVE_RE.match(code)
+                if directive and directive.group(1) == name:
+                    continue
+                if word.search(code):
+                    return True
+        return False
+
+    def _discard_image(self, output_img):
+        # A failed build must never leave the previous image looking current.
+        # An emulator holding the file open keeps it, emptied, so the next build
+        # rewrites the same file underneath it.
+        if not os.path.exists(output_img):
+            return
+        if self.image_in_use:
+            with open(output_img, "r+b") as image:
+                image.truncate(0)
+        else:
+            os.remove(output_img)
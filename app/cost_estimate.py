@@ -0,0 +1,622 @@
+"""Static size and clock-cycle estimates for assembled 16-bit code.
+
+Instructions are decoded from the bytes in NASM listings and priced from 8086
+and 80286 timing tables. Totals roll up per node graph node through the node
+maps, and per function chain through the saved graphs. Iteration counts are
+not known statically, so every loop is priced for one pass of its body. A loop
+is the code between a backward branch and its target; REP string instructions
+and shifts by CL count as loops too. A call includes one pass through its
+callee. BIOS code is not in any listing, so each int instruction adds a rough
+allowance for the handler. Nothing here may import Qt.
+"""
+
+import json
+import os
+import re
+
+from .listing import parse_listing
+from .node_map import function_chains, load_node_map
+
+CPUS = ("8086", "286")
+# Rough (8086, 286) cycles for a BIOS service handler behind an int instruction.
+BIOS_CALL_CYCLES = (300, 150)
+_DATA_RE = re.compile(
+    r"^\s*(?:[A-Za-z_.?$][\w.?$@#~]*:?\s+)?(?:times\s+\S+\s+)?(?:d[bwdqt]|res[bwdqt]|incbin)\b",
+    re.IGNORECASE,
+)
+# 8086 effective-address cycles by r/m field, without and with a displacement.
+_EA_PLAIN = (7, 8, 8, 7, 5, 5, 6, 5)
+_EA_DISPLACED = (11, 12, 12, 11, 9, 9, 9, 9)
+_ALU_NAMES = ("add", "or", "adc", "sbb", "and", "sub", "xor", "cmp")
+_SHIFT_NAMES = ("rol", "ror", "rcl", "rcr", "shl", "shr", "sal", "sar")
+_CONDITIONS = ("o", "no", "b", "ae", "e", "ne", "be", "a", "s", "ns", "p", "np", "l", "ge", "le", "g")
+# (name, 8086, 286, REP 8086 per element, REP 286 per element) for string opcodes A4-AF and 6C-6F.
+_STRINGS = {
+    0x6C: ("ins", 14, 5, 8, 4), 0x6E: ("outs", 14, 5, 8, 4), 0xA4: ("movs", 18, 5, 17, 4),
+    0xA6: ("cmps", 22, 8, 22, 9), 0xAA: ("stos", 11, 3, 10, 3), 0xAC: ("lods", 12, 5, 13, 4),
+    0xAE: ("scas", 15, 7, 15, 8),
+}
+# Fixed one-byte instructions: name, 8086, 286.
+_SIMPLE = {
+    0x27: ("daa", 4, 3), 0x2F: ("das", 4, 3), 0x37: ("aaa", 4, 3), 0x3F: ("aas", 4, 3),
+    0x60: ("pusha", 36, 17), 0x61: ("popa", 51, 19), 0x90: ("nop", 3, 3), 0x98: ("cbw", 2, 2),
+    0x99: ("cwd", 5, 2), 0x9B: ("wait", 4, 3), 0x9C: ("pushf", 10, 3), 0x9D: ("popf", 8, 5),
+    0x9E: ("sahf", 4, 2), 0x9F: ("lahf", 4, 2), 0xC3: ("ret", 16, 11), 0xC9: ("leave", 8, 5),
+    0xCB: ("retf", 26, 15), 0xCC: ("int3", 52, 23), 0xCE: ("into", 4, 3), 0xCF: ("iret", 24, 17),
+    0xD6: ("salc", 4, 3), 0xD7: ("xlat", 11, 5), 0xEC: ("in", 8, 5), 0xED: ("in", 8, 5),
+    0xEE: ("out", 8, 3), 0xEF: ("out", 8, 3), 0xF4: ("hlt", 2, 2), 0xF5: ("cmc", 2, 2),
+    0xF8: ("clc", 2, 2), 0xF9: ("stc", 2, 2), 0xFA: ("cli", 2, 3), 0xFB: ("sti", 2, 2),
+    0xFC: ("cld", 2, 2), 0xFD: ("std", 2, 2),
+}
+_RETURNS = {"ret", "retf", "iret"}
+
+
+class Instruction:
+    """One decoded instruction. cycles is an (8086, 286) pair; taken is the cost of a
+    conditional branch that is taken, and repeat the cost of each further element of a
+    REP string instruction or bit of a shift by CL."""
+
+    __slots__ = ("source", "line", "offset", "size", "name", "cycles", "taken", "repeat", "target")
+
+    def __init__(self, source, line, offset, size, name, cycles, taken=None, repeat=None, target=None):
+        self.source = source
+        self.line = line
+        self.offset = offset
+        self.size = size
+        self.name = name
+        self.cycles = cycles
+        self.taken = taken
+        self.repeat = repeat
+        self.target = target
+
+    @property
+    def backward(self):
+        return self.target is not None and self.target <= self.offset
+
+    def price(self):
+        """(8086, 286) cycles for one execution, with one element for REP strings and
+        backward conditional branches taken."""
+        cycles = self.taken if self.taken is not None and self.backward else self.cycles
+        if self.repeat is not None:
+            cycles = (cycles[0] + self.repeat[0], cycles[1] + self.repeat[1])
+        return cycles
+
+
+def _modrm(data, position):
+    """(bytes used by ModRM and its displacement, memory operand?, 8086 EA cycles, reg field)."""
+    modrm = data[position]
+    mod = modrm >> 6
+    rm = modrm & 7
+    reg = (modrm >> 3) & 7
+    if mod == 3:
+        return 1, False, 0, reg
+    if mod == 0:
+        if rm == 6:
+            return 3, True, 6, reg
+        return 1, True, _EA_PLAIN[rm], reg
+    return 1 + mod, True, _EA_DISPLACED[rm], reg
+
+
+def _decode(data, position, override):
+    """Decode the instruction at data[position] after its prefixes.
+
+    Returns (size, name, cycles, taken, repeat, relative target) or None for
+    encodings the tables do not know. override is the 8086 cost of a segment
+    override prefix, added to every memory operand.
+    """
+    opcode = data[position]
+    if opcode < 0x40 and opcode & 7 < 6:
+        name = _ALU_NAMES[opcode >> 3]
+        form = opcode & 7
+        if form >= 4:
+            return 2 + (form & 1), name, (4, 3), None, None, None
+        used, memory, ea, _ = _modrm(data, position + 1)
+        if not memory:
+            cycles = (3, 2)
+        elif form >= 2:
+            cycles = (9 + ea + override, 7)
+        else:
+            cycles = (9 + ea + override, 6) if name == "cmp" else (16 + ea + override, 7)
+        return 1 + used, name, cycles, None, None, None
+    if opcode in (0x06, 0x0E, 0x16, 0x1E):
+        return 1, "push", (10, 3), None, None, None
+    if opcode in (0x07, 0x17, 0x1F):
+        return 1, "pop", (8, 5), None, None, None
+    if opcode in _SIMPLE:
+        name, c8086, c286 = _SIMPLE[opcode]
+        return 1, name, (c8086, c286), None, None, None
+    if 0x40 <= opcode < 0x50:
+        return 1, "inc" if opcode < 0x48 else "dec", (2, 2), None, None, None
+    if 0x50 <= opcode < 0x58:
+        return 1, "push", (11, 3), None, None, None
+    if 0x58 <= opcode < 0x60:
+        return 1, "pop", (8, 5), None, None, None
+    if opcode in (0x68, 0x6A):
+        return 3 if opcode == 0x68 else 2, "push", (10, 3), None, None, None
+    if opcode in (0x69, 0x6B):
+        used, memory, ea, _ = _modrm(data, position + 1)
+        cycles = (25 + ea + override, 24) if memory else (25, 21)
+        return 1 + used + (2 if opcode == 0x69 else 1), "imul", cycles, None, None, None
+    if 0x70 <= opcode < 0x80:
+        displacement = int.from_bytes(data[position + 1:position + 2], "little", signed=True)
+        return 2, "j" + _CONDITIONS[opcode & 15], (4, 3), (16, 7), None, 2 + displacement
+    if 0x80 <= opcode <= 0x83:
+        used, memory, ea, reg = _modrm(data, position + 1)
+        name = _ALU_NAMES[reg]
+        if not memory:
+            cycles = (4, 3)
+        else:
+            cycles = (10 + ea + override, 6) if name == "cmp" else (17 + ea + override, 7)
+        return 1 + used + (2 if opcode == 0x81 else 1), name, cycles, None, None, None
+    if 0x84 <= opcode <= 0x8F:
+        used, memory, ea, _ = _modrm(data, position + 1)
+        # Register form, then memory form with the 8086 EA cost added.
+        name, register_cycles, memory_cycles = {
+            0x84: ("test", (3, 2), (9, 6)), 0x85: ("test", (3, 2), (9, 6)),
+            0x86: ("xchg", (4, 3), (17, 5)), 0x87: ("xchg", (4, 3), (17, 5)),
+            0x88: ("mov", (2, 2), (9, 3)), 0x89: ("mov", (2, 2), (9, 3)),
+            0x8A: ("mov", (2, 2), (8, 5)), 0x8B: ("mov", (2, 2), (8, 5)),
+            0x8C: ("mov", (2, 2), (9, 3)), 0x8D: ("lea", (2, 3), (2, 3)),
+            0x8E: ("mov", (2, 2), (8, 5)), 0x8F: ("pop", (8, 5), (17, 5)),
+        }[opcode]
+        cycles = (memory_cycles[0] + ea + override, memory_cycles[1]) if memory else register_cycles
+        return 1 + used, name, cycles, None, None, None
+    if 0x91 <= opcode <= 0x97:
+        return 1, "xchg", (3, 3), None, None, None
+    if opcode == 0x9A:
+        return 5, "call far", (28, 13), None, None, None
+    if 0xA0 <= opcode <= 0xA3:
+        return 3, "mov", (10 + override, 5 if opcode < 0xA2 else 3), None, None, None
+    if opcode in (0xA8, 0xA9):
+        return 2 + (opcode & 1), "test", (4, 3), None, None, None
+    if 0xB0 <= opcode < 0xC0:
+        return 2 if opcode < 0xB8 else 3, "mov", (4, 2), None, None, None
+    if opcode in (0xC0, 0xC1, 0xD0, 0xD1, 0xD2, 0xD3):
+        used, memory, ea, reg = _modrm(data, position + 1)
+        name = _SHIFT_NAMES[reg]
+        if opcode <= 0xC1:
+            count = data[position + 1 + used] & 31
+            cycles = (17 + ea + override + count, 8 + count) if memory else (5 + count, 5 + count)
+            return 2 + used, name, cycles, None, None, None
+        if opcode <= 0xD1:
+            cycles = (15 + ea + override, 7) if memory else (2, 2)
+            return 1 + used, name, cycles, None, None, None
+        cycles = (20 + ea + override, 8) if memory else (8, 5)
+        return 1 + used, name, cycles, None, (4, 1), None
+    if opcode in (0xC2, 0xCA):
+        return 3, "ret" if opcode == 0xC2 else "retf", (20, 11) if opcode == 0xC2 else (25, 15), None, None, None
+    if opcode in (0xC4, 0xC5):
+        used, _, ea, _ = _modrm(data, position + 1)
+        return 1 + used, "les" if opcode == 0xC4 else "lds", (16 + ea + override, 7), None, None, None
+    if opcode in (0xC6, 0xC7):
+        used, memory, ea, _ = _modrm(data, position + 1)
+        cycles = (10 + ea + override, 3) if memory else (4, 2)
+        return 1 + used + (2 if opcode == 0xC7 else 1), "mov", cycles, None, None, None
+    if opcode == 0xC8:
+        return 4, "enter", (15, 11), None, None, None
+    if opcode == 0xCD:
+        return 2, "int", (51 + BIOS_CALL_CYCLES[0], 23 + BIOS_CALL_CYCLES[1]), None, None, None
+    if opcode in (0xD4, 0xD5):
+        return 2, "aam" if opcode == 0xD4 else "aad", (83, 16) if opcode == 0xD4 else (60, 14), None, None, None
+    if 0xE0 <= opcode <= 0xE3:
+        displacement = int.from_bytes(data[position + 1:position + 2], "little", signed=True)
+        name, fallthrough, taken = (
+            ("loopne", (5, 4), (19, 8)), ("loope", (6, 4), (18, 8)),
+            ("loop", (5, 4), (17, 8)), ("jcxz", (6, 4), (18, 8)),
+        )[opcode - 0xE0]
+        return 2, name, fallthrough, taken, None, 2 + displacement
+    if opcode in (0xE4, 0xE5):
+        return 2, "in", (10, 5), None, None, None
+    if opcode in (0xE6, 0xE7):
+        return 2, "out", (10, 3), None, None, None
+    if opcode in (0xE8, 0xE9):
+        displacement = int.from_bytes(data[position + 1:position + 3], "little", signed=True)
+        if opcode == 0xE8:
+            return 3, "call", (19, 7), None, None, 3 + displacement
+        return 3, "jmp", (15, 7), None, None, 3 + displacement
+    if opcode == 0xEA:
+        return 5, "jmp far", (15, 11), None, None, None
+    if opcode == 0xEB:
+        displacement = int.from_bytes(data[position + 1:position + 2], "little", signed=True)
+        return 2, "jmp", (15, 7), None, None, 2 + displacement
+    if opcode in (0xF6, 0xF7):
+        used, memory, ea, reg = _modrm(data, position + 1)
+        word = opcode & 1
+        if reg < 2:
+            cycles = (11 + ea + override, 6) if memory else (5, 3)
+            return 1 + used + 1 + word, "test", cycles, None, None, None
+        name = ("test", "test", "not", "neg", "mul", "imul", "div", "idiv")[reg]
+        register_cycles = {
+            "not": ((3, 2), (3, 2)), "neg": ((3, 2), (3, 2)),
+            "mul": ((77, 13), (133, 21)), "imul": ((98, 13), (154, 21)),
+            "div": ((90, 14), (162, 22)), "idiv": ((112, 17), (184, 25)),
+        }[name][word]
+        if memory:
+            extra = 13 if reg < 4 else 6
+            cycles = (register_cycles[0] + extra + ea + override, register_cycles[1] + (5 if reg < 4 else 3))
+        else:
+            cycles = register_cycles
+        return 1 + used, name, cycles, None, None, None
+    if opcode in (0xFE, 0xFF):
+        used, memory, ea, reg = _modrm(data, position + 1)
+        if reg < 2:
+            cycles = (15 + ea + override, 7) if memory else (3, 2)
+            return 1 + used, "inc" if reg == 0 else "dec", cycles, None, None, None
+        if opcode == 0xFE or reg == 7:
+            return None
+        name, register_cycles, memory_cycles = (
+            ("call", (16, 7), (21, 11)), ("call far", None, (37, 16)), ("jmp", (11, 7), (18, 11)),
+            ("jmp far", None, (24, 15)), ("push", (11, 3), (16, 5)),
+        )[reg - 2]
+        if not memory:
+            return (1 + used, name, register_cycles, None, None, None) if register_cycles else None
+        return 1 + used, name, (memory_cycles[0] + ea + override, memory_cycles[1]), None, None, None
+    if opcode == 0x0F:
+        second = data[position + 1]
+        # 386 forms NASM emits in 16-bit code; the 286 cannot run them, so both
+        # columns use the nearest 286 timing.
+        if 0x80 <= second <= 0x8F:
+            displacement = int.from_bytes(data[position + 2:position + 4], "little", signed=True)
+            return 4, "j" + _CONDITIONS[second & 15], (4, 3), (16, 7), None, 4 + displacement
+        if 0x90 <= second <= 0x9F or second in (0xB6, 0xB7, 0xBE, 0xBF, 0xAF):
+            used, memory, ea, _ = _modrm(data, position + 2)
+            if second == 0xAF:
+                return 2 + used, "imul", ((154 + ea + override, 24) if memory else (154, 21)), None, None, None
+            name = "set" + _CONDITIONS[second & 15] if second < 0xA0 else ("movzx" if second < 0xBE else "movsx")
+            return 2 + used, name, ((8 + ea + override, 5) if memory else (3, 3)), None, None, None
+    return None
+
+
+def decode_row(data, source=None, line=0, offset=0):
+    """Decode the bytes one listing row produced into Instructions.
+
+    Bytes the tables do not know become a single unpriced "unknown" entry.
+    """
+    instructions = []
+    position = 0
+    while position < len(data):
+        start = position
+        override = 0
+        repeat = False
+        try:
+            while data[position] in (0x26, 0x2E, 0x36, 0x3E, 0xF0, 0xF2, 0xF3):
+                if data[position] in (0xF2, 0xF3):
+                    repeat = True
+                else:
+                    override = 2
+                position += 1
+            opcode = data[position]
+            string = _STRINGS.get(opcode & 0xFE)
+            if string is not None:
+                name, c8086, c286, r8086, r286 = string
+                if repeat:
+                    # The fixed REP setup replaces the single-element timing.
+                    decoded = (1, "rep " + name, (9, 5), None, (r8086, r286), None)
+                else:
+                    decoded = (1, name, (c8086 + override, c286), None, None, None)
+            else:
+                decoded = _decode(data, position, override)
+            if decoded is not None and position + decoded[0] > len(data):
+                decoded = None
+        except IndexError:
+            decoded = None
+        if decoded is None:
+            instructions.append(Instruction(source, line, offset + start, len(data) - start, "unknown", (0, 0)))
+            break
+        size, name, cycles, taken, repeat_cycles, relative = decoded
+        size += position - start
+        instructions.append(Instruction(
+            source, line, offset + start, size, name, cycles, taken, repeat_cycles,
+            None if relative is None else (offset + position + relative) & 0xFFFF,
+        ))
+        position = start + size
+    return instructions
+
+
+class Loop:
+    """A loop body priced for one pass: source and line of its first instruction,
+    cycles per pass, and whether another loop or REP string runs inside it."""
+
+    def __init__(self, source, line, per_pass, innermost=True, outermost=True):
+        self.source = source
+        self.line = line
+        self.per_pass = per_pass
+        self.innermost = innermost
+        self.outermost = outermost
+
+
+class Cost:
+    """Bytes, cycles for code that runs once, and loops priced per pass."""
+
+    def __init__(self, size=0, cycles=(0, 0), loops=None, unpriced=0):
+        self.size = size
+        self.cycles = cycles
+        self.loops = loops or []
+        self.unpriced = unpriced
+
+    def add(self, other):
+        self.size += other.size
+        self.cycles = _add(self.cycles, other.cycles)
+        self.loops.extend(other.loops)
+        self.unpriced += other.unpriced
+
+    @property
+    def once(self):
+        """Cycles to run everything once, each outermost loop for a single pass."""
+        total = self.cycles
+        for loop in self.loops:
+            if loop.outermost:
+                total = _add(total, loop.per_pass)
+        return total
+
+    def hottest(self, cpu=0):
+        """The innermost loop with the most cycles per pass, or None."""
+        inner = [loop for loop in self.loops if loop.innermost]
+        return max(inner, key=lambda loop: loop.per_pass[cpu], default=None)
+
+    def label(self, cpu=0):
+        text = f"{self.size} B · {format_cycles(self.cycles[cpu])} cyc"
+        hottest = self.hottest(cpu)
+        if hottest is not None:
+            text += f" · {format_cycles(hottest.per_pass[cpu])}/pass"
+        return text
+
+
+def _add(a, b):
+    return a[0] + b[0], a[1] + b[1]
+
+
+def format_cycles(count):
+    if count < 10_000:
+        return str(count)
+    if count < 1_000_000:
+        return f"{count / 1000:.1f}k"
+    return f"{count / 1_000_000:.1f}M"
+
+
+def is_data(text):
+    return bool(_DATA_RE.match(text))
+
+
+class UnitCosts:
+    """Decoded instructions of one assembled unit, with loop and call analysis."""
+
+    def __init__(self, listing_lines):
+        self.instructions = []
+        for entry in _merge_rows(listing_lines):
+            if is_data(entry.text):
+                self.instructions.append(Instruction(entry.source, entry.line, entry.offset, entry.size, "db", None))
+            else:
+                self.instructions.extend(decode_row(entry.data, entry.source, entry.line, entry.offset))
+        self.instructions.sort(key=lambda instruction: instruction.offset)
+        self.by_offset = {instruction.offset: index for index, instruction in enumerate(self.instructions)}
+        # Loops are (first index, last index) ranges closed by a backward branch.
+        self.loops = []
+        for index, instruction in enumerate(self.instructions):
+            if instruction.backward and instruction.name not in ("call", "call far") and instruction.target in self.by_offset:
+                self.loops.append((self.by_offset[instruction.target], index))
+        self.callees = {}
+
+    @property
+    def size(self):
+        return sum(instruction.size for instruction in self.instructions)
+
+    def cost(self, indexes, own=None):
+        """Cost of the instructions at indexes, with loops whose closing branch is among them.
+
+        Calls into code outside own (default: indexes) add one pass through the callee.
+        """
+        indexes = sorted(set(indexes))
+        own = set(indexes) if own is None else own
+        chosen = set(indexes)
+        ranges = [(first, last) for first, last in self.loops if last in chosen]
+        total = Cost()
+        looped = set()
+        for first, last in ranges:
+            looped.update(range(first, last + 1))
+        callee_loops = []
+        for index in indexes:
+            instruction = self.instructions[index]
+            total.size += instruction.size
+            if instruction.cycles is None:
+                continue
+            if instruction.name == "unknown":
+                total.unpriced += 1
+            if index not in looped:
+                total.cycles = _add(total.cycles, self._inclusive(instruction, own, callee_loops))
+            if instruction.repeat is not None:
+                # One element is already in the instruction's price; this is the cost of each further one.
+                total.loops.append(Loop(instruction.source, instruction.line, instruction.repeat, True, False))
+        for first, last in ranges:
+            per_pass = (0, 0)
+            for index in range(first, last + 1):
+                if self.instructions[index].cycles is not None:
+                    per_pass = _add(per_pass, self._inclusive(self.instructions[index], own, callee_loops))
+            nested = any(
+                (other_first, other_last) != (first, last) and first <= other_first and other_last <= last
+                for other_first, other_last in ranges
+            ) or any(self.instructions[index].repeat is not None for index in range(first, last + 1))
+            outer = not any(
+                (other_first, other_last) != (first, last) and other_first <= first and last <= other_last
+                for other_first, other_last in ranges
+            )
+            head = self.instructions[first]
+            total.loops.append(Loop(head.source, head.line, per_pass, not nested, outer))
+        for loop in callee_loops:
+            # A callee's loops run inside the caller; they only count towards its hottest loop.
+            total.loops.append(Loop(loop.source, loop.line, loop.per_pass, loop.innermost, False))
+        return total
+
+    def _inclusive(self, instruction, own, callee_loops):
+        cycles = instruction.price()
+        if instruction.name == "call" and instruction.target in self.by_offset:
+            start = self.by_offset[instruction.target]
+            if start not in own:
+                callee = self.callee(start)
+                cycles = _add(cycles, callee.once)
+                callee_loops.extend(callee.loops)
+        return cycles
+
+    def callee(self, start):
+        """Cost of the routine at index start, up to and including its first return."""
+        if start in self.callees:
+            return self.callees[start]
+        # Recursive calls are priced as a single pass.
+        self.callees[start] = Cost()
+        end = start
+        while end < len(self.instructions) - 1 and self.instructions[end].name not in _RETURNS:
+            end += 1
+        self.callees[start] = self.cost(range(start, end + 1))
+        return self.callees[start]
+
+
+def _merge_rows(lines):
+    """Join rows that continue the previous row's bytes, so long instructions decode whole."""
+    merged = []
+    for entry in sorted(lines, key=lambda entry: entry.offset):
+        previous = merged[-1] if merged else None
+        if (previous is not None and previous.source == entry.source and previous.line == entry.line
+                and previous.offset + previous.size == entry.offset and not entry.text.strip()
+                and len(previous.data) % 9 == 0):
+            previous.data += entry.data
+        else:
+            merged.append(_Row(entry.source, entry.line, entry.offset, entry.data, entry.text))
+    return merged
+
+
+class _Row:
+    __slots__ = ("source", "line", "offset", "data", "text")
+
+    def __init__(self, source, line, offset, data, text):
+        self.source = source
+        self.line = line
+        self.offset = offset
+        self.data = data
+        self.text = text
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+class CostReport:
+    def __init__(self, project_dir, listings):
+        """listings are (listing, source) pairs as returned by Compiler.member_listings."""
+        self.project_dir = os.path.abspath(project_dir)
+        self.missing_listings = []
+        self.units = []
+        self.nodes = {}
+        self.node_labels = {}
+        self.functions = []
+        for listing, source in listings:
+            try:
+                lines, _ = parse_listing(listing, source)
+            except OSError:
+                self.missing_listings.append(os.path.relpath(listing, self.project_dir))
+                continue
+            unit = UnitCosts(lines)
+            self.units.append((source, unit, unit.cost(range(len(unit.instructions)))))
+            self._add_nodes(unit)
+
+    def _add_nodes(self, unit):
+        by_source = {}
+        for index, instruction in enumerate(unit.instructions):
+            by_source.setdefault(instruction.source, []).append(index)
+        for source, indexes in by_source.items():
+            node_map = load_node_map(self.project_dir, source)
+            if node_map is None:
+                continue
+            by_node = {}
+            for index in indexes:
+                node_id = node_map.node_at(unit.instructions[index].line)
+                if node_id is not None:
+                    by_node.setdefault(node_id, []).append(index)
+            for node_id, node_indexes in by_node.items():
+                self.nodes[node_id] = unit.cost(node_indexes)
+                self.node_labels[node_id] = f"{node_map.name(node_id)} ({self.relative(source)})"
+            for name, node_ids in function_chains(self.project_dir, os.path.basename(source)):
+                total = Cost()
+                for node_id in node_ids:
+                    if node_id in self.nodes:
+                        total.add(self.nodes[node_id])
+                self.functions.append((f"{name} ({self.relative(source)})", node_ids, total))
+
+    def relative(self, path):
+        return os.path.relpath(path, self.project_dir)
+
+    def node_badges(self, cpu=0):
+        """Map node_id to a size/cycles badge for BlockCanvas.apply_costs. A chain's first
+        node shows the total for the whole function."""
+        badges = {node_id: cost.label(cpu) for node_id, cost in self.nodes.items()}
+        for _, node_ids, total in self.functions:
+            if node_ids:
+                badges[node_ids[0]] = "Σ " + total.label(cpu)
+        return badges
+
+    def table_lines(self, cpu=0, limit=15):
+        name = CPUS[cpu]
+        lines = []
+        if self.missing_listings:
+            lines.append("No NASM listing for " + ", ".join(self.missing_listings) + "; rebuild to create it.")
+        for source, unit, total in self.units:
+            lines.append(
+                f"{self.relative(source)}: {total.size} bytes, {total.cycles[cpu]} {name} cycles outside loops, "
+                f"{len(total.loops)} loop(s)"
+                + (f", {total.unpriced} unpriced instruction(s)" if total.unpriced else "")
+            )
+        if self.functions:
+            lines.append(f"   bytes  {name} cyc   hottest/pass  function")
+            for label, _, total in self.functions:
+                lines.append(self._row(total, cpu, label))
+        if self.nodes:
+            lines.append(f"   bytes  {name} cyc   hottest/pass  node")
+            ranked = sorted(self.nodes.items(), key=lambda item: _rank(item[1], cpu), reverse=True)
+            for node_id, cost in ranked[:limit]:
+                lines.append(self._row(cost, cpu, self.node_labels[node_id]))
+        loops = [loop for _, _, total in self.units for loop in total.loops if loop.innermost]
+        loops.sort(key=lambda loop: loop.per_pass[cpu], reverse=True)
+        if loops:
+            lines.append(f"  {name} cyc/pass  innermost loop")
+            for loop in loops[:limit]:
+                lines.append(f"  {loop.per_pass[cpu]:12d}  {self.relative(loop.source)}:{loop.line}")
+        return lines
+
+    @staticmethod
+    def _row(cost, cpu, label):
+        hottest = cost.hottest(cpu)
+        per_pass = f"{hottest.per_pass[cpu]:12d}" if hottest is not None else " " * 11 + "-"
+        return f"  {cost.size:6d}  {cost.cycles[cpu]:8d}  {per_pass}  {label}"
+
+    def to_dict(self):
+        def cost_dict(cost):
+            hottest = cost.hottest()
+            return {
+                "bytes": cost.size,
+                "cycles": dict(zip(CPUS, cost.cycles)),
+                "once": dict(zip(CPUS, cost.once)),
+                "hottest_loop": None if hottest is None else {
+                    "source": self.relative(hottest.source), "line": hottest.line,
+                    "cycles_per_pass": dict(zip(CPUS, hottest.per_pass)),
+                },
+                "loops": len(cost.loops),
+                "unpriced": cost.unpriced,
+            }
+
+        return {
+            "units": [{"source": self.relative(source), **cost_dict(total)} for source, _, total in self.units],
+            "functions": [{"function": label, **cost_dict(total)} for label, _, total in self.functions],
+            "nodes": [
+                {"node_id": node_id, "label": self.node_labels[node_id], **cost_dict(cost)}
+                for node_id, cost in self.nodes.items()
+            ],
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+
+
+def _rank(cost, cpu):
+    hottest = cost.hottest(cpu)
+    return (hottest.per_pass[cpu] if hottest is not None else 0, cost.cycles[cpu])
@@ -0,0 +1,959 @@
+"""Dependency-free 16-bit real-mode x86 CPU core: the 8086 instruction set plus
+the 80186 additions (pusha/popa, push/imul immediates, shifts by immediate,
+enter/leave, ins/outs), plus the few 386 two-byte forms NASM emits in 16-bit
+code (near conditional jumps, setcc, movzx/movsx, two-operand imul).
+
+The core only decodes and executes instructions. Memory is a flat 1 MB
+bytearray; port I/O goes through the port_in/port_out callbacks, and BIOS
+services are left to the machine around it (see virtual_pc.py).
+"""
+
+CF = 0x0001
+PF = 0x0004
+AF = 0x0010
+ZF = 0x0040
+SF = 0x0080
+TF = 0x0100
+IF = 0x0200
+DF = 0x0400
+OF = 0x0800
+ARITHMETIC_FLAGS = CF | PF | AF | ZF | SF | OF
+WRITABLE_FLAGS = ARITHMETIC_FLAGS | TF | IF | DF
+
+AX, CX, DX, BX, SP, BP, SI, DI = range(8)
+ES, CS, SS, DS = range(4)
+
+MEMORY_SIZE = 0x100000
+ADDRESS_MASK = MEMORY_SIZE - 1
+
+_PARITY = bytes(PF if bin(value).count("1") % 2 == 0 else 0 for value in range(256))
+# Base registers of the sixteen-bit ModRM addressing forms.
+_EA_BASE = ((BX, SI), (BX, DI), (BP, SI), (BP, DI), (SI,), (DI,), (BP,), (BX,))
+_STRING_KINDS = (0x6C, 0x6E, 0xA4, 0xA6, 0xAA, 0xAC, 0xAE)
+
+
+class CPUError(Exception):
+    pass
+
+
+class CPU:
+    def __init__(self, port_in=None, port_out=None):
+        self.memory = bytearray(MEMORY_SIZE)
+        self.regs = [0] * 8
+        self.sregs = [0] * 4
+        self.ip = 0
+        self.flags = 0x0002
+        self.halted = False
+        self.port_in = port_in or (lambda port, word: 0xFFFF if word else 0xFF)
+        self.port_out = port_out or (lambda port, value, word: None)
+        self.segment = None
+        self.repeat = 0
+        self.start_ip = 0
+        self._ea = 0
+        self._ea_segment = None
+        self._rm = 0
+        self._ops = [self._op_invalid] * 256
+        self._build_table()
+
+    # Registers, memory and stack
+
+    def get_reg8(self, index):
+        value = self.regs[index & 3]
+        return value >> 8 if index & 4 else value & 0xFF
+
+    def set_reg8(self, index, value):
+        register = index & 3
+        if index & 4:
+            self.regs[register] = (self.regs[register] & 0x00FF) | ((value & 0xFF) << 8)
+        else:
+            self.regs[register] = (self.regs[register] & 0xFF00) | (value & 0xFF)
+
+    def read8(self, segment, offset):
+        return self.memory[((segment << 4) + (offset & 0xFFFF)) & ADDRESS_MASK]
+
+    def read16(self, segment, offset):
+        base = segment << 4
+        memory = self.memory
+        return (memory[(base + (offset & 0xFFFF)) & ADDRESS_MASK]
+                | (memory[(base + ((offset + 1) & 0xFFFF)) & ADDRESS_MASK] << 8))
+
+    def write8(self, segment, offset, value):
+        self.memory[((segment << 4) + (offset & 0xFFFF)) & ADDRESS_MASK] = value & 0xFF
+
+    def write16(self, segment, offset, value):
+        base = segment << 4
+        self.memory[(base + (offset & 0xFFFF)) & ADDRESS_MASK] = value & 0xFF
+        self.memory[(base + ((offset + 1) & 0xFFFF)) & ADDRESS_MASK] = (value >> 8) & 0xFF
+
+    def fetch8(self):
+        value = self.memory[((self.sregs[CS] << 4) + self.ip) & ADDRESS_MASK]
+        self.ip = (self.ip + 1) & 0xFFFF
+        return value
+
+    def fetch16(self):
+        low = self.fetch8()
+        return low | (self.fetch8() << 8)
+
+    def fetch_signed8(self):
+        value = self.fetch8()
+        return value - 0x100 if value & 0x80 else value
+
+    def push(self, value):
+        sp = (self.regs[SP] - 2) & 0xFFFF
+        self.regs[SP] = sp
+        self.write16(self.sregs[SS], sp, value)
+
+    def pop(self):
+        sp = self.regs[SP]
+        self.regs[SP] = (sp + 2) & 0xFFFF
+        return self.read16(self.sregs[SS], sp)
+
+    def jump_far(self, segment, offset):
+        self.sregs[CS] = segment & 0xFFFF
+        self.ip = offset & 0xFFFF
+
+    def interrupt(self, number):
+        """Enter interrupt number through the interrupt vector table."""
+        self.push(self.flags)
+        self.push(self.sregs[CS])
+        self.push(self.ip)
+        self.flags &= ~(IF | TF)
+        self.jump_far(self.read16(0, number * 4 + 2), self.read16(0, number * 4))
+
+    def iret(self):
+        self.ip = self.pop()
+        self.sregs[CS] = self.pop()
+        self.flags = (self.pop() & WRITABLE_FLAGS) | 0x0002
+
+    def divide_error(self):
+        # Like the 286 and later, the return address is the faulting instruction.
+        self.ip = self.start_ip
+        self.interrupt(0)
+
+    # Operand decoding
+
+    def decode_modrm(self):
+        """Decode a ModRM byte and return its reg field; the r/m operand is kept for read_rm/write_rm."""
+        modrm = self.fetch8()
+        mod = modrm >> 6
+        rm = modrm & 7
+        if mod == 3:
+            self._ea_segment = None
+            self._rm = rm
+        else:
+            if mod == 0 and rm == 6:
+                offset = self.fetch16()
+                default = DS
+            else:
+                offset = 0
+                for register in _EA_BASE[rm]:
+                    offset += self.regs[register]
+                if mod == 1:
+                    offset += self.fetch_signed8()
+                elif mod == 2:
+                    offset += self.fetch16()
+                default = SS if rm in (2, 3, 6) else DS
+            self._ea_segment = self.sregs[default if self.segment is None else self.segment]
+            self._ea = offset & 0xFFFF
+        return (modrm >> 3) & 7
+
+    def read_rm(self, word):
+        if self._ea_segment is None:
+            return self.regs[self._rm] if word else self.get_reg8(self._rm)
+        if word:
+            return self.read16(self._ea_segment, self._ea)
+        return self.read8(self._ea_segment, self._ea)
+
+    def write_rm(self, word, value):
+        if self._ea_segment is None:
+            if word:
+                self.regs[self._rm] = value & 0xFFFF
+            else:
+                self.set_reg8(self._rm, value)
+        elif word:
+            self.write16(self._ea_segment, self._ea, value)
+        else:
+            self.write8(self._ea_segment, self._ea, value)
+
+    def _memory_operand(self):
+        if self._ea_segment is None:
+            raise CPUError(f"Instruction at {self.sregs[CS]:04X}:{self.start_ip:04X} needs a memory operand.")
+        return self._ea_segment, self._ea
+
+    def get_reg(self, index, word):
+        return self.regs[index] if word else self.get_reg8(index)
+
+    def set_reg(self, index, word, value):
+        if word:
+            self.regs[index] = value & 0xFFFF
+        else:
+            self.set_reg8(index, value)
+
+    def data_segment(self):
+        return self.sregs[DS if self.segment is None else self.segment]
+
+    # Flags and arithmetic
+
+    @staticmethod
+    def _szp(value, word):
+        flags = _PARITY[value & 0xFF]
+        if not value:
+            flags |= ZF
+        if value & (0x8000 if word else 0x80):
+            flags |= SF
+        return flags
+
+    def alu(self, op, a, b, word):
+        """ADD, OR, ADC, SBB, AND, SUB, XOR, CMP by their opcode number; sets the flags."""
+        mask = 0xFFFF if word else 0xFF
+        sign = 0x8000 if word else 0x80
+        if op == 0 or op == 2:
+            result = a + b + (self.flags & CF if op == 2 else 0)
+            flags = CF if result > mask else 0
+            result &= mask
+            if (a ^ result) & (b ^ result) & sign:
+                flags |= OF
+            flags |= (a ^ b ^ result) & AF
+        elif op == 3 or op == 5 or op == 7:
+            result = a - b - (self.flags & CF if op == 3 else 0)
+            flags = CF if result < 0 else 0
+            result &= mask
+            if (a ^ b) & (a ^ result) & sign:
+                flags |= OF
+            flags |= (a ^ b ^ result) & AF
+        else:
+            result = a | b if op == 1 else a & b if op == 4 else a ^ b
+            flags = 0
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | flags | self._szp(result, word)
+        return result
+
+    def step_value(self, value, word, delta):
+        """INC or DEC, which leave CF alone."""
+        mask = 0xFFFF if word else 0xFF
+        sign = 0x8000 if word else 0x80
+        result = (value + delta) & mask
+        flags = (self.flags & CF) | ((value ^ result ^ 1) & AF)
+        if (delta > 0 and result == sign) or (delta < 0 and value == sign):
+            flags |= OF
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | flags | self._szp(result, word)
+        return result
+
+    def shift(self, op, value, count, word):
+        """ROL, ROR, RCL, RCR, SHL, SHR, SAL, SAR by their ModRM reg number."""
+        count &= 0x1F
+        if not count:
+            return value
+        bits = 16 if word else 8
+        mask = (1 << bits) - 1
+        top = bits - 1
+        if op < 4:
+            carry = self.flags & CF
+            overflow = 0
+            for _ in range(count):
+                if op == 0:
+                    carry = value >> top
+                    value = ((value << 1) | carry) & mask
+                elif op == 1:
+                    carry = value & 1
+                    value = (value >> 1) | (carry << top)
+                elif op == 2:
+                    value, carry = ((value << 1) | carry) & mask, value >> top
+                else:
+                    overflow = (value >> top) ^ carry
+                    value, carry = (value >> 1) | (carry << top), value & 1
+            if op == 1:
+                overflow = (value >> top) ^ ((value >> (top - 1)) & 1)
+            elif op != 3:
+                overflow = (value >> top) ^ carry
+            flags = (CF if carry else 0) | (OF if overflow & 1 else 0)
+            self.flags = (self.flags & ~(CF | OF)) | flags
+            return value
+        if op == 5:
+            carry = (value >> (count - 1)) & 1
+            overflow = value >> top
+            result = value >> count
+        elif op == 7:
+            signed = value - (1 << bits) if value >> top else value
+            carry = (signed >> (count - 1)) & 1
+            overflow = 0
+            result = (signed >> count) & mask
+        else:
+            shifted = value << count
+            carry = (shifted >> bits) & 1
+            result = shifted & mask
+            overflow = (result >> top) ^ carry
+        flags = (CF if carry else 0) | (OF if overflow & 1 else 0)
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | flags | self._szp(result, word)
+        return result
+
+    def condition(self, code):
+        """Jcc condition code 0-15 as used by opcodes 0x70-0x7F."""
+        flags = self.flags
+        test = code >> 1
+        if test == 0:
+            taken = flags & OF
+        elif test == 1:
+            taken = flags & CF
+        elif test == 2:
+            taken = flags & ZF
+        elif test == 3:
+            taken = flags & (CF | ZF)
+        elif test == 4:
+            taken = flags & SF
+        elif test == 5:
+            taken = flags & PF
+        else:
+            taken = bool(flags & SF) != bool(flags & OF)
+            if test == 7:
+                taken = taken or flags & ZF
+        return bool(taken) != bool(code & 1)
+
+    # Execution
+
+    def step(self):
+        """Execute one instruction, with its prefixes."""
+        self.start_ip = self.ip
+        self.segment = None
+        self.repeat = 0
+        while True:
+            opcode = self.fetch8()
+            if opcode in (0x26, 0x2E, 0x36, 0x3E):
+                self.segment = (opcode >> 3) & 3
+            elif opcode == 0xF2 or opcode == 0xF3:
+                self.repeat = opcode
+            elif opcode != 0xF0:
+                break
+        self._ops[opcode](opcode)
+
+    def _build_table(self):
+        table = self._ops
+        for base in range(0x00, 0x40, 8):
+            for form in range(6):
+                table[base + form] = self._op_alu
+        for opcode in (0x06, 0x0E, 0x16, 0x1E):
+            table[opcode] = self._op_push_segment
+        for opcode in (0x07, 0x17, 0x1F):
+            table[opcode] = self._op_pop_segment
+        table[0x27] = table[0x2F] = self._op_decimal_adjust
+        table[0x37] = table[0x3F] = self._op_ascii_adjust
+        for opcode in range(0x40, 0x50):
+            table[opcode] = self._op_inc_dec_register
+        for opcode in range(0x50, 0x58):
+            table[opcode] = self._op_push_register
+        for opcode in range(0x58, 0x60):
+            table[opcode] = self._op_pop_register
+        table[0x0F] = self._op_two_byte
+        table[0x60] = self._op_pusha
+        table[0x61] = self._op_popa
+        table[0x68] = table[0x6A] = self._op_push_immediate
+        table[0x69] = table[0x6B] = self._op_imul_immediate
+        for opcode in _STRING_KINDS:
+            table[opcode] = table[opcode + 1] = self._op_string
+        for opcode in range(0x70, 0x80):
+            table[opcode] = self._op_jcc
+        for opcode in range(0x80, 0x84):
+            table[opcode] = self._op_group1
+        table[0x84] = table[0x85] = self._op_test
+        table[0x86] = table[0x87] = self._op_xchg
+        for opcode in range(0x88, 0x8C):
+            table[opcode] = self._op_mov
+        table[0x8C] = self._op_mov_from_segment
+        table[0x8D] = self._op_lea
+        table[0x8E] = self._op_mov_to_segment
+        table[0x8F] = self._op_pop_rm
+        for opcode in range(0x90, 0x98):
+            table[opcode] = self._op_xchg_ax
+        table[0x98] = self._op_cbw
+        table[0x99] = self._op_cwd
+        table[0x9A] = self._op_call_far
+        table[0x9B] = self._op_nop
+        table[0x9C] = self._op_pushf
+        table[0x9D] = self._op_popf
+        table[0x9E] = self._op_sahf
+        table[0x9F] = self._op_lahf
+        for opcode in range(0xA0, 0xA4):
+            table[opcode] = self._op_mov_offset
+        table[0xA8] = table[0xA9] = self._op_test_accumulator
+        for opcode in range(0xB0, 0xC0):
+            table[opcode] = self._op_mov_immediate_register
+        table[0xC0] = table[0xC1] = self._op_group2
+        table[0xC2] = table[0xC3] = self._op_ret
+        table[0xC4] = table[0xC5] = self._op_load_far_pointer
+        table[0xC6] = table[0xC7] = self._op_mov_immediate_rm
+        table[0xC8] = self._op_enter
+        table[0xC9] = self._op_leave
+        table[0xCA] = table[0xCB] = self._op_retf
+        table[0xCC] = table[0xCD] = table[0xCE] = self._op_int
+        table[0xCF] = self._op_iret
+        for opcode in range(0xD0, 0xD4):
+            table[opcode] = self._op_group2
+        table[0xD4] = self._op_aam
+        table[0xD5] = self._op_aad
+        table[0xD6] = self._op_salc
+        table[0xD7] = self._op_xlat
+        for opcode in range(0xE0, 0xE4):
+            table[opcode] = self._op_loop
+        for opcode in (0xE4, 0xE5, 0xEC, 0xED):
+            table[opcode] = self._op_in
+        for opcode in (0xE6, 0xE7, 0xEE, 0xEF):
+            table[opcode] = self._op_out
+        table[0xE8] = self._op_call
+        table[0xE9] = table[0xEB] = self._op_jmp
+        table[0xEA] = self._op_jmp_far
+        table[0xF4] = self._op_hlt
+        table[0xF5] = self._op_cmc
+        table[0xF6] = table[0xF7] = self._op_group3
+        for opcode in range(0xF8, 0xFE):
+            table[opcode] = self._op_flag
+        table[0xFE] = table[0xFF] = self._op_group45
+        table[0x90] = self._op_nop
+
+    def _op_invalid(self, opcode):
+        raise CPUError(
+            f"Unsupported instruction {opcode:#04x} at {self.sregs[CS]:04X}:{self.start_ip:04X}."
+        )
+
+    def _op_nop(self, opcode):
+        pass
+
+    def _op_alu(self, opcode):
+        op = opcode >> 3
+        form = opcode & 7
+        word = opcode & 1
+        if form < 4:
+            reg = self.decode_modrm()
+            if form < 2:
+                result = self.alu(op, self.read_rm(word), self.get_reg(reg, word), word)
+                if op != 7:
+                    self.write_rm(word, result)
+            else:
+                result = self.alu(op, self.get_reg(reg, word), self.read_rm(word), word)
+                if op != 7:
+                    self.set_reg(reg, word, result)
+        else:
+            immediate = self.fetch16() if word else self.fetch8()
+            result = self.alu(op, self.get_reg(AX, word), immediate, word)
+            if op != 7:
+                self.set_reg(AX, word, result)
+
+    def _op_push_segment(self, opcode):
+        self.push(self.sregs[opcode >> 3])
+
+    def _op_pop_segment(self, opcode):
+        self.sregs[opcode >> 3] = self.pop()
+
+    def _op_decimal_adjust(self, opcode):
+        al = self.get_reg8(AX)
+        old_carry = self.flags & CF
+        flags = 0
+        value = al
+        if (al & 0x0F) > 9 or self.flags & AF:
+            value = value - 6 if opcode == 0x2F else value + 6
+            flags |= AF
+            if old_carry or value < 0 or value > 0xFF:
+                flags |= CF
+        if al > 0x99 or old_carry:
+            value = value - 0x60 if opcode == 0x2F else value + 0x60
+            flags |= CF
+        else:
+            flags &= ~CF
+        value &= 0xFF
+        self.set_reg8(AX, value)
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | flags | self._szp(value, False)
+
+    def _op_ascii_adjust(self, opcode):
+        ax = self.regs[AX]
+        if (ax & 0x0F) > 9 or self.flags & AF:
+            ax = ax - 0x106 if opcode == 0x3F else ax + 0x106
+            self.flags |= AF | CF
+        else:
+            self.flags &= ~(AF | CF)
+        self.regs[AX] = ax & 0xFF0F
+
+    def _op_inc_dec_register(self, opcode):
+        register = opcode & 7
+        self.regs[register] = self.step_value(self.regs[register], True, -1 if opcode & 8 else 1)
+
+    def _op_push_register(self, opcode):
+        self.push(self.regs[opcode & 7])
+
+    def _op_pop_register(self, opcode):
+        self.regs[opcode & 7] = self.pop()
+
+    def _op_pusha(self, opcode):
+        sp = self.regs[SP]
+        for register in (AX, CX, DX, BX):
+            self.push(self.regs[register])
+        self.push(sp)
+        for register in (BP, SI, DI):
+            self.push(self.regs[register])
+
+    def _op_popa(self, opcode):
+        for register in (DI, SI, BP):
+            self.regs[register] = self.pop()
+        self.pop()
+        for register in (BX, DX, CX, AX):
+            self.regs[register] = self.pop()
+
+    def _op_push_immediate(self, opcode):
+        self.push(self.fetch16() if opcode == 0x68 else self.fetch_signed8() & 0xFFFF)
+
+    def _signed_multiply(self, a, b, word):
+        bits = 16 if word else 8
+        sign = 1 << (bits - 1)
+        a = a - (sign << 1) if a & sign else a
+        b = b - (sign << 1) if b & sign else b
+        product = a * b
+        fits = -sign <= product < sign
+        self.flags = (self.flags & ~(CF | OF)) | (0 if fits else CF | OF)
+        return product
+
+    def _op_imul_immediate(self, opcode):
+        reg = self.decode_modrm()
+        value = self.read_rm(True)
+        immediate = self.fetch16() if opcode == 0x69 else self.fetch_signed8() & 0xFFFF
+        self.regs[reg] = self._signed_multiply(value, immediate, True) & 0xFFFF
+
+    def _op_string(self, opcode):
+        word = opcode & 1
+        kind = opcode & 0xFE
+        width = 2 if word else 1
+        delta = -width if self.flags & DF else width
+        source = self.data_segment()
+        if not self.repeat:
+            self._string_once(kind, word, source, delta)
+            return
+        if (kind == 0xA4 or kind == 0xAA) and delta > 0 and self._fast_string(kind, word, source):
+            return
+        count = self.regs[CX]
+        compare = kind == 0xA6 or kind == 0xAE
+        while count:
+            self._string_once(kind, word, source, delta)
+            count -= 1
+            if compare and bool(self.flags & ZF) != (self.repeat == 0xF3):
+                break
+        self.regs[CX] = count
+
+    def _string_once(self, kind, word, source, delta):
+        regs = self.regs
+        if kind == 0xA4:
+            if word:
+                self.write16(self.sregs[ES], regs[DI], self.read16(source, regs[SI]))
+            else:
+                self.write8(self.sregs[ES], regs[DI], self.read8(source, regs[SI]))
+        elif kind == 0xA6:
+            if word:
+                self.alu(7, self.read16(source, regs[SI]), self.read16(self.sregs[ES], regs[DI]), True)
+            else:
+                self.alu(7, self.read8(source, regs[SI]), self.read8(self.sregs[ES], regs[DI]), False)
+        elif kind == 0xAA:
+            if word:
+                self.write16(self.sregs[ES], regs[DI], regs[AX])
+            else:
+                self.write8(self.sregs[ES], regs[DI], regs[AX])
+        elif kind == 0xAC:
+            if word:
+                regs[AX] = self.read16(source, regs[SI])
+            else:
+                self.set_reg8(AX, self.read8(source, regs[SI]))
+        elif kind == 0xAE:
+            if word:
+                self.alu(7, regs[AX], self.read16(self.sregs[ES], regs[DI]), True)
+            else:
+                self.alu(7, regs[AX] & 0xFF, self.read8(self.sregs[ES], regs[DI]), False)
+        elif kind == 0x6C:
+            value = self.port_in(regs[DX], word)
+            if word:
+                self.write16(self.sregs[ES], regs[DI], value)
+            else:
+                self.write8(self.sregs[ES], regs[DI], value)
+        else:
+            value = self.read16(source, regs[SI]) if word else self.read8(source, regs[SI])
+            self.port_out(regs[DX], value, word)
+        if kind in (0xA4, 0xA6, 0xAC, 0x6E):
+            regs[SI] = (regs[SI] + delta) & 0xFFFF
+        if kind != 0xAC and kind != 0x6E:
+            regs[DI] = (regs[DI] + delta) & 0xFFFF
+
+    def _fast_string(self, kind, word, source):
+        """rep movs/stos as one slice operation when nothing wraps or overlaps."""
+        regs = self.regs
+        count = regs[CX]
+        size = count << word
+        di = regs[DI]
+        destination = (self.sregs[ES] << 4) + di
+        if di + size > 0x10000 or destination + size > MEMORY_SIZE:
+            return False
+        if kind == 0xAA:
+            pattern = bytes((regs[AX] & 0xFF, regs[AX] >> 8)) if word else bytes((regs[AX] & 0xFF,))
+            self.memory[destination:destination + size] = pattern * count
+        else:
+            si = regs[SI]
+            origin = (source << 4) + si
+            if si + size > 0x10000 or origin + size > MEMORY_SIZE or origin < destination < origin + size:
+                return False
+            self.memory[destination:destination + size] = self.memory[origin:origin + size]
+            regs[SI] = (si + size) & 0xFFFF
+        regs[DI] = (di + size) & 0xFFFF
+        regs[CX] = 0
+        return True
+
+    def _op_jcc(self, opcode):
+        displacement = self.fetch_signed8()
+        if self.condition(opcode & 0x0F):
+            self.ip = (self.ip + displacement) & 0xFFFF
+
+    def _op_two_byte(self, opcode):
+        second = self.fetch8()
+        if 0x80 <= second <= 0x8F:
+            displacement = self.fetch16()
+            if self.condition(second & 0x0F):
+                self.ip = (self.ip + displacement) & 0xFFFF
+        elif 0x90 <= second <= 0x9F:
+            self.decode_modrm()
+            self.write_rm(False, 1 if self.condition(second & 0x0F) else 0)
+        elif second in (0xB6, 0xB7, 0xBE, 0xBF):
+            reg = self.decode_modrm()
+            word = second & 1
+            value = self.read_rm(word)
+            if second & 8 and not word and value & 0x80:
+                value |= 0xFF00
+            self.regs[reg] = value
+        elif second == 0xAF:
+            reg = self.decode_modrm()
+            self.regs[reg] = self._signed_multiply(self.regs[reg], self.read_rm(True), True) & 0xFFFF
+        else:
+            raise CPUError(
+                f"Unsupported instruction 0x0f {second:#04x} at {self.sregs[CS]:04X}:{self.start_ip:04X}."
+            )
+
+    def _op_group1(self, opcode):
+        word = opcode & 1
+        op = self.decode_modrm()
+        if opcode == 0x81:
+            immediate = self.fetch16()
+        elif opcode == 0x83:
+            immediate = self.fetch_signed8() & 0xFFFF
+        else:
+            immediate = self.fetch8()
+        result = self.alu(op, self.read_rm(word), immediate, word)
+        if op != 7:
+            self.write_rm(word, result)
+
+    def _op_test(self, opcode):
+        word = opcode & 1
+        reg = self.decode_modrm()
+        self.alu(4, self.read_rm(word), self.get_reg(reg, word), word)
+
+    def _op_xchg(self, opcode):
+        word = opcode & 1
+        reg = self.decode_modrm()
+        value = self.read_rm(word)
+        self.write_rm(word, self.get_reg(reg, word))
+        self.set_reg(reg, word, value)
+
+    def _op_mov(self, opcode):
+        word = opcode & 1
+        reg = self.decode_modrm()
+        if opcode & 2:
+            self.set_reg(reg, word, self.read_rm(word))
+        else:
+            self.write_rm(word, self.get_reg(reg, word))
+
+    def _op_mov_from_segment(self, opcode):
+        reg = self.decode_modrm()
+        self.write_rm(True, self.sregs[reg & 3])
+
+    def _op_lea(self, opcode):
+        reg = self.decode_modrm()
+        self.regs[reg] = self._memory_operand()[1]
+
+    def _op_mov_to_segment(self, opcode):
+        reg = self.decode_modrm()
+        self.sregs[reg & 3] = self.read_rm(True)
+
+    def _op_pop_rm(self, opcode):
+        self.decode_modrm()
+        self.write_rm(True, self.pop())
+
+    def _op_xchg_ax(self, opcode):
+        register = opcode & 7
+        self.regs[AX], self.regs[register] = self.regs[register], self.regs[AX]
+
+    def _op_cbw(self, opcode):
+        al = self.regs[AX] & 0xFF
+        self.regs[AX] = al | 0xFF00 if al & 0x80 else al
+
+    def _op_cwd(self, opcode):
+        self.regs[DX] = 0xFFFF if self.regs[AX] & 0x8000 else 0
+
+    def _op_call_far(self, opcode):
+        offset = self.fetch16()
+        segment = self.fetch16()
+        self.push(self.sregs[CS])
+        self.push(self.ip)
+        self.jump_far(segment, offset)
+
+    def _op_pushf(self, opcode):
+        self.push(self.flags)
+
+    def _op_popf(self, opcode):
+        self.flags = (self.pop() & WRITABLE_FLAGS) | 0x0002
+
+    def _op_sahf(self, opcode):
+        ah = self.regs[AX] >> 8
+        self.flags = (self.flags & ~0xFF) | (ah & (CF | PF | AF | ZF | SF)) | 0x0002
+
+    def _op_lahf(self, opcode):
+        self.set_reg8(4, self.flags & 0xFF)
+
+    def _op_mov_offset(self, opcode):
+        word = opcode & 1
+        offset = self.fetch16()
+        segment = self.data_segment()
+        if opcode & 2:
+            if word:
+                self.write16(segment, offset, self.regs[AX])
+            else:
+                self.write8(segment, offset, self.regs[AX])
+        elif word:
+            self.regs[AX] = self.read16(segment, offset)
+        else:
+            self.set_reg8(AX, self.read8(segment, offset))
+
+    def _op_test_accumulator(self, opcode):
+        word = opcode & 1
+        immediate = self.fetch16() if word else self.fetch8()
+        self.alu(4, self.get_reg(AX, word), immediate, word)
+
+    def _op_mov_immediate_register(self, opcode):
+        if opcode & 8:
+            self.regs[opcode & 7] = self.fetch16()
+        else:
+            self.set_reg8(opcode & 7, self.fetch8())
+
+    def _op_group2(self, opcode):
+        word = opcode & 1
+        op = self.decode_modrm()
+        if opcode < 0xC2:
+            count = self.fetch8()
+        elif opcode < 0xD2:
+            count = 1
+        else:
+            count = self.regs[CX] & 0xFF
+        self.write_rm(word, self.shift(op, self.read_rm(word), count, word))
+
+    def _op_ret(self, opcode):
+        release = self.fetch16() if opcode == 0xC2 else 0
+        self.ip = self.pop()
+        self.regs[SP] = (self.regs[SP] + release) & 0xFFFF
+
+    def _op_load_far_pointer(self, opcode):
+        reg = self.decode_modrm()
+        segment, offset = self._memory_operand()
+        self.regs[reg] = self.read16(segment, offset)
+        self.sregs[ES if opcode == 0xC4 else DS] = self.read16(segment, offset + 2)
+
+    def _op_mov_immediate_rm(self, opcode):
+        word = opcode & 1
+        self.decode_modrm()
+        self.write_rm(word, self.fetch16() if word else self.fetch8())
+
+    def _op_enter(self, opcode):
+        size = self.fetch16()
+        level = self.fetch8() & 0x1F
+        self.push(self.regs[BP])
+        frame = self.regs[SP]
+        for _ in range(1, level):
+            self.regs[BP] = (self.regs[BP] - 2) & 0xFFFF
+            self.push(self.read16(self.sregs[SS], self.regs[BP]))
+        if level:
+            self.push(frame)
+        self.regs[BP] = frame
+        self.regs[SP] = (self.regs[SP] - size) & 0xFFFF
+
+    def _op_leave(self, opcode):
+        self.regs[SP] = self.regs[BP]
+        self.regs[BP] = self.pop()
+
+    def _op_retf(self, opcode):
+        release = self.fetch16() if opcode == 0xCA else 0
+        self.ip = self.pop()
+        self.sregs[CS] = self.pop()
+        self.regs[SP] = (self.regs[SP] + release) & 0xFFFF
+
+    def _op_int(self, opcode):
+        if opcode == 0xCC:
+            self.interrupt(3)
+        elif opcode == 0xCD:
+            self.interrupt(self.fetch8())
+        elif self.flags & OF:
+            self.interrupt(4)
+
+    def _op_iret(self, opcode):
+        self.iret()
+
+    def _op_aam(self, opcode):
+        base = self.fetch8()
+        if not base:
+            self.divide_error()
+            return
+        al = self.regs[AX] & 0xFF
+        self.regs[AX] = ((al // base) << 8) | (al % base)
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | self._szp(al % base, False)
+
+    def _op_aad(self, opcode):
+        base = self.fetch8()
+        ax = self.regs[AX]
+        al = ((ax >> 8) * base + (ax & 0xFF)) & 0xFF
+        self.regs[AX] = al
+        self.flags = (self.flags & ~ARITHMETIC_FLAGS) | self._szp(al, False)
+
+    def _op_salc(self, opcode):
+        self.set_reg8(AX, 0xFF if self.flags & CF else 0)
+
+    def _op_xlat(self, opcode):
+        offset = self.regs[BX] + (self.regs[AX] & 0xFF)
+        self.set_reg8(AX, self.read8(self.data_segment(), offset))
+
+    def _op_loop(self, opcode):
+        displacement = self.fetch_signed8()
+        if opcode == 0xE3:
+            taken = self.regs[CX] == 0
+        else:
+            self.regs[CX] = (self.regs[CX] - 1) & 0xFFFF
+            taken = self.regs[CX] != 0
+            if opcode == 0xE0:
+                taken = taken and not self.flags & ZF
+            elif opcode == 0xE1:
+                taken = taken and bool(self.flags & ZF)
+        if taken:
+            self.ip = (self.ip + displacement) & 0xFFFF
+
+    def _op_in(self, opcode):
+        word = opcode & 1
+        port = self.regs[DX] if opcode & 8 else self.fetch8()
+        self.set_reg(AX, word, self.port_in(port, word))
+
+    def _op_out(self, opcode):
+        word = opcode & 1
+        port = self.regs[DX] if opcode & 8 else self.fetch8()
+        self.port_out(port, self.get_reg(AX, word), word)
+
+    def _op_call(self, opcode):
+        displacement = self.fetch16()
+        self.push(self.ip)
+        self.ip = (self.ip + displacement) & 0xFFFF
+
+    def _op_jmp(self, opcode):
+        displacement = self.fetch16() if opcode == 0xE9 else self.fetch_signed8()
+        self.ip = (self.ip + displacement) & 0xFFFF
+
+    def _op_jmp_far(self, opcode):
+        offset = self.fetch16()
+        self.jump_far(self.fetch16(), offset)
+
+    def _op_hlt(self, opcode):
+        self.halted = True
+
+    def _op_cmc(self, opcode):
+        self.flags ^= CF
+
+    def _op_flag(self, opcode):
+        flag = (CF, CF, IF, IF, DF, DF)[opcode - 0xF8]
+        if opcode & 1:
+            self.flags |= flag
+        else:
+            self.flags &= ~flag
+
+    def _op_group3(self, opcode):
+        word = opcode & 1
+        op = self.decode_modrm()
+        value = self.read_rm(word)
+        if op < 2:
+            self.alu(4, value, self.fetch16() if word else self.fetch8(), word)
+        elif op == 2:
+            self.write_rm(word, ~value)
+        elif op == 3:
+            self.write_rm(word, self.alu(5, 0, value, word))
+        elif op == 4 or op == 5:
+            self._multiply(value, word, op == 5)
+        else:
+            self._divide(value, word, op == 7)
+
+    def _multiply(self, value, word, signed):
+        if word:
+            if signed:
+                product = self._signed_multiply(self.regs[AX], value, True)
+            else:
+                product = self.regs[AX] * value
+                self.flags = (self.flags & ~(CF | OF)) | (CF | OF if product > 0xFFFF else 0)
+            self.regs[AX] = product & 0xFFFF
+            self.regs[DX] = (product >> 16) & 0xFFFF
+        else:
+            if signed:
+                product = self._signed_multiply(self.regs[AX] & 0xFF, value, False)
+            else:
+                product = (self.regs[AX] & 0xFF) * value
+                self.flags = (self.flags & ~(CF | OF)) | (CF | OF if product > 0xFF else 0)
+            self.regs[AX] = product & 0xFFFF
+
+    def _divide(self, divisor, word, signed):
+        bits = 16 if word else 8
+        if word:
+            dividend = (self.regs[DX] << 16) | self.regs[AX]
+        else:
+            dividend = self.regs[AX]
+        if signed:
+            sign = 1 << (bits - 1)
+            if divisor & sign:
+                divisor -= sign << 1
+            if dividend & (1 << (2 * bits - 1)):
+                dividend -= 1 << (2 * bits)
+        if not divisor:
+            self.divide_error()
+            return
+        quotient = abs(dividend) // abs(divisor)
+        if (dividend < 0) != (divisor < 0):
+            quotient = -quotient
+        remainder = dividend - quotient * divisor
+        if signed:
+            limit = 1 << (bits - 1)
+            if not -limit <= quotient < limit:
+                self.divide_error()
+                return
+        elif quotient >> bits:
+            self.divide_error()
+            return
+        mask = (1 << bits) - 1
+        if word:
+            self.regs[AX] = quotient & mask
+            self.regs[DX] = remainder & mask
+        else:
+            self.regs[AX] = ((remainder & mask) << 8) | (quotient & mask)
+
+    def _op_group45(self, opcode):
+        word = opcode & 1
+        op = self.decode_modrm()
+        if op < 2:
+            self.write_rm(word, self.step_value(self.read_rm(word), word, -1 if op else 1))
+        elif not word:
+            self._op_invalid(opcode)
+        elif op == 2:
+            target = self.read_rm(True)
+            self.push(self.ip)
+            self.ip = target
+        elif op == 4:
+            self.ip = self.read_rm(True)
+        elif op == 6:
+            self.push(self.read_rm(True))
+        elif op == 3 or op == 5:
+            segment, offset = self._memory_operand()
+            target = self.read16(segment, offset)
+            target_segment = self.read16(segment, offset + 2)
+            if op == 3:
+                self.push(self.sregs[CS])
+                self.push(self.ip)
+            self.jump_far(target_segment, target)
+        else:
+            self._op_invalid(opcode)
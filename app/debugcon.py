@@ -0,0 +1,69 @@
+"""Live QEMU debug console (I/O port 0xE9) output for interactive runs.
+
+The host listens on a localhost port before QEMU starts, and QEMU connects to it
+as a socket chardev client, so nothing the guest logs during early boot is lost.
+"""
+
+import socket
+import threading
+import time
+
+DEBUGCON_PORT = 0xE9
+CHARDEV_ID = "ocdebugcon"
+
+
+class DebugConsoleListener:
+    def __init__(self, on_line):
+        # Called from the reader thread with the host time.time() and one line of text.
+        self.on_line = on_line
+        self.server = None
+        self.port = None
+
+    def start(self):
+        self.close()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, args=(self.server,), daemon=True).start()
+        return self
+
+    def qemu_args(self):
+        return [
+            "-chardev", f"socket,id={CHARDEV_ID},host=127.0.0.1,port={self.port}",
+            "-debugcon", f"chardev:{CHARDEV_ID}",
+        ]
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.close()
+            except OSError:
+                pass
+            self.server = None
+
+    def _serve(self, server):
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            with connection:
+                self._read(connection)
+
+    def _read(self, connection):
+        pending = b""
+        while True:
+            try:
+                data = connection.recv(4096)
+            except OSError:
+                data = b""
+            stamp = time.time()
+            if not data:
+                if pending:
+                    self.on_line(stamp, pending.decode("latin-1"))
+                return
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                self.on_line(stamp, line.rstrip(b"\r").decode("latin-1"))
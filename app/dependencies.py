@@ -0,0 +1,111 @@
+"""Static %include/incbin scanning for NASM project sources."""
+
+import os
+import re
+
+
+INCLUDE_RE = re.compile(r"""^[ \t]*%include[ \t]+["'<]([^"'>\n]+)["'>]""",
+                        re.IGNORECASE | re.MULTILINE)
+INCBIN_RE = re.compile(
+    r"""^[ \t]*(?:[A-Za-z_.$?@][\w.$?@#~]*:?[ \t]+)?incbin[ \t]+["']([^"'\n]+)["']""",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def parse_directives(text):
+    """Return the (includes, incbins) file names referenced by NASM source text."""
+    return INCLUDE_RE.findall(text), INCBIN_RE.findall(text)
+
+
+def read_directives(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as handle:
+            return parse_directives(handle.read())
+    except OSError:
+        return [], []
+
+
+def resolve_reference(name, unit_dir, including_dir):
+    """Resolve a referenced file the way NASM does for a unit assembled in unit_dir.
+
+    NASM searches its working directory first; the including file's own
+    directory is checked as a fallback for nested resource folders.
+    """
+    if os.path.isabs(name):
+        return os.path.normpath(name)
+    for base in (unit_dir, including_dir):
+        candidate = os.path.normpath(os.path.join(base, name))
+        if os.path.exists(candidate):
+            return candidate
+    return os.path.normpath(os.path.join(unit_dir, name))
+
+
+def _walk_references(source_path, directives):
+    source_path = os.path.normpath(os.path.abspath(source_path))
+    unit_dir = os.path.dirname(source_path)
+    includes = set()
+    incbins = set()
+    pending = [source_path]
+    visited = set()
+    while pending:
+        current = pending.pop()
+        if current in visited:
+            continue
+        visited.add(current)
+        include_names, incbin_names = directives(current)
+        including_dir = os.path.dirname(current)
+        for name in include_names:
+            path = resolve_reference(name, unit_dir, including_dir)
+            includes.add(path)
+            if os.path.isfile(path):
+                pending.append(path)
+        for name in incbin_names:
+            incbins.add(resolve_reference(name, unit_dir, including_dir))
+    includes.discard(source_path)
+    return includes, incbins
+
+
+def dependency_closure(source_path, directives=read_directives):
+    """Return every file a translation unit pulls in, sorted, excluding itself.
+
+    Missing references are kept so creating the file later invalidates cached
+    output that depended on it.
+    """
+    includes, incbins = _walk_references(source_path, directives)
+    return sorted(includes | incbins)
+
+
+class IncludeGraph:
+    """Translation units that form the boot image and everything they pull in."""
+
+    def __init__(self, project_dir, members, directives=read_directives):
+        self.project_dir = os.path.abspath(project_dir)
+        self.roots = []
+        self.missing_roots = []
+        self.includes = {}
+        self.incbins = {}
+        for member in members:
+            path = os.path.normpath(os.path.join(self.project_dir, member))
+            if not os.path.isfile(path):
+                self.missing_roots.append(member)
+                continue
+            if path in self.includes:
+                continue
+            self.roots.append(path)
+            self.includes[path], self.incbins[path] = _walk_references(path, directives)
+
+    def dependencies(self, root):
+        return sorted(self.includes[root] | self.incbins[root])
+
+    def reachable_sources(self):
+        sources = set(self.roots)
+        for included in self.includes.values():
+            sources.update(included)
+        return sources
+
+    def binary_assets(self):
+        """Return existing files referenced through incbin from any root."""
+        assets = set()
+        for referenced in self.incbins.values():
+            assets.update(path for path in referenced if os.path.isfile(path))
+        return sorted(assets)
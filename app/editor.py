@@ -3,9 +3,11 @@ import json
 import os
 import re
 import shutil
+import time
 from collections import Counter
 
-from PyQt6.QtCore import Qt, QEvent, QTimer, QRect, QPoint, QPointF, QSize, QMimeData
+from PyQt6.QtCore import (Qt, QEvent, QTimer, QRect, QPoint, QPointF, QSize, QMimeData,
+                          QObject, pyqtSignal)
 from PyQt6.QtGui import (QFileSystemModel, QShortcut, QKeySequence, QPainter,
                          QColor, QTextCursor, QDrag, QImage, QPen, QIcon,
                          QPixmap)
@@ -15,14 +17,20 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QTabBar, QRubberBand, QPlainTextEdit, QLineEdit,
                              QFrame, QDialog, QFormLayout, QDialogButtonBox,
                              QStackedWidget, QTreeWidget, QTreeWidgetItem, QGraphicsView, QApplication, QLabel,
-                             QFileDialog, QListWidget, QListWidgetItem)
+                             QFileDialog, QListWidget, QListWidgetItem, QProgressBar,
+                             QCheckBox)
 
 import app.metadata
 from .pluginmanager import PluginManager, PluginDialog
 from .block import BlockCanvas, VisualBlock, load_block_definitions
+from .build_worker import BenchmarkWorker, BuildWorker, RunWorker, WatchWorker
+from .cost_estimate import CostReport, format_cycles
 from .emulator import OSLauncher
+from .gdbstub import gdb_argument
 from .highlight import SyntaxHighlighter
 from .midi_import import MidiImportError, midi_events_to_asm, read_midi_events
+from .profiler import ProfileResult, SamplingProfiler
+from .qmp import QMPError, free_port
 from .theme import (DEFAULT_THEME, WindowTitleBar, build_app_stylesheet,
                     resolved_theme, themed_file_dialog, themed_message,
                     themed_text_input)
@@ -63,6 +71,12 @@ class SettingsDialog(QDialog):
         self.version_input = QLineEdit(current_data.get("version", "1.0.0"))
         form.addRow("Project Name:", self.name_input)
         form.addRow("Version:", self.version_input)
+        self.warm_start_input = QCheckBox("Resume QEMU from a saved post-POST state")
+        self.warm_start_input.setChecked(bool(current_data.get("warm_start", False)))
+        form.addRow("Warm Start:", self.warm_start_input)
+        self.benchmark_input = QCheckBox("Benchmark boot after each build")
+        self.benchmark_input.setChecked(bool(current_data.get("benchmark_after_build", False)))
+        form.addRow("Boot Timing:", self.benchmark_input)
         layout.addLayout(form)
         btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         btns.setContentsMargins(12, 0, 12, 0)
@@ -72,7 +86,9 @@ class SettingsDialog(QDialog):
 
     def get_data(self):
         return {
-            "name": self.name_input.text(), "version": self.version_input.text()
+            "name": self.name_input.text(), "version": self.version_input.text(),
+            "warm_start": self.warm_start_input.isChecked(),
+            "benchmark_after_build": self.benchmark_input.isChecked()
         }
 
 class ProjectTreeView(QTreeView):
@@ -680,6 +696,13 @@ class BlockSearchPopup(QDialog):
             self.accept()
 
 
+class EmulatorBridge(QObject):
+    """Carries OSLauncher's reader-thread callbacks onto the UI thread."""
+    output = pyqtSignal(str)
+    exited = pyqtSignal(int)
+    debug = pyqtSignal(float, str)
+
+
 class IDEWindow(QMainWindow):
     def __init__(self, compiler, parent=None):
         super().__init__(parent)
@@ -687,11 +710,30 @@ class IDEWindow(QMainWindow):
         self.resize(1280, 820)
         self.compiler = compiler
         self.launcher = OSLauncher(self.compiler.root_dir)
+        self.emulator_bridge = EmulatorBridge(self)
+        self.emulator_bridge.output.connect(self.queue_emulator_output)
+        self.emulator_bridge.exited.connect(self.emulator_exited)
+        self.emulator_bridge.debug.connect(self.queue_debug_output)
+        self.launcher.on_output = self.emulator_bridge.output.emit
+        self.launcher.on_exit = self.emulator_bridge.exited.emit
+        self.launcher.on_debug = self.emulator_bridge.debug.emit
+        self.emulator_lines = []
+        self.emulator_flush_timer = QTimer(self)
+        self.emulator_flush_timer.setSingleShot(True)
+        self.emulator_flush_timer.timeout.connect(self.flush_emulator_output)
         self.opened_files = {}
         self.plugin_manager = PluginManager(self.compiler.root_dir)
         self.plugin_manager.load_plugins()
         self.terminal = QTextEdit()
         self.terminal.setObjectName("terminal")
+        self.watch_worker = None
+        self.build_worker = None
+        self.queued_build = None
+        self.run_worker = None
+        self.benchmark_worker = None
+        self.profiler = None
+        self.profile_heat = {}
+        self.node_costs = {}
 
         self.plugin_manager.apply_plugin_theme(self)
 
@@ -889,6 +931,29 @@ class IDEWindow(QMainWindow):
             btn.setProperty("class", "top_btn")
             btn.clicked.connect(func)
             t_bar.addWidget(btn)
+        self.watch_btn = QPushButton("Watch")
+        self.watch_btn.setProperty("class", "top_btn")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.setToolTip("Rebuild boot.img automatically whenever project sources are saved.")
+        self.watch_btn.toggled.connect(self.toggle_watch)
+        t_bar.insertWidget(2, self.watch_btn)
+        self.profile_btn = QPushButton("Profile")
+        self.profile_btn.setProperty("class", "top_btn")
+        self.profile_btn.setCheckable(True)
+        self.profile_btn.setToolTip("Run with QEMU's gdbstub and show where the guest spends its time.")
+        self.profile_btn.toggled.connect(self.toggle_profile)
+        t_bar.insertWidget(4, self.profile_btn)
+        self.build_progress = QProgressBar()
+        self.build_progress.setFixedWidth(180)
+        self.build_progress.setTextVisible(True)
+        self.build_progress.hide()
+        t_bar.addWidget(self.build_progress)
+        self.cancel_build_btn = QPushButton("Cancel Build")
+        self.cancel_build_btn.setProperty("class", "top_btn")
+        self.cancel_build_btn.setToolTip("Stop the running build (Shift+F5).")
+        self.cancel_build_btn.clicked.connect(self.cancel_build)
+        self.cancel_build_btn.hide()
+        t_bar.addWidget(self.cancel_build_btn)
         t_bar.addStretch()
         layout.addLayout(t_bar)
 
@@ -1043,31 +1108,273 @@ class IDEWindow(QMainWindow):
         self.plugin_manager.apply_plugin_theme(self)
 
     def handle_build(self):
-        if hasattr(self, 'launcher') and self.launcher.is_running():
-            self.show_error("Build Blocked",
-                            "The Emulator is still running. Close it before building!")
+        self.run_build(show_errors=True)
+
+    def run_build(self, show_errors):
+        # NASM runs on a worker thread; a request made meanwhile collapses into
+        # a single follow-up build instead of a second concurrent one.
+        if self.build_worker is not None or self.run_worker is not None:
+            if self.queued_build is None:
+                busy = "Build in progress" if self.build_worker is not None else "Emulator starting"
+                self.terminal.append(f"{busy}; another build will run when it finishes.")
+            self.queued_build = bool(self.queued_build) or show_errors
             return
 
+        # A running emulator that boots from the floppy gives it up for the build
+        # and gets the new image back followed by a reset. A hard disk cannot
+        # change media, so that emulator is paused while boot.img is rewritten
+        # in place underneath it and then reset onto the new contents.
+        running = hasattr(self, 'launcher') and self.launcher.is_running()
+        hot_swap = running and self.launcher.can_swap_medium()
+        hold = running and not hot_swap
         try:
-            result = self.compiler.compile_to_img(self.terminal)
-            if isinstance(result, tuple) and result and result[0] is False:
-                message = result[1] if len(result) > 1 else "The image could not be created."
+            if hot_swap:
+                self.launcher.eject_medium()
+            elif hold:
+                self.launcher.pause()
+        except QMPError as e:
+            message = f"The Emulator is still running and could not release boot.img ({e}). Close it before building!"
+            if show_errors:
+                self.show_error("Build Blocked", message)
+            else:
                 self.terminal.append(message)
-                self.show_error("Build Error", message)
-                return
-            self.terminal.append("Build finished successfully.")
+            return
+        self.compiler.image_in_use = hold
+
+        worker = BuildWorker(self.compiler, self)
+        worker.message.connect(self.terminal.append)
+        worker.progress.connect(self.update_build_progress)
+        worker.build_finished.connect(
+            lambda success, title, message: self.finish_build(
+                success, title, message, show_errors, hot_swap, hold
+            )
+        )
+        worker.finished.connect(worker.deleteLater)
+        self.build_worker = worker
+        self.build_progress.setRange(0, 0)
+        self.build_progress.setFormat("Building...")
+        self.build_progress.show()
+        self.cancel_build_btn.show()
+        worker.start()
+
+    def update_build_progress(self, done, total, file, status):
+        self.build_progress.setRange(0, total)
+        self.build_progress.setValue(done)
+        self.build_progress.setFormat(f"{done}/{total} {os.path.basename(file)}")
+
+    def finish_build(self, success, title, message, show_errors, hot_swap=False, held=False):
+        self.build_worker = None
+        self.compiler.image_in_use = False
+        self.build_progress.hide()
+        self.cancel_build_btn.hide()
+        if hot_swap and self.launcher.is_running():
+            if success:
+                try:
+                    self.launcher.swap_and_reset()
+                    self.terminal.append("Emulator reset with the new boot.img.")
+                except QMPError as e:
+                    self.terminal.append(f"Could not reload the emulator: {e}")
+            else:
+                self.terminal.append("The emulator's floppy drive stays empty until the next successful build.")
+        if held and self.launcher.is_running():
+            if success:
+                try:
+                    self.launcher.reboot()
+                    self.terminal.append("Emulator reset with the new boot.img.")
+                except QMPError as e:
+                    self.terminal.append(f"Could not reset the emulator: {e}")
+            else:
+                self.terminal.append("The emulator stays paused until the next successful build.")
+        if title == "Build Cancelled":
+            self.queued_build = None
+            return
+        if not success and show_errors:
+            self.show_error(title, message)
+        if success:
+            self.update_costs()
+        if success and self.queued_build is None:
+            self.start_benchmark(show_errors)
+        if self.queued_build is not None:
+            queued, self.queued_build = self.queued_build, None
+            self.run_build(show_errors=queued)
+
+    def update_costs(self):
+        """Estimate size and 8086 cycles per node from the new listings and badge the open graphs."""
+        report = CostReport(self.compiler.project_dir, self.compiler.member_listings())
+        self.node_costs = report.node_badges()
+        for container in self.opened_files.values():
+            scene = getattr(container, "canvas_scene", None)
+            if scene is not None:
+                scene.apply_costs(self.node_costs)
+        if report.functions:
+            self.terminal.append("Estimated cost (8086): " + "; ".join(
+                f"{label} {total.size} B, {format_cycles(total.once[0])} cycles"
+                for label, _, total in report.functions
+            ))
+
+    def start_benchmark(self, show_errors):
+        if not self.launcher.project_settings(self.compiler.project_dir).get("benchmark_after_build"):
+            return
+        if self.benchmark_worker is not None:
+            self.terminal.append("Boot benchmark still running; skipped for this build.")
+            return
+        self.terminal.append("Benchmarking boot time...")
+        worker = BenchmarkWorker(self.launcher, self.compiler.project_dir, self)
+        worker.message.connect(self.terminal.append)
+        worker.benchmark_finished.connect(
+            lambda regressions: self.finish_benchmark(regressions, show_errors)
+        )
+        worker.finished.connect(worker.deleteLater)
+        self.benchmark_worker = worker
+        worker.start()
+
+    def finish_benchmark(self, regressions, show_errors):
+        self.benchmark_worker = None
+        for message in regressions:
+            self.terminal.append(f"Performance regression: {message}")
+        if regressions and show_errors:
+            self.show_error("Performance Regression", "\n".join(regressions))
+
+    def cancel_build(self):
+        if self.build_worker is None:
+            return
+        self.build_worker.cancel()
+        self.terminal.append("Cancelling build...")
+
+    def toggle_watch(self, enabled):
+        if enabled:
+            worker = WatchWorker(self.compiler, parent=self)
+            worker.sources_changed.connect(self.watch_changed)
+            worker.finished.connect(worker.deleteLater)
+            self.watch_worker = worker
+            worker.start()
+            self.terminal.append("Watch mode on: boot.img rebuilds when project sources are saved.")
+        else:
+            self.stop_watch()
+            self.terminal.append("Watch mode off.")
+
+    def stop_watch(self):
+        if self.watch_worker is None:
+            return
+        self.watch_worker.cancel()
+        self.watch_worker.wait()
+        self.watch_worker = None
+
+    def watch_changed(self, changed):
+        self.run_build(show_errors=False)
+
+    def queue_emulator_output(self, line):
+        # Appending line by line would re-layout the terminal for every line
+        # QEMU prints; batch whatever arrives within 50 ms instead.
+        self.emulator_lines.append(f"[qemu] {line}")
+        if not self.emulator_flush_timer.isActive():
+            self.emulator_flush_timer.start(50)
+
+    def queue_debug_output(self, stamp, line):
+        # The stamp is taken when the line reaches the host, not when it is shown.
+        clock = time.strftime("%H:%M:%S", time.localtime(stamp))
+        self.emulator_lines.append(f"[debug {clock}.{int(stamp * 1000) % 1000:03d}] {line}")
+        if not self.emulator_flush_timer.isActive():
+            self.emulator_flush_timer.start(50)
+
+    def flush_emulator_output(self):
+        if self.emulator_lines:
+            lines, self.emulator_lines = self.emulator_lines, []
+            self.terminal.append("\n".join(lines))
+
+    def emulator_exited(self, code):
+        self.flush_emulator_output()
+        self.launcher.close_monitor()
+        self.terminal.append(f"Emulator exited with status {code}.")
+        if self.profiler is not None:
+            self.finish_profile()
+
+    def toggle_profile(self, checked):
+        if checked:
+            self.start_profile()
+        else:
+            self.finish_profile()
+
+    def set_profile_button(self, active):
+        self.profile_btn.blockSignals(True)
+        self.profile_btn.setChecked(active)
+        self.profile_btn.setText("Stop Profile" if active else "Profile")
+        self.profile_btn.blockSignals(False)
+
+    def start_profile(self):
+        if self.build_worker is not None:
+            self.terminal.append("Wait for the build to finish before profiling.")
+            self.set_profile_button(False)
+            return
+        if self.launcher.is_running() or self.run_worker is not None:
+            self.terminal.append("Close the emulator before starting a profiling run.")
+            self.set_profile_button(False)
+            return
+        port = free_port()
+        self.set_profile_button(True)
+        self.start_emulator(["-gdb", gdb_argument(port)], lambda started: self.profile_started(port, started))
+
+    def profile_started(self, port, started):
+        if not started or not self.profile_btn.isChecked():
+            self.set_profile_button(False)
+            return
+        self.profiler = SamplingProfiler(port).start(proc=self.launcher.proc)
+        self.terminal.append("Profiling. Close the emulator or press Stop Profile to see the results.")
+
+    def finish_profile(self):
+        profiler, self.profiler = self.profiler, None
+        self.set_profile_button(False)
+        if profiler is None:
+            return
+        profiler.stop()
+        if not profiler.samples:
+            self.terminal.append(f"Profiling collected no samples. {profiler.error}".rstrip())
+            return
+        result = ProfileResult(
+            self.compiler.project_dir, profiler.samples,
+            self.compiler.member_listings(), profiler.elapsed,
+        )
+        self.terminal.append("\n".join(result.table_lines()))
+        try:
+            result.write(os.path.join(self.compiler.project_dir, "build", "profile.json"))
+        except OSError as e:
+            self.terminal.append(f"Warning: could not write profile.json: {e}")
+        self.profile_heat = result.node_heat()
+        for container in self.opened_files.values():
+            scene = getattr(container, "canvas_scene", None)
+            if scene is not None:
+                scene.apply_heat(self.profile_heat)
 
-        except PermissionError:
-            self.show_error("Access Denied",
-                            "Could not write to the image file. It is locked by another program.")
-        except Exception as e:
-            self.show_error("Build Error", f"A serious error occurred:\n\n{str(e)}")
-            self.terminal.append(f"Error: {str(e)}")
     def handle_run(self): 
-        self.launcher.run(self.compiler.project_dir, self.terminal.append)
+        if self.build_worker is not None:
+            self.terminal.append("Wait for the build to finish before running.")
+            return
+        self.start_emulator()
+
+    def start_emulator(self, extra_args=(), on_started=None):
+        # A warm start may boot QEMU once and save a snapshot first, and every
+        # launch waits for QMP, so the launcher runs on a worker thread.
+        if self.run_worker is not None:
+            self.terminal.append("Emulator is already starting.")
+            return
+        worker = RunWorker(self.launcher, self.compiler.project_dir, extra_args, self)
+        worker.message.connect(self.terminal.append)
+        worker.run_finished.connect(lambda started: self.finish_run(started, on_started))
+        worker.finished.connect(worker.deleteLater)
+        self.run_worker = worker
+        worker.start()
+
+    def finish_run(self, started, on_started):
+        self.run_worker = None
+        if on_started is not None:
+            on_started(started)
+        if self.queued_build is not None:
+            queued, self.queued_build = self.queued_build, None
+            self.run_build(show_errors=queued)
 
     def setup_shortcuts(self):
         QShortcut(QKeySequence("F5"), self, self.handle_build)
+        QShortcut(QKeySequence("Shift+F5"), self, self.cancel_build)
         QShortcut(QKeySequence("F6"), self, self.handle_run)
         QShortcut(QKeySequence("F8"), self, self.handle_export)
 
@@ -1126,6 +1433,20 @@ class IDEWindow(QMainWindow):
             return True
         return super().eventFilter(obj, event)
 
+    def closeEvent(self, event):
+        self.stop_watch()
+        if self.run_worker is not None:
+            self.run_worker.wait()
+        if self.build_worker is not None:
+            self.build_worker.cancel()
+            self.build_worker.wait()
+        if self.benchmark_worker is not None:
+            self.benchmark_worker.cancel()
+            self.benchmark_worker.wait()
+        if self.profiler is not None:
+            self.profiler.stop()
+        super().closeEvent(event)
+
 
 class EditorContainer(QWidget):
     def __init__(self, file_path, parent_window, plugin_manager, parent=None):
@@ -1201,6 +1522,7 @@ class EditorContainer(QWidget):
         self.canvas_scene = BlockCanvas()
         self.canvas_scene.update_callback = self.sync_code_from_blocks
         self.canvas_scene.variable_provider = self.get_file_variables
+        self.node_declarations = {}
         self.canvas_scene.definition_provider = self.get_block_definitions
 
         self.canvas_view = BlockView(self.canvas_scene)
@@ -1252,6 +1574,7 @@ class EditorContainer(QWidget):
             self.editor.setPlainText(gen)
             self.editor.blockSignals(False)
             self.editor.auto_save()
+            self.canvas_scene.save_node_map(gen)
 
     def toggle_mode(self):
         project_dir = self.parent_window.compiler.project_dir
@@ -1260,6 +1583,8 @@ class EditorContainer(QWidget):
         try:
             if self.btn_toggle.isChecked():
                 self.canvas_scene.load_blocks_from_project(project_dir, filename)
+                self.canvas_scene.apply_heat(self.parent_window.profile_heat)
+                self.canvas_scene.apply_costs(self.parent_window.node_costs)
 
                 self.stack.setCurrentIndex(1)
                 self.btn_toggle.setText("Return to Code")
@@ -1425,60 +1750,73 @@ class EditorContainer(QWidget):
 
     def get_file_variables(self):
         """Discover variables from only this editor's text and node graph."""
-        sources = []
+        variables = {}
         if not self.btn_toggle.isChecked():
-            sources.append((self.editor.toPlainText(), None))
+            variables.update(self._declared_variables(self.editor.toPlainText(), None))
+        node_declarations = {}
         for item in self.canvas_scene.items():
             if isinstance(item, VisualBlock) and not (item.is_start or item.is_entry):
                 try:
-                    # Declaration discovery must not call get_asm(): dynamic
-                    # print nodes ask this provider for their selected type.
-                    rendered = item.asm_template
-                    for key, value in item.input_values().items():
-                        rendered = rendered.replace(f"{{{key}}}", str(value))
-                    allowed_names = set()
-                    for key, value in item.input_values().items():
-                        placeholder = re.escape("{" + str(key) + "}")
-                        if re.search(
-                                rf"(?mi)^\s*{placeholder}\s*(?::\s*incbin\b|"
-                                rf"(?:equ|db|dw|dd|dq|times)\b)",
-                                item.asm_template):
-                            allowed_names.add(str(value).casefold())
-                    if item.block_name == "Custom Code":
-                        allowed_names = None
-                    sources.append((rendered, allowed_names))
+                    values = item.input_values()
+                    cached = self.node_declarations.get(item.node_id)
+                    if cached is None or cached[0] != values:
+                        cached = (values, self._node_declarations(item, values))
+                    node_declarations[item.node_id] = cached
+                    variables.update(cached[1])
                 except (AttributeError, TypeError):
                     continue
+        # Nodes keep their declarations until their inputs change.
+        self.node_declarations = node_declarations
+        return sorted(variables.values(), key=lambda item: item["name"].casefold())
 
+    def _node_declarations(self, item, values):
+        # Declaration discovery must not call get_asm(): dynamic
+        # print nodes ask this provider for their selected type.
+        rendered = item.asm_template
+        for key, value in values.items():
+            rendered = rendered.replace(f"{{{key}}}", str(value))
+        allowed_names = set()
+        for key, value in values.items():
+            placeholder = re.escape("{" + str(key) + "}")
+            if re.search(
+                    rf"(?mi)^\s*{placeholder}\s*(?::\s*incbin\b|"
+                    rf"(?:equ|db|dw|dd|dq|times)\b)",
+                    item.asm_template):
+                allowed_names.add(str(value).casefold())
+        if item.block_name == "Custom Code":
+            allowed_names = None
+        return self._declared_variables(rendered, allowed_names)
+
+    @staticmethod
+    def _declared_variables(source, allowed_names):
         declarations = re.compile(
             r"(?m)^\s*([A-Za-z_][\w.$@?]*)\s+(db|dw|dd|dq|equ|times)\b([^\n]*)",
             re.IGNORECASE,
         )
         variables = {}
-        for source, allowed_names in sources:
-            for match in declarations.finditer(source):
-                name, directive, remainder = match.groups()
-                if name.startswith("."):
-                    continue
-                if allowed_names is not None and name.casefold() not in allowed_names:
-                    continue
-                directive = directive.lower()
-                if directive == "times":
-                    value_type = "word-array" if re.search(r"\bdw\b", remainder, re.I) else "byte-array"
-                elif directive == "db" and ("'" in remainder or '"' in remainder):
-                    value_type = "text"
-                elif directive == "db":
-                    value_type = "byte"
-                elif directive == "dw":
-                    value_type = "word"
-                elif directive in ("dd", "dq"):
-                    value_type = "wide-integer"
-                elif directive == "equ":
-                    value_type = "constant"
-                else:
-                    value_type = "byte"
-                variables[name.casefold()] = {"name": name, "type": value_type}
-        return sorted(variables.values(), key=lambda item: item["name"].casefold())
+        for match in declarations.finditer(source):
+            name, directive, remainder = match.groups()
+            if name.startswith("."):
+                continue
+            if allowed_names is not None and name.casefold() not in allowed_names:
+                continue
+            directive = directive.lower()
+            if directive == "times":
+                value_type = "word-array" if re.search(r"\bdw\b", remainder, re.I) else "byte-array"
+            elif directive == "db" and ("'" in remainder or '"' in remainder):
+                value_type = "text"
+            elif directive == "db":
+                value_type = "byte"
+            elif directive == "dw":
+                value_type = "word"
+            elif directive in ("dd", "dq"):
+                value_type = "wide-integer"
+            elif directive == "equ":
+                value_type = "constant"
+            else:
+                value_type = "byte"
+            variables[name.casefold()] = {"name": name, "type": value_type}
+        return variables
 
 
 class TabButton(QPushButton):
@@ -1,7 +1,81 @@
+import json
 import os
 import subprocess
 import sys
 import shutil
+import threading
+import time
+
+from .boot_image import has_boot_image
+from .debugcon import DebugConsoleListener
+from .emulator_profiles import profile_args, select_profile
+from .qmp import QMPClient, QMPError, free_port, qmp_argument
+from .warm_start import PARKING_DRIVE_ID, WarmStart
+
+BOOT_DRIVE_ID = "bootdisk"
+DEBUG_EXIT_PORT = 0xF4
+# "disk" attaches boot.img as the first IDE hard disk, as every release before
+# QMP control did; "floppy" uses drive A, whose medium can be swapped while
+# QEMU runs but whose BIOS reads stop at track boundaries.
+BOOT_DRIVES = ("disk", "floppy")
+DEFAULT_BOOT_DRIVE = "disk"
+
+
+def project_boot_drive(settings):
+    value = str((settings or {}).get("boot_drive", DEFAULT_BOOT_DRIVE)).lower()
+    return value if value in BOOT_DRIVES else DEFAULT_BOOT_DRIVE
+
+
+def boot_drive_args(img_path, boot_drive=DEFAULT_BOOT_DRIVE, snapshot=False):
+    """-drive and -boot arguments that boot img_path from the given drive.
+
+    With snapshot, guest writes go to a temporary overlay and img_path is left unchanged.
+    """
+    options = f"id={BOOT_DRIVE_ID},format=raw,{'snapshot=on,' if snapshot else ''}file={os.path.abspath(img_path)}"
+    if boot_drive == "floppy":
+        return ["-drive", f"if=floppy,index=0,{options}", "-boot", "order=a"]
+    return ["-drive", f"if=ide,index=0,{options}"]
+
+
+class HeadlessResult:
+    """Outcome of OSLauncher.run_headless; status is "exited", "timeout" or "error"."""
+
+    def __init__(self, status, returncode=None, elapsed=0.0, serial="", debugcon="",
+                 stderr="", screendump=None, message=""):
+        self.status = status
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.serial = serial
+        self.debugcon = debugcon
+        self.stderr = stderr
+        self.screendump = screendump
+        self.message = message
+
+    @property
+    def guest_exit_code(self):
+        """Value the guest wrote to the isa-debug-exit port, which QEMU exits with as (value << 1) | 1."""
+        if self.status != "exited" or self.returncode is None or not self.returncode & 1:
+            return None
+        return self.returncode >> 1
+
+    def passed(self, allow_timeout=False):
+        if self.status == "timeout":
+            return allow_timeout
+        return self.guest_exit_code == 0
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "returncode": self.returncode,
+            "guest_exit_code": self.guest_exit_code,
+            "elapsed": round(self.elapsed, 3),
+            "serial": self.serial,
+            "debugcon": self.debugcon,
+            "stderr": self.stderr,
+            "screendump": self.screendump,
+            "message": self.message,
+        }
+
 
 class OSLauncher:
     def __init__(self, root_dir):
@@ -13,43 +87,324 @@ class OSLauncher:
             bundled = os.path.abspath(os.path.join(self.root_dir, "qemu", "qemu-system-x86_64"))
             self.qemu_path = system if system else bundled
         self.proc = None
+        self.qmp = None
+        self.qmp_port = None
+        self.image_path = None
+        self.boot_drive = DEFAULT_BOOT_DRIVE
+        self.medium_inserted = False
+        # The floppy a warm start parks on, until the first reboot ejects it.
+        self.parking_drive = None
+        # Called from a reader thread with each line QEMU prints and with its exit status.
+        self.on_output = None
+        self.on_exit = None
+        # Called from a reader thread with a host timestamp and each line logged to port 0xE9.
+        self.on_debug = None
+        self.debug_console = None
 
     def is_running(self):
         return self.proc is not None and self.proc.poll() is None
 
     def kill_emulator(self):
         if self.is_running():
-            self.proc.terminate()
-            self.proc.wait()
+            try:
+                self.command("quit")
+                self.proc.wait(timeout=3)
+            except (QMPError, OSError, subprocess.TimeoutExpired):
+                self.proc.terminate()
+                self.proc.wait()
+        self.close_monitor()
+        self.close_debug_console()
+
+    def monitor(self):
+        """Return the QMP connection to the running emulator, connecting on first use."""
+        if not self.is_running():
+            self.close_monitor()
+            raise QMPError("The emulator is not running.")
+        if self.qmp is None:
+            self.qmp = QMPClient(self.qmp_port).connect(proc=self.proc)
+        return self.qmp
+
+    def close_monitor(self):
+        if self.qmp is not None:
+            self.qmp.close()
+            self.qmp = None
+
+    def command(self, name, **arguments):
+        try:
+            return self.monitor().command(name, **arguments)
+        except OSError as e:
+            self.close_monitor()
+            raise QMPError(str(e))
+
+    def can_swap_medium(self):
+        """True when the running emulator boots from a removable drive that QMP can swap."""
+        return self.is_running() and self.boot_drive == "floppy"
+
+    def eject_medium(self):
+        """Remove boot.img from the floppy drive so the file is free to rewrite."""
+        if self.medium_inserted:
+            self.command("eject", device=BOOT_DRIVE_ID, force=True)
+            self.medium_inserted = False
+
+    def change_medium(self, img_path=None):
+        img_path = os.path.abspath(img_path or self.image_path)
+        self.command(
+            "blockdev-change-medium", device=BOOT_DRIVE_ID, filename=img_path,
+            format="raw", **{"read-only-mode": "read-write"},
+        )
+        self.image_path = img_path
+        self.medium_inserted = True
+
+    def reset(self):
+        self.command("system_reset")
+
+    def pause(self):
+        self.command("stop")
+
+    def resume(self):
+        self.command("cont")
+
+    def screendump(self, path):
+        self.command("screendump", filename=os.path.abspath(path))
+
+    def swap_and_reset(self, img_path=None):
+        """Boot a rebuilt image inside the running emulator instead of relaunching it."""
+        self.change_medium(img_path)
+        self.reset()
+
+    def reboot(self):
+        """Reset a paused hard disk emulator onto the boot.img rewritten in place under it."""
+        if self.parking_drive is not None:
+            # With the parking floppy gone the BIOS boots the hard disk itself.
+            self.command("eject", device=self.parking_drive, force=True)
+            self.parking_drive = None
+        self.reset()
+        self.resume()
+
+    def machine_args(self, headless=False, profile=None):
+        """QEMU command line shared by every run mode, without any drives."""
+        cmd = [self.qemu_path]
+        if sys.platform == 'win32':
+            audio = "dsound"
+        else:
+            audio = "pa"
+            bundled_firmware = os.path.join(self.root_dir, "qemu")
+            if os.path.isdir(bundled_firmware):
+                cmd.extend(["-L", bundled_firmware])
+        if headless:
+            audio = "none"
+            cmd.extend(["-display", "none"])
+        cmd.extend([
+            "-audiodev", f"{audio},id=snd0",
+            "-machine", "pcspk-audiodev=snd0"
+        ])
+        if profile:
+            cmd.extend(profile_args(profile))
+        return cmd
+
+    def project_settings(self, project_dir):
+        try:
+            with open(os.path.join(project_dir, ".projectdata"), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def project_boot_drive(self, project_dir):
+        return project_boot_drive(self.project_settings(project_dir))
+
+    def project_profile(self, project_dir, terminal_callback=None, name=None):
+        """The emulator profile named for this run or chosen in .projectdata, reporting unknown names."""
+        name, profile, warning = select_profile(self.project_settings(project_dir), name)
+        if warning and terminal_callback is not None:
+            terminal_callback(warning)
+        return profile
+
+    def open_debug_console(self):
+        """Start listening for port 0xE9 output and return the QEMU arguments that send it here."""
+        self.close_debug_console()
+        if self.on_debug is None:
+            return []
+        self.debug_console = DebugConsoleListener(self.on_debug).start()
+        return self.debug_console.qemu_args()
+
+    def close_debug_console(self):
+        if self.debug_console is not None:
+            self.debug_console.close()
+            self.debug_console = None
 
-    def run(self, project_dir, terminal_callback):
+    def warm_start_enabled(self, project_dir):
+        return bool(self.project_settings(project_dir).get("warm_start"))
+
+    def run(self, project_dir, terminal_callback, extra_args=()):
+        """Boot boot.img in a QEMU window; extra_args are appended to the command line."""
         img_path = os.path.abspath(os.path.join(project_dir, "build", "boot.img"))
         if self.is_running():
             terminal_callback("Emulator is already running!")
             return
-        if not os.path.exists(img_path):
+        if not has_boot_image(img_path):
             terminal_callback("Error: boot.img not found. Run Build first.")
             return
+        self.close_monitor()
+        self.image_path = img_path
+        self.boot_drive = self.project_boot_drive(project_dir)
+        self.medium_inserted = True
+        self.parking_drive = None
+        self.qmp_port = free_port()
+        machine = self.machine_args(profile=self.project_profile(project_dir, terminal_callback))
+        run_args = [*self.open_debug_console(), *extra_args]
+        if self.warm_start_enabled(project_dir) and self.run_warm(
+            project_dir, machine, terminal_callback, run_args
+        ):
+            return
         terminal_callback("Starting Emulation.")
-        if sys.platform == 'win32':
-            cmd = [
-                self.qemu_path,
-                "-drive", f"format=raw,file={img_path}",
-                "-audiodev", "dsound,id=snd0",
-                "-machine", "pcspk-audiodev=snd0"
-            ]
-        else:
-            cmd = [self.qemu_path]
-            bundled_firmware = os.path.join(self.root_dir, "qemu")
-            if os.path.isdir(bundled_firmware):
-                cmd.extend(["-L", bundled_firmware])
-            cmd.extend([
-                "-drive", f"format=raw,file={img_path}",
-                "-audiodev", "pa,id=snd0",
-                "-machine", "pcspk-audiodev=snd0"
-            ])
-            print(cmd, self.qemu_path, img_path)
+        cmd = machine + [
+            *boot_drive_args(img_path, self.boot_drive),
+            "-qmp", qmp_argument(self.qmp_port),
+            *run_args,
+        ]
         try:
-            self.proc = subprocess.Popen(cmd)
+            self.spawn(cmd)
         except Exception as e:
+            self.proc = None
+            self.close_debug_console()
             terminal_callback(f"QEMU failed: {e}")
+
+    def spawn(self, cmd):
+        """Start QEMU with its output piped to on_output instead of a console."""
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, errors="replace", bufsize=1, **kwargs,
+        )
+        self.proc = proc
+        threading.Thread(target=self._read_output, args=(proc,), daemon=True).start()
+        return proc
+
+    def _read_output(self, proc):
+        for line in proc.stdout:
+            if self.on_output is not None:
+                self.on_output(line.rstrip("\r\n"))
+        proc.stdout.close()
+        code = proc.wait()
+        # A replaced process (such as a failed warm start) must not report the live one as gone.
+        if proc is self.proc and self.on_exit is not None:
+            self.on_exit(code)
+
+    def run_warm(self, project_dir, machine, terminal_callback, extra_args=()):
+        warm = WarmStart(self.qemu_path, project_dir, BOOT_DRIVE_ID, self.boot_drive)
+        try:
+            if not warm.is_ready(machine, extra_args):
+                terminal_callback("Preparing warm start: booting QEMU once to save the state after POST.")
+                warm.prepare(machine, extra_args=extra_args)
+            terminal_callback("Starting Emulation (warm start).")
+            self.proc, self.qmp = warm.launch(
+                machine, self.qmp_port, spawn=lambda cmd: self.spawn([*cmd, *extra_args])
+            )
+            self.parking_drive = None if warm.floppy else PARKING_DRIVE_ID
+            return True
+        except (OSError, QMPError) as e:
+            self.proc = None
+            warm.invalidate()
+            terminal_callback(f"Warm start unavailable ({e}); cold booting instead.")
+            return False
+
+    def run_headless(self, project_dir, timeout=10.0, screendump=None, output_dir=None, extra_args=(),
+                     profile=None):
+        """Boot boot.img with no window or audio and wait for the guest to exit or time out.
+
+        Serial (COM1) and debugcon (port 0xE9) output are captured to files in
+        output_dir, build/run by default. The guest ends the run by writing an
+        exit code to port 0xF4. Writes to the boot drive go to a private temporary
+        overlay, so boot.img is never modified and several runs may share it.
+        extra_args are appended to the QEMU command line. profile overrides
+        the project's emulator profile.
+        """
+        img_path = os.path.abspath(os.path.join(project_dir, "build", "boot.img"))
+        if not has_boot_image(img_path):
+            return HeadlessResult("error", message="boot.img not found. Run Build first.")
+        output_dir = output_dir or os.path.join(project_dir, "build", "run")
+        return self.run_image_headless(
+            img_path, output_dir, timeout, screendump, extra_args,
+            profile=self.project_profile(project_dir) if profile is None else profile,
+            boot_drive=self.project_boot_drive(project_dir),
+        )
+
+    def run_image_headless(self, img_path, output_dir, timeout=10.0, screendump=None,
+                           extra_args=(), profile=None, boot_drive=DEFAULT_BOOT_DRIVE):
+        """run_headless for any image, under the given emulator profile and boot drive."""
+        img_path = os.path.abspath(img_path)
+        output_dir = os.path.abspath(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        serial_path = os.path.join(output_dir, "serial.log")
+        debugcon_path = os.path.join(output_dir, "debugcon.log")
+        for path in (serial_path, debugcon_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        port = free_port()
+        cmd = self.machine_args(headless=True, profile=profile) + [
+            *boot_drive_args(img_path, boot_drive, snapshot=True),
+            "-serial", f"file:{serial_path}",
+            "-debugcon", f"file:{debugcon_path}",
+            "-device", f"isa-debug-exit,iobase={DEBUG_EXIT_PORT:#x},iosize=0x04",
+            "-no-reboot",
+            "-qmp", qmp_argument(port),
+            *extra_args,
+        ]
+        started = time.monotonic()
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            return HeadlessResult("error", message=f"QEMU failed: {e}")
+
+        status = "exited"
+        dumped = None
+        try:
+            _, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            status = "timeout"
+            qmp = QMPClient(port)
+            try:
+                qmp.connect(timeout=2.0, proc=proc)
+                if screendump:
+                    qmp.command("screendump", filename=os.path.abspath(screendump))
+                    dumped = os.path.abspath(screendump)
+                qmp.command("quit")
+            except (QMPError, OSError):
+                proc.kill()
+            finally:
+                qmp.close()
+            try:
+                _, stderr = proc.communicate(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                _, stderr = proc.communicate()
+        elapsed = time.monotonic() - started
+
+        stderr = stderr.decode(errors="replace").strip()
+        errors = [
+            line for line in stderr.splitlines()
+            if line.startswith(os.path.basename(self.qemu_path).split(".")[0] + ":")
+            and ": warning:" not in line
+        ]
+        message = ""
+        if status == "exited" and errors:
+            status = "error"
+            message = errors[0]
+        return HeadlessResult(
+            status, proc.returncode, elapsed,
+            serial=self._read_capture(serial_path),
+            debugcon=self._read_capture(debugcon_path),
+            stderr=stderr, screendump=dumped, message=message,
+        )
+
+    @staticmethod
+    def _read_capture(path):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return ""
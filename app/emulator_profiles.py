@@ -0,0 +1,125 @@
+"""Accelerator, CPU and memory presets for QEMU, plus a benchmark to compare them."""
+
+import os
+import statistics
+import sys
+
+from .boot_image import FLOPPY_SIZE
+
+# "legacy" adds nothing, so runs keep QEMU's own command line unless a profile is chosen.
+DEFAULT_PROFILE = "legacy"
+
+# accel "auto" means KVM when /dev/kvm is usable and tuned TCG otherwise; tb_size is in MiB.
+EMULATOR_PROFILES = {
+    "auto": {"accel": "auto", "thread": "multi", "tb_size": 256},
+    "kvm": {"accel": "kvm", "cpu": "host"},
+    "tcg": {"accel": "tcg", "thread": "multi", "tb_size": 256},
+    "tcg-small": {"accel": "tcg", "thread": "single", "tb_size": 64, "memory": 16},
+    "legacy": {},
+}
+
+# Sets mode 13h, fills the whole 320x200 frame buffer 64 times and exits
+# through the isa-debug-exit port with code 0.
+BENCHMARK_CODE = bytes([
+    0xB8, 0x13, 0x00,        # 00 mov ax, 0x0013
+    0xCD, 0x10,              # 03 int 0x10
+    0xB8, 0x00, 0xA0,        # 05 mov ax, 0xa000
+    0x8E, 0xC0,              # 08 mov es, ax
+    0xFC,                    # 0A cld
+    0xBA, 0x40, 0x00,        # 0B mov dx, 64
+    0x31, 0xFF,              # 0E frame: xor di, di
+    0xB9, 0x00, 0x7D,        # 10 mov cx, 32000
+    0x89, 0xD0,              # 13 mov ax, dx
+    0xF3, 0xAB,              # 15 rep stosw
+    0x4A,                    # 17 dec dx
+    0x75, 0xF4,              # 18 jnz frame
+    0xB0, 0x00,              # 1A mov al, 0
+    0xE6, 0xF4,              # 1C out 0xf4, al
+    0xF4,                    # 1E halt: hlt
+    0xEB, 0xFD,              # 1F jmp halt
+])
+
+
+def kvm_available():
+    return sys.platform.startswith("linux") and os.access("/dev/kvm", os.R_OK | os.W_OK)
+
+
+def available_profiles(settings=None):
+    """Built-in profiles overlaid with the project's "emulator_profiles" entries."""
+    profiles = {name: dict(profile) for name, profile in EMULATOR_PROFILES.items()}
+    custom = (settings or {}).get("emulator_profiles")
+    if isinstance(custom, dict):
+        for name, profile in custom.items():
+            if isinstance(profile, dict):
+                profiles[str(name)] = dict(profile)
+    return profiles
+
+
+def select_profile(settings=None, name=None):
+    """Return (name, profile, warning) for name, or else the project's "emulator_profile" setting."""
+    profiles = available_profiles(settings)
+    if name is None:
+        name = (settings or {}).get("emulator_profile", DEFAULT_PROFILE)
+    name = str(name)
+    if name in profiles:
+        return name, profiles[name], ""
+    return DEFAULT_PROFILE, profiles[DEFAULT_PROFILE], (
+        f"Unknown emulator profile '{name}'; using '{DEFAULT_PROFILE}'."
+    )
+
+
+def profile_args(profile):
+    args = []
+    accel = str(profile.get("accel", "")).lower()
+    if accel == "auto":
+        accel = "kvm" if kvm_available() else "tcg"
+    if accel == "tcg":
+        options = ["tcg"]
+        if profile.get("thread"):
+            options.append(f"thread={profile['thread']}")
+        if profile.get("tb_size"):
+            options.append(f"tb-size={int(profile['tb_size'])}")
+        args.extend(["-accel", ",".join(options)])
+    elif accel:
+        args.extend(["-accel", accel])
+    cpu = profile.get("cpu")
+    if cpu == "host" and accel != "kvm":
+        cpu = "max"
+    if cpu:
+        args.extend(["-cpu", str(cpu)])
+    if profile.get("memory"):
+        args.extend(["-m", str(int(profile["memory"]))])
+    return args
+
+
+def write_benchmark_image(path):
+    with open(path, "wb") as handle:
+        handle.write(BENCHMARK_CODE.ljust(510, b"\0") + b"\x55\xaa")
+        handle.truncate(FLOPPY_SIZE)
+    return path
+
+
+def benchmark_profiles(launcher, profiles, work_dir, repeats=3, timeout=30.0, progress=None):
+    """Boot the reference image under each profile; fastest first as (name, median, error)."""
+    os.makedirs(work_dir, exist_ok=True)
+    image = write_benchmark_image(os.path.join(work_dir, "benchmark.img"))
+    results = []
+    for name, profile in profiles.items():
+        if profile.get("accel") == "kvm" and not kvm_available():
+            results.append((name, None, "/dev/kvm is not available"))
+            continue
+        times = []
+        error = ""
+        for _ in range(repeats):
+            result = launcher.run_image_headless(
+                image, os.path.join(work_dir, name), timeout=timeout, profile=profile
+            )
+            if result.guest_exit_code != 0:
+                error = result.message or f"run ended with status {result.status}"
+                break
+            times.append(result.elapsed)
+        median = statistics.median(times) if times and not error else None
+        results.append((name, median, error))
+        if progress is not None:
+            progress(name, median, error)
+    return sorted(results, key=lambda item: (item[1] is None, item[1] or 0.0))
@@ -0,0 +1,129 @@
+"""Minimal GDB remote serial protocol client for QEMU's gdbstub (-gdb tcp:...)."""
+
+import socket
+import time
+
+# Register numbers in QEMU's x86-64 gdbstub layout.
+RIP_REGISTER = 16
+CS_REGISTER = 18
+
+
+class GDBStubError(Exception):
+    pass
+
+
+def gdb_argument(port):
+    return f"tcp:127.0.0.1:{port}"
+
+
+class GDBStubClient:
+    def __init__(self, port, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.buffer = b""
+
+    def connect(self, timeout=5.0, proc=None):
+        """Connect while QEMU starts up; QEMU pauses the guest when a debugger attaches."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+                break
+            except OSError:
+                if proc is not None and proc.poll() is not None:
+                    raise GDBStubError("QEMU exited before its gdbstub was ready.")
+                if time.monotonic() >= deadline:
+                    raise GDBStubError(f"Could not connect to the gdbstub on port {self.port}.")
+                time.sleep(0.05)
+        self.sock.sendall(b"+")
+        if self.request("QStartNoAckMode") != "OK":
+            raise GDBStubError("The gdbstub refused no-ack mode.")
+        self.request("?")
+        return self
+
+    def _read(self):
+        try:
+            data = self.sock.recv(4096)
+        except OSError as error:
+            raise GDBStubError(str(error))
+        if not data:
+            raise GDBStubError("QEMU closed the gdbstub connection.")
+        self.buffer += data
+
+    def _receive(self):
+        while True:
+            start = self.buffer.find(b"$")
+            end = self.buffer.find(b"#", start + 1) if start >= 0 else -1
+            if end >= 0 and len(self.buffer) >= end + 3:
+                payload = self.buffer[start + 1:end]
+                self.buffer = self.buffer[end + 3:]
+                return self._unescape(payload).decode("latin-1")
+            self._read()
+
+    @staticmethod
+    def _unescape(payload):
+        if b"}" not in payload:
+            return payload
+        output = bytearray()
+        escaped = False
+        for byte in payload:
+            if escaped:
+                output.append(byte ^ 0x20)
+                escaped = False
+            elif byte == 0x7D:
+                escaped = True
+            else:
+                output.append(byte)
+        return bytes(output)
+
+    def send(self, packet):
+        data = packet.encode("latin-1")
+        checksum = sum(data) & 0xFF
+        self.sock.sendall(b"$" + data + b"#" + f"{checksum:02x}".encode("ascii"))
+
+    def request(self, packet):
+        self.send(packet)
+        return self._receive()
+
+    def read_register(self, number):
+        reply = self.request(f"p{number:x}")
+        if not reply or reply.startswith("E") or "x" in reply:
+            raise GDBStubError(f"Register {number} is not available ({reply or 'empty reply'}).")
+        return int.from_bytes(bytes.fromhex(reply), "little")
+
+    def interrupt(self):
+        """Stop the running guest and return the stop reply."""
+        self.sock.sendall(b"\x03")
+        reply = self._receive()
+        if reply.startswith(("W", "X")):
+            raise GDBStubError("The guest exited.")
+        return reply
+
+    def resume(self):
+        # The reply to "c" only arrives when the guest stops again.
+        self.send("c")
+
+    def sample(self):
+        """Return the guest's (CS, IP) and let it continue; the guest must be running."""
+        self.interrupt()
+        ip = self.read_register(RIP_REGISTER)
+        cs = self.read_register(CS_REGISTER) & 0xFFFF
+        self.resume()
+        return cs, ip
+
+    def detach(self):
+        """Stop sampling and leave the guest running without a debugger."""
+        try:
+            self.interrupt()
+            self.request("D")
+        except (GDBStubError, OSError):
+            pass
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
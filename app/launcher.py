@@ -159,7 +159,7 @@ class Launcher(QWidget):
 
     def write_asm_templates(self, path):
         files = {
-            "main.asm": "[org 0x7c00]\nKERNEL_OFFSET equ 0x1000\n\njmp 0:start\n\nstart:\n    xor ax, ax\n    mov ds, ax\n    mov es, ax\n    mov ss, ax\n    mov sp, 0x7c00\n    \n    mov [0x7e00], dl\n\n    call load_kernel\n    \n    jmp 0x0000:KERNEL_OFFSET\n\n%include \"disk.asm\"\n\nload_kernel:\n    mov bx, KERNEL_OFFSET\n    mov dh, 32\n    mov dl, [0x7e00]\n    call disk_load\n    ret\n\ntimes 510-($-$$) db 0\ndw 0xaa55",
+            "main.asm": "[org 0x7c00]\nKERNEL_OFFSET equ 0x1000\n\n; The build defines KERNEL_SECTORS from the size of kernel.bin.\n%ifndef KERNEL_SECTORS\n%define KERNEL_SECTORS 32\n%endif\n\njmp 0:start\n\nstart:\n    xor ax, ax\n    mov ds, ax\n    mov es, ax\n    mov ss, ax\n    mov sp, 0x7c00\n    \n    mov [0x7e00], dl\n\n    call load_kernel\n    \n    jmp 0x0000:KERNEL_OFFSET\n\n%include \"disk.asm\"\n\nload_kernel:\n    mov bx, KERNEL_OFFSET\n    mov dh, KERNEL_SECTORS\n    mov dl, [0x7e00]\n    call disk_load\n    ret\n\ntimes 510-($-$$) db 0\ndw 0xaa55",
             "disk.asm": "disk_load:\n    push dx\n    mov si, 3\n\ndisk_retry:\n    mov ah, 0x02\n    mov al, dh\n    mov ch, 0x00\n    mov dh, 0x00\n    mov cl, 0x02\n    mov dl, [0x7e00]\n    int 0x13\n    \n    jnc disk_done\n\n    xor ax, ax\n    int 0x13\n    dec si\n    jnz disk_retry\n\ndisk_error:\n    mov ah, 0x0e\n    mov al, 'E'\n    int 0x10\n    jmp $\n\ndisk_done:\n    pop dx\n    ret",
             "kernel.asm": "[org 0x1000]\nmov si, MSG_HELLO\ncall print_string\n\njmp $\n\nprint_string:\n    mov ah, 0x0e\n.loop:\n    lodsb\n    cmp al, 0\n    je .done\n    int 0x10\n    jmp .loop\n.done:\n    ret\n\nMSG_HELLO db \"Hello World!\", 0"
         }
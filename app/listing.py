@@ -0,0 +1,182 @@
+"""NASM listing files (nasm -l) mapped back to source files and lines.
+
+Each listing row holds the source line number, the offset and bytes it
+produced, an include or macro nesting marker such as <1>, and the source text.
+Rows nested under a %include row belong to the included file, while rows
+nested under any other row are macro expansions and stay with the line that
+invoked the macro.
+"""
+
+import bisect
+import os
+import re
+
+from .dependencies import INCLUDE_RE, resolve_reference
+
+# NASM writes "%6d %08X %-19s" (or 28 blanks when a row emits nothing), then
+# "  <n>" or four blanks, a space and the source text.
+_ROW_RE = re.compile(r"^\s*(\d+) (?:([0-9A-Fa-f]{8}) (.{1,19}))?")
+_LEVEL_RE = re.compile(r"^\s*<(\d+)> ?")
+DATA_COLUMNS = 35
+_REP_RE = re.compile(r"<rep ([0-9A-Fa-f]+)h>")
+# Bracketed and parenthesised fields hold operands the assembler relocates.
+_FIELD_RE = re.compile(r"([\[(])?([0-9A-Fa-f]+)[\])]?")
+_ORG_RE = re.compile(r"^\s*\[?\s*org\s+([0-9A-Fa-fxXhH$]+)\s*\]?", re.IGNORECASE)
+
+
+class ListingLine:
+    __slots__ = ("source", "line", "offset", "data", "text")
+
+    def __init__(self, source, line, offset, data, text):
+        self.source = source
+        self.line = line
+        self.offset = offset
+        self.data = data
+        self.text = text
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+def parse_number(text):
+    """Evaluate a plain NASM numeric literal such as 0x7c00, 7c00h, $7c00 or 31744."""
+    text = text.strip().lower().replace("_", "")
+    try:
+        if text.startswith(("0x", "0h")):
+            return int(text[2:], 16)
+        if text.startswith("$") and len(text) > 1:
+            return int(text[1:], 16)
+        if text.endswith("h"):
+            return int(text[:-1], 16)
+        return int(text, 10)
+    except ValueError:
+        return None
+
+
+def _data_bytes(data, image=None, offset=0):
+    """Decode a row's data column, taking relocated operands from image when it is given.
+
+    NASM brackets operands that the org or a segment base will relocate, e.g.
+    C706[2100]; the listing shows them before relocation. When image (the
+    unit's flat binary) agrees with every other byte of the row, its bytes
+    are returned instead.
+    """
+    data = data.strip().rstrip("-")
+    if not data or data.startswith("<"):
+        return b""
+    # "3000<rep 28h>" stands for the bytes 30 00 written 0x28 times.
+    repeat = _REP_RE.search(data)
+    count = int(repeat.group(1), 16) if repeat else 1
+    unit = bytearray()
+    fixed = []
+    for field in _FIELD_RE.finditer(data[:repeat.start()] if repeat else data):
+        digits = field.group(2)
+        value = bytes.fromhex(digits[:len(digits) // 2 * 2])
+        unit += value
+        fixed += [not field.group(1)] * len(value)
+    value = bytes(unit) * count
+    if image is None or all(fixed):
+        return value
+    stored = image[offset:offset + len(value)]
+    fixed *= count
+    if len(stored) == len(value) and all(
+        stored[index] == value[index] for index in range(len(value)) if fixed[index]
+    ):
+        return bytes(stored)
+    return value
+
+
+def parse_listing(listing_path, source_path, binary_path=None):
+    """Return (lines, origin) for a listing produced while assembling source_path.
+
+    lines hold every row that emitted bytes; origin is the value of the
+    unit's org directive, or 0 when it has none or it is not a literal.
+    Relocated operand bytes come from binary_path, by default the .bin next
+    to the listing, when it exists.
+    """
+    if binary_path is None:
+        binary_path = os.path.splitext(listing_path)[0] + ".bin"
+    try:
+        with open(binary_path, "rb") as handle:
+            image = handle.read()
+    except OSError:
+        image = None
+    source_path = os.path.normpath(os.path.abspath(source_path))
+    unit_dir = os.path.dirname(source_path)
+    # Each entry is (nesting level, file, whether the level is a macro expansion).
+    stack = [(0, source_path, False)]
+    last_line = {0: (source_path, 0, "")}
+    lines = []
+    origin = None
+    previous = (source_path, 0, "")
+    with open(listing_path, "r", encoding="utf-8", errors="replace") as handle:
+        for raw in handle:
+            row = raw.rstrip("\r\n")
+            match = _ROW_RE.match(row)
+            if not match:
+                continue
+            if len(row) <= DATA_COLUMNS:
+                # Bytes that overflowed the previous row's data column.
+                source, number, text = previous
+            else:
+                rest = row[DATA_COLUMNS:]
+                level_match = _LEVEL_RE.match(rest)
+                level = int(level_match.group(1)) if level_match else 0
+                text = rest[level_match.end():] if level_match else rest[5:]
+                while stack[-1][0] > level:
+                    stack.pop()
+                if level > stack[-1][0]:
+                    parent_file, _, parent_text = previous
+                    include = INCLUDE_RE.match(parent_text)
+                    if include and not stack[-1][2]:
+                        stack.append((level, resolve_reference(
+                            include.group(1), unit_dir, os.path.dirname(parent_file)
+                        ), False))
+                    else:
+                        stack.append((level, parent_file, True))
+                if stack[-1][2]:
+                    # Expanded macro bodies count towards the line that invoked the macro.
+                    invoking = next(depth for depth, _, macro in reversed(stack) if not macro)
+                    source, number, text = last_line[invoking]
+                else:
+                    source, number = stack[-1][1], int(match.group(1))
+                    last_line[level] = (source, number, text)
+                    if origin is None and level == 0:
+                        org = _ORG_RE.match(text)
+                        if org:
+                            origin = parse_number(org.group(1))
+                previous = (source, number, text)
+
+            if match.group(2):
+                offset = int(match.group(2), 16)
+                data = _data_bytes(match.group(3) or "", image, offset)
+                if data:
+                    lines.append(ListingLine(source, number, offset, data, text))
+    return lines, origin or 0
+
+
+class AddressMap:
+    """Look up the source line that produced the byte at a linear guest address."""
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+
+    def add_listing(self, listing_path, source_path, base=None):
+        lines, origin = parse_listing(listing_path, source_path)
+        base = origin if base is None else base
+        for entry in lines:
+            self.entries.append((base + entry.offset, entry))
+        self.entries.sort(key=lambda item: item[0])
+        self.starts = [start for start, _ in self.entries]
+        return len(lines)
+
+    def lookup(self, address):
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index < 0:
+            return None
+        start, entry = self.entries[index]
+        if address < start + entry.size:
+            return entry
+        return None
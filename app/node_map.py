@@ -0,0 +1,104 @@
+"""Which node graph node produced each line of a generated assembly file.
+
+The node editor writes blocks/<file>.nodemap.json whenever it regenerates a
+file. The map holds a hash of the generated code, so it is ignored once the
+file has been edited by hand.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+
+def node_map_path(project_dir, file_name):
+    return os.path.join(project_dir, "blocks", f"{file_name}.nodemap.json")
+
+
+def code_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def write_node_map(project_dir, file_name, code, spans):
+    os.makedirs(os.path.join(project_dir, "blocks"), exist_ok=True)
+    data = {"version": 1, "sha256": code_hash(code), "spans": [list(span) for span in spans]}
+    with open(node_map_path(project_dir, file_name), "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+
+
+class NodeMap:
+    """Line-to-node lookup for one generated source file."""
+
+    def __init__(self, spans, names=None):
+        self.spans = sorted((int(first), int(last), str(node_id)) for node_id, first, last in spans)
+        self.names = names or {}
+
+    def node_at(self, line):
+        for first, last, node_id in self.spans:
+            if first <= line <= last:
+                return node_id
+            if first > line:
+                break
+        return None
+
+    def name(self, node_id):
+        return self.names.get(node_id, node_id[:8])
+
+
+def saved_nodes(project_dir, file_name):
+    """The node graph's saved node records for file_name, keyed by node_id."""
+    nodes = {}
+    for path in glob.glob(os.path.join(project_dir, "blocks", f"{file_name}_*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and data.get("node_id"):
+            nodes[str(data["node_id"])] = data
+    return nodes
+
+
+def node_names(project_dir, file_name):
+    return {node_id: str(data.get("name", "")) for node_id, data in saved_nodes(project_dir, file_name).items()}
+
+
+def function_chains(project_dir, file_name):
+    """(name, node_ids) for the START chain and each function entry chain, in generated order."""
+    nodes = saved_nodes(project_dir, file_name)
+    starts = [data for data in nodes.values() if data.get("is_start")]
+    entries = [data for data in nodes.values() if data.get("entry_point") and not data.get("is_start")]
+    entries.sort(key=lambda data: (data.get("y", 0), data.get("x", 0), str(data["node_id"])))
+    chains = []
+    visited = set()
+    for root in starts[:1] + entries:
+        inputs = root.get("inputs") or []
+        name = "START" if root.get("is_start") else str(
+            (inputs[0].get("value") if inputs and isinstance(inputs[0], dict) else None) or root.get("name", "")
+        )
+        node_ids = []
+        node_id = str(root["node_id"])
+        while node_id in nodes and node_id not in visited:
+            visited.add(node_id)
+            node_ids.append(node_id)
+            node_id = str(nodes[node_id].get("next_node"))
+        chains.append((name, node_ids))
+    return chains
+
+
+def load_node_map(project_dir, source_path):
+    """Return the NodeMap for source_path, or None if it has none or it is out of date."""
+    file_name = os.path.basename(source_path)
+    try:
+        with open(node_map_path(project_dir, file_name), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+        with open(source_path, "r", encoding="utf-8", errors="ignore") as handle:
+            code = handle.read()
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("sha256") != code_hash(code):
+        return None
+    try:
+        return NodeMap(data.get("spans", []), node_names(project_dir, file_name))
+    except (TypeError, ValueError):
+        return None
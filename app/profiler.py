@@ -0,0 +1,161 @@
+"""Sampling profiler: stop the guest through QEMU's gdbstub at a fixed rate and
+attribute each CS:IP sample to the source line and node graph node behind it."""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from .gdbstub import GDBStubClient, GDBStubError
+from .listing import AddressMap
+from .node_map import load_node_map
+
+DEFAULT_RATE = 200.0
+
+
+def linear_address(cs, ip):
+    """Real-mode CS:IP as a linear address; larger instruction pointers are taken as flat."""
+    if ip > 0xFFFF:
+        return ip
+    return (cs << 4) + ip
+
+
+class SamplingProfiler:
+    def __init__(self, port, rate=DEFAULT_RATE):
+        self.port = port
+        self.interval = 1.0 / max(1.0, float(rate))
+        self.samples = Counter()
+        self.error = ""
+        self.elapsed = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, proc=None, connect_timeout=10.0):
+        self.thread = threading.Thread(
+            target=self._run, args=(proc, connect_timeout), daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self, proc, connect_timeout):
+        client = GDBStubClient(self.port)
+        started = time.monotonic()
+        try:
+            client.connect(timeout=connect_timeout, proc=proc)
+            started = time.monotonic()
+            client.resume()
+            while not self.stop_event.wait(self.interval):
+                cs, ip = client.sample()
+                self.samples[linear_address(cs, ip)] += 1
+            client.detach()
+        except (GDBStubError, OSError) as error:
+            # The guest shutting down simply ends the run.
+            if not self.samples:
+                self.error = str(error)
+        finally:
+            self.elapsed = time.monotonic() - started
+            client.close()
+
+
+class ProfileResult:
+    def __init__(self, project_dir, samples, listings, elapsed=0.0):
+        """listings are (listing, source) pairs as returned by Compiler.member_listings."""
+        self.project_dir = os.path.abspath(project_dir)
+        self.elapsed = elapsed
+        self.total = sum(samples.values())
+        self.missing_listings = []
+        address_map = AddressMap()
+        for listing, source in listings:
+            try:
+                address_map.add_listing(listing, source)
+            except OSError:
+                self.missing_listings.append(os.path.relpath(listing, self.project_dir))
+
+        self.lines = Counter()
+        self.line_text = {}
+        self.unresolved = 0
+        for address, count in samples.items():
+            entry = address_map.lookup(address)
+            if entry is None:
+                self.unresolved += count
+                continue
+            key = (entry.source, entry.line)
+            self.lines[key] += count
+            self.line_text[key] = entry.text.strip()
+
+        self.nodes = Counter()
+        self.node_labels = {}
+        node_maps = {}
+        for (source, line), count in self.lines.items():
+            if source not in node_maps:
+                node_maps[source] = load_node_map(self.project_dir, source)
+            node_map = node_maps[source]
+            node_id = node_map.node_at(line) if node_map is not None else None
+            if node_id is not None:
+                self.nodes[node_id] += count
+                self.node_labels[node_id] = f"{node_map.name(node_id)} ({self.relative(source)})"
+
+    def relative(self, path):
+        return os.path.relpath(path, self.project_dir)
+
+    def share(self, count):
+        return count / self.total if self.total else 0.0
+
+    def node_heat(self):
+        """Map node_id to (heat relative to the hottest node, share label) for BlockCanvas.apply_heat."""
+        hottest = max(self.nodes.values(), default=0)
+        return {
+            node_id: (count / hottest, f"{self.share(count) * 100:.1f}%")
+            for node_id, count in self.nodes.items()
+        }
+
+    def table_lines(self, limit=15):
+        lines = [
+            f"Profile: {self.total} sample(s) over {self.elapsed:.2f}s; "
+            f"{self.unresolved} outside the project's code (BIOS or data)."
+        ]
+        if self.missing_listings:
+            lines.append(
+                "No NASM listing for " + ", ".join(self.missing_listings) + "; rebuild to create it."
+            )
+        if self.nodes:
+            lines.append("  samples   share  node")
+            for node_id, count in self.nodes.most_common(limit):
+                lines.append(f"  {count:7d}  {self.share(count) * 100:5.1f}%  {self.node_labels[node_id]}")
+        lines.append("  samples   share  line")
+        for (source, line), count in self.lines.most_common(limit):
+            text = self.line_text[(source, line)]
+            lines.append(
+                f"  {count:7d}  {self.share(count) * 100:5.1f}%  {self.relative(source)}:{line}  {text}"
+            )
+        return lines
+
+    def to_dict(self):
+        return {
+            "samples": self.total,
+            "elapsed": round(self.elapsed, 3),
+            "unresolved": self.unresolved,
+            "lines": [
+                {"source": self.relative(source), "line": line, "samples": count,
+                 "text": self.line_text[(source, line)]}
+                for (source, line), count in self.lines.most_common()
+            ],
+            "nodes": [
+                {"node_id": node_id, "label": self.node_labels[node_id], "samples": count}
+                for node_id, count in self.nodes.most_common()
+            ],
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, indent=2)
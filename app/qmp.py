@@ -0,0 +1,100 @@
+"""Minimal QEMU Machine Protocol client over a localhost TCP socket."""
+
+import json
+import socket
+import threading
+import time
+
+
+class QMPError(Exception):
+    pass
+
+
+_issued_ports = set()
+_issued_lock = threading.Lock()
+
+
+def free_port():
+    """Return a localhost TCP port that is free right now and not handed out before.
+
+    Concurrent launches would otherwise race for the same port between the
+    probe closing and QEMU binding it.
+    """
+    with _issued_lock:
+        if len(_issued_ports) > 4096:
+            _issued_ports.clear()
+        while True:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+            if port not in _issued_ports:
+                _issued_ports.add(port)
+                return port
+
+
+def qmp_argument(port):
+    return f"tcp:127.0.0.1:{port},server=on,wait=off"
+
+
+class QMPClient:
+    def __init__(self, port, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.reader = None
+        self.events = []
+
+    def connect(self, timeout=5.0, proc=None):
+        """Connect and negotiate capabilities, retrying while QEMU starts up."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+                break
+            except OSError:
+                if proc is not None and proc.poll() is not None:
+                    raise QMPError("QEMU exited before its monitor was ready.")
+                if time.monotonic() >= deadline:
+                    raise QMPError(f"Could not connect to QEMU on port {self.port}.")
+                time.sleep(0.05)
+        self.reader = self.sock.makefile("r", encoding="utf-8")
+        greeting = self._read()
+        if "QMP" not in greeting:
+            raise QMPError("QEMU did not send a QMP greeting.")
+        self.command("qmp_capabilities")
+        return self
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise QMPError("QEMU closed the monitor connection.")
+        return json.loads(line)
+
+    def command(self, name, **arguments):
+        message = {"execute": name}
+        if arguments:
+            message["arguments"] = arguments
+        self.sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        while True:
+            reply = self._read()
+            if "event" in reply:
+                self.events.append(reply)
+                continue
+            if "error" in reply:
+                error = reply["error"]
+                raise QMPError(f"{name}: {error.get('desc', error)}")
+            return reply.get("return")
+
+    def human(self, command_line):
+        """Run a human monitor command, for the few features QMP lacks."""
+        return self.command("human-monitor-command", **{"command-line": command_line}) or ""
+
+    def close(self):
+        for handle in (self.reader, self.sock):
+            if handle is not None:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+        self.reader = None
+        self.sock = None
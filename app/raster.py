@@ -0,0 +1,216 @@
+"""Small dependency-free PPM/PNG reader and writer and pixel comparison for screenshots."""
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG colour type: channels per pixel.
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+class RasterError(ValueError):
+    pass
+
+
+class RGBImage:
+    """8-bit RGB pixels, row by row with no padding."""
+
+    def __init__(self, width, height, pixels):
+        if len(pixels) != width * height * 3:
+            raise RasterError(f"Expected {width * height * 3} bytes of pixels, got {len(pixels)}")
+        self.width = width
+        self.height = height
+        self.pixels = bytes(pixels)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
+def _ppm_tokens(data, count):
+    tokens = []
+    position = 2
+    while len(tokens) < count:
+        while position < len(data) and data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b"#":
+            position = data.find(b"\n", position)
+            if position < 0:
+                break
+            continue
+        start = position
+        while position < len(data) and not data[position:position + 1].isspace():
+            position += 1
+        if start == position:
+            break
+        tokens.append(data[start:position])
+    if len(tokens) < count:
+        raise RasterError("Truncated PPM header")
+    # Exactly one whitespace byte separates the header from the pixels.
+    return tokens, position + 1
+
+
+def read_ppm(data):
+    if data[:2] != b"P6":
+        raise RasterError("Only binary (P6) PPM files are supported")
+    tokens, position = _ppm_tokens(data, 3)
+    try:
+        width, height, maxval = (int(token) for token in tokens)
+    except ValueError:
+        raise RasterError("Invalid PPM header")
+    if maxval != 255:
+        raise RasterError(f"Only 8-bit PPM files are supported, not maxval {maxval}")
+    pixels = data[position:position + width * height * 3]
+    if len(pixels) < width * height * 3:
+        raise RasterError("Truncated PPM pixel data")
+    return RGBImage(width, height, pixels)
+
+
+def _paeth(left, up, up_left):
+    estimate = left + up - up_left
+    to_left = abs(estimate - left)
+    to_up = abs(estimate - up)
+    to_up_left = abs(estimate - up_left)
+    if to_left <= to_up and to_left <= to_up_left:
+        return left
+    if to_up <= to_up_left:
+        return up
+    return up_left
+
+
+def _unfilter(raw, width, height, channels):
+    stride = width * channels
+    rows = []
+    previous = bytearray(stride)
+    position = 0
+    for _ in range(height):
+        if position + 1 + stride > len(raw):
+            raise RasterError("Truncated PNG image data")
+        kind = raw[position]
+        row = bytearray(raw[position + 1:position + 1 + stride])
+        position += 1 + stride
+        if kind == 1:
+            for i in range(channels, stride):
+                row[i] = (row[i] + row[i - channels]) & 0xFF
+        elif kind == 2:
+            row = bytearray((a + b) & 0xFF for a, b in zip(row, previous))
+        elif kind == 3:
+            for i in range(stride):
+                left = row[i - channels] if i >= channels else 0
+                row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                left = row[i - channels] if i >= channels else 0
+                up_left = previous[i - channels] if i >= channels else 0
+                row[i] = (row[i] + _paeth(left, previous[i], up_left)) & 0xFF
+        elif kind != 0:
+            raise RasterError(f"Unknown PNG filter type {kind}")
+        rows.append(row)
+        previous = row
+    return rows
+
+
+def read_png(data):
+    if data[:8] != PNG_SIGNATURE:
+        raise RasterError("Not a PNG file")
+    position = 8
+    header = None
+    palette = b""
+    compressed = []
+    while position + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        position += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"IDAT":
+            compressed.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise RasterError("PNG file has no IHDR chunk")
+    width, height, depth, colour, _, _, interlace = header
+    if depth != 8 or colour not in _PNG_CHANNELS:
+        raise RasterError(f"Only 8-bit PNG files are supported (depth {depth}, colour type {colour})")
+    if interlace:
+        raise RasterError("Interlaced PNG files are not supported")
+    try:
+        raw = zlib.decompress(b"".join(compressed))
+    except zlib.error as e:
+        raise RasterError(f"Corrupt PNG image data: {e}")
+
+    channels = _PNG_CHANNELS[colour]
+    pixels = bytearray()
+    for row in _unfilter(raw, width, height, channels):
+        if colour == 2:
+            pixels += row
+        elif colour == 6:
+            # Alpha is dropped; screendumps are always opaque.
+            for i in range(0, len(row), 4):
+                pixels += row[i:i + 3]
+        elif colour == 3:
+            for index in row:
+                colour_bytes = palette[index * 3:index * 3 + 3]
+                if len(colour_bytes) != 3:
+                    raise RasterError(f"PNG palette has no entry {index}")
+                pixels += colour_bytes
+        else:
+            for i in range(0, len(row), channels):
+                pixels += bytes((row[i],)) * 3
+    return RGBImage(width, height, pixels)
+
+
+def read_image(path):
+    """Read a PPM or PNG file as an RGBImage."""
+    with open(path, "rb") as handle:
+        data = handle.read()
+    if data[:8] == PNG_SIGNATURE:
+        return read_png(data)
+    return read_ppm(data)
+
+
+def _png_chunk(kind, body):
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def write_png(image, path):
+    stride = image.width * 3
+    raw = b"".join(
+        b"\x00" + image.pixels[row * stride:(row + 1) * stride] for row in range(image.height)
+    )
+    with open(path, "wb") as handle:
+        handle.write(PNG_SIGNATURE)
+        handle.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", image.width, image.height, 8, 2, 0, 0, 0)))
+        handle.write(_png_chunk(b"IDAT", zlib.compress(raw, 9)))
+        handle.write(_png_chunk(b"IEND", b""))
+
+
+def compare_images(actual, expected, tolerance=0):
+    """Count pixels where any channel differs by more than tolerance.
+
+    Returns (mismatched pixels, largest channel difference, diff image). The diff
+    image shows the expected picture dimmed, with mismatched pixels in red.
+    Images of different sizes raise RasterError.
+    """
+    if actual.size != expected.size:
+        raise RasterError(
+            f"Screen is {actual.width}x{actual.height}, expected {expected.width}x{expected.height}"
+        )
+    mismatched = 0
+    largest = 0
+    diff = bytearray(len(expected.pixels))
+    a = actual.pixels
+    e = expected.pixels
+    for i in range(0, len(e), 3):
+        delta = max(abs(a[i] - e[i]), abs(a[i + 1] - e[i + 1]), abs(a[i + 2] - e[i + 2]))
+        if delta > largest:
+            largest = delta
+        if delta > tolerance:
+            mismatched += 1
+            diff[i] = 255
+        else:
+            grey = (e[i] * 30 + e[i + 1] * 59 + e[i + 2] * 11) // 300
+            diff[i] = diff[i + 1] = diff[i + 2] = grey
+    return mismatched, largest, RGBImage(expected.width, expected.height, diff)
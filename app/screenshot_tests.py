@@ -0,0 +1,225 @@
+"""Golden-screenshot tests: boot headless, wait for a debug console marker or a
+number of BIOS timer ticks, and compare a QMP screendump with a stored PNG.
+Nothing here may import Qt."""
+
+import os
+import re
+import subprocess
+import time
+
+from .boot_benchmark import MarkerClock, parse_marker
+from .boot_image import has_boot_image
+from .emulator import DEFAULT_BOOT_DRIVE, boot_drive_args
+from .qmp import QMPClient, QMPError, free_port, qmp_argument
+from .raster import RasterError, compare_images, read_image, write_png
+
+GOLDEN_DIR = "screenshots"
+# BIOS data area dword counting timer ticks (18.2 per second) since midnight.
+TICK_ADDRESS = 0x46C
+DEFAULT_TICKS = 18
+# The guest clock starts at midnight and follows virtual time, so the tick
+# counter measures time since power-on and dated screens are reproducible.
+RTC_ARGUMENT = "base=2000-01-01T00:00:00,clock=vm"
+
+
+class ScreenshotTest:
+    def __init__(self, name, marker=None, ticks=None, tolerance=0, max_pixels=0, timeout=10.0):
+        self.name = name
+        self.marker = marker
+        self.ticks = DEFAULT_TICKS if ticks is None and marker is None else ticks
+        self.tolerance = tolerance
+        self.max_pixels = max_pixels
+        self.timeout = timeout
+
+    @property
+    def file_name(self):
+        return re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name)
+
+    def golden_path(self, project_dir):
+        """screenshots/<name>.png, or a hand-captured screenshots/<name>.ppm when there is no PNG."""
+        path = os.path.join(project_dir, GOLDEN_DIR, f"{self.file_name}.png")
+        ppm_path = os.path.splitext(path)[0] + ".ppm"
+        if not os.path.exists(path) and os.path.exists(ppm_path):
+            return ppm_path
+        return path
+
+    def output_path(self, project_dir, suffix):
+        return os.path.join(project_dir, "build", "screenshots", f"{self.file_name}{suffix}")
+
+
+def load_screenshot_tests(project_settings, names=(), **overrides):
+    """Tests from the project's "screenshot_tests" list, or one test named "screen".
+
+    Non-None overrides (marker, ticks, tolerance, max_pixels, timeout) apply to
+    every test. Raises ValueError for malformed entries or unknown names.
+    """
+    configured = project_settings.get("screenshot_tests") or [{"name": "screen"}]
+    if not isinstance(configured, list):
+        raise ValueError('"screenshot_tests" must be a list of tests.')
+    tests = []
+    for entry in configured:
+        if not isinstance(entry, dict) or not entry.get("name"):
+            raise ValueError("Every screenshot test needs a name.")
+        options = {key: entry.get(key) for key in ("marker", "ticks", "tolerance", "max_pixels", "timeout")}
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        tests.append(ScreenshotTest(
+            str(entry["name"]),
+            marker=parse_marker(options["marker"]),
+            ticks=None if options["ticks"] is None else max(0, int(options["ticks"])),
+            tolerance=int(options["tolerance"] or 0),
+            max_pixels=int(options["max_pixels"] or 0),
+            timeout=float(options["timeout"] or 10.0),
+        ))
+    if names:
+        unknown = sorted(set(names) - {test.name for test in tests})
+        if unknown:
+            raise ValueError(f"No screenshot test named {', '.join(unknown)}.")
+        tests = [test for test in tests if test.name in names]
+    return tests
+
+
+class ScreenshotResult:
+    def __init__(self, test, outcome, message="", mismatched=0, largest=0,
+                 actual=None, golden=None, diff=None, elapsed=0.0):
+        self.test = test
+        self.outcome = outcome
+        self.message = message
+        self.mismatched = mismatched
+        self.largest = largest
+        self.actual = actual
+        self.golden = golden
+        self.diff = diff
+        self.elapsed = elapsed
+
+    def to_dict(self):
+        return {
+            "name": self.test.name,
+            "outcome": self.outcome,
+            "message": self.message,
+            "mismatched_pixels": self.mismatched,
+            "largest_difference": self.largest,
+            "tolerance": self.test.tolerance,
+            "max_pixels": self.test.max_pixels,
+            "actual": self.actual,
+            "golden": self.golden,
+            "diff": self.diff,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+def read_ticks(qmp, scratch_path):
+    qmp.command("pmemsave", val=TICK_ADDRESS, size=4, filename=os.path.abspath(scratch_path))
+    with open(scratch_path, "rb") as handle:
+        return int.from_bytes(handle.read(4), "little")
+
+
+def capture_screen(launcher, img_path, path, test, profile=None, boot_drive=DEFAULT_BOOT_DRIVE):
+    """Boot img_path, wait for the test's marker and ticks, pause the guest and
+    write its screen to path as PPM. Raises QMPError or OSError on failure."""
+    clock = MarkerClock(test.marker).start() if test.marker is not None else None
+    port = free_port()
+    cmd = launcher.machine_args(headless=True, profile=profile) + [
+        *boot_drive_args(img_path, boot_drive, snapshot=True),
+        "-rtc", RTC_ARGUMENT,
+        "-no-reboot",
+        "-S",
+        "-qmp", qmp_argument(port),
+        *(clock.qemu_args() if clock is not None else ()),
+    ]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    scratch_path = f"{path}.ticks"
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    qmp = QMPClient(port)
+    try:
+        try:
+            qmp.connect(timeout=test.timeout, proc=proc)
+        except QMPError as error:
+            if proc.poll() is not None and proc.stderr is not None:
+                raise QMPError(proc.stderr.read().decode(errors="replace").strip() or str(error))
+            raise
+        deadline = time.monotonic() + test.timeout
+        if clock is not None:
+            clock.started = time.monotonic()
+        qmp.command("cont")
+        if clock is not None and (not clock.done.wait(test.timeout) or clock.boot_time is None):
+            raise QMPError(f"Marker {test.marker:#04x} did not reach port 0xE9 within {test.timeout:g}s.")
+        if test.ticks:
+            while read_ticks(qmp, scratch_path) < test.ticks:
+                if time.monotonic() >= deadline or proc.poll() is not None:
+                    raise QMPError(f"The guest did not run {test.ticks} timer ticks within {test.timeout:g}s.")
+                time.sleep(0.02)
+        qmp.command("stop")
+        qmp.command("screendump", filename=os.path.abspath(path))
+    finally:
+        if qmp.sock is not None:
+            try:
+                qmp.command("quit")
+            except (QMPError, OSError):
+                pass
+        qmp.close()
+        if clock is not None:
+            clock.close()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        if proc.stderr is not None:
+            proc.stderr.close()
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+
+
+def run_screenshot_test(launcher, project_dir, test, update=False, profile=None):
+    """Capture test's screen and compare it with its golden PNG, or store it as the golden with update."""
+    started = time.monotonic()
+    img_path = os.path.join(project_dir, "build", "boot.img")
+    actual_path = test.output_path(project_dir, ".ppm")
+    golden_path = test.golden_path(project_dir)
+    diff_path = test.output_path(project_dir, ".diff.png")
+    if os.path.exists(diff_path):
+        os.remove(diff_path)
+    if not has_boot_image(img_path):
+        return ScreenshotResult(test, "error", "boot.img not found. Run Build first.")
+    try:
+        capture_screen(launcher, img_path, actual_path, test, profile, launcher.project_boot_drive(project_dir))
+        actual = read_image(actual_path)
+        if update:
+            golden_path = os.path.splitext(golden_path)[0] + ".png"
+            os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+            write_png(actual, golden_path)
+            return ScreenshotResult(
+                test, "updated", f"Golden screenshot written to {golden_path}",
+                actual=actual_path, golden=golden_path, elapsed=time.monotonic() - started,
+            )
+        if not os.path.isfile(golden_path):
+            return ScreenshotResult(
+                test, "error", f"No golden screenshot at {golden_path}; run with --update to create it.",
+                actual=actual_path, elapsed=time.monotonic() - started,
+            )
+        mismatched, largest, diff = compare_images(actual, read_image(golden_path), test.tolerance)
+    except (QMPError, OSError, RasterError) as e:
+        return ScreenshotResult(test, "error", str(e), elapsed=time.monotonic() - started)
+
+    if mismatched <= test.max_pixels:
+        return ScreenshotResult(
+            test, "passed", mismatched=mismatched, largest=largest,
+            actual=actual_path, golden=golden_path, elapsed=time.monotonic() - started,
+        )
+    message = (
+        f"{mismatched} of {diff.width * diff.height} pixels differ by more than {test.tolerance} "
+        f"(largest difference {largest})"
+    )
+    try:
+        write_png(diff, diff_path)
+    except (OSError, RasterError) as e:
+        # The comparison already failed; a diff that cannot be saved must not hide that.
+        message += f"; could not write diff: {e}"
+        diff_path = None
+    else:
+        message += f"; diff written to {diff_path}"
+    return ScreenshotResult(
+        test, "failed", message,
+        mismatched=mismatched, largest=largest, actual=actual_path, golden=golden_path,
+        diff=diff_path, elapsed=time.monotonic() - started,
+    )
@@ -0,0 +1,52 @@
+"""Cheap placement of project assets into the build directory."""
+
+import os
+import shutil
+import sys
+
+# Linux FICLONE ioctl: share extents copy-on-write on btrfs, XFS and similar.
+FICLONE = 0x40049409
+
+STAGING_MODES = ("referenced", "all", "none")
+
+
+def _reflink(source, target):
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+    shutil.copystat(source, target)
+    return True
+
+
+def is_current(source, target):
+    try:
+        source_stat = os.stat(source)
+        target_stat = os.stat(target)
+    except OSError:
+        return False
+    return (source_stat.st_size == target_stat.st_size
+            and source_stat.st_mtime_ns == target_stat.st_mtime_ns)
+
+
+def stage_file(source, target):
+    """Place source at target; return "unchanged", "reflinked", "linked" or "copied"."""
+    if is_current(source, target):
+        return "unchanged"
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    if _reflink(source, target):
+        return "reflinked"
+    try:
+        os.link(source, target)
+        return "linked"
+    except OSError:
+        shutil.copy2(source, target)
+        return "copied"
@@ -0,0 +1,808 @@
+"""In-process PC for running NASM flat binaries and floppy images without QEMU.
+
+VirtualPC wraps the CPU core in cpu8086.py with a small BIOS (int 0x10 text,
+teletype and mode 13h pixels, int 0x13 floppy reads, int 0x15 waits and APM
+power off, int 0x16 keyboard, int 0x1A clock), a text/VGA framebuffer in
+ordinary memory, the VGA DAC, a virtual timer and the QEMU debug ports
+(0xE9 console, 0xF4 exit). Time is counted in executed instructions, so runs
+are deterministic. Nothing here may import Qt.
+"""
+
+import os
+import subprocess
+import tempfile
+from collections import deque
+
+from .cpu8086 import AX, BP, BX, CX, CS, DS, DX, ES, IF, SP, SS, ZF, CF, CPU, CPUError
+from .raster import RGBImage
+
+BIOS_SEGMENT = 0xF000
+# BIOS services are entered at F000:<vector>; F000:0100+<vector> holds a plain
+# IRET that chained handlers (int 0x1C from int 0x08) return through.
+CHAIN_RETURN = 0x100
+TICKS_PER_DAY = 0x1800B0
+TICK_SECONDS = 65536 / 1193182
+DEFAULT_SPEED = 2_000_000
+KEY_HOLD_TICKS = 2
+DEBUGCON_PORT = 0xE9
+DEBUG_EXIT_PORT = 0xF4
+
+TEXT_MODES = {0x00: 40, 0x01: 40, 0x02: 80, 0x03: 80, 0x07: 80}
+GRAPHICS_MODE = 0x13
+
+# IBM PC 8x8 font for characters 0x20-0x7E, as drawn by the VGA BIOS in mode 13h.
+FONT_8X8 = bytes.fromhex(
+    "0000000000000000" "3078783030003000" "6c6c6c0000000000" "6c6cfe6cfe6c6c00"
+    "307cc0780cf83000" "00c6cc183066c600" "386c3876dccc7600" "6060c00000000000"
+    "1830606060301800" "6030181818306000" "00663cff3c660000" "003030fc30300000"
+    "0000000000303060" "000000fc00000000" "0000000000303000" "060c183060c08000"
+    "7cc6cedef6e67c00" "307030303030fc00" "78cc0c3860ccfc00" "78cc0c380ccc7800"
+    "1c3c6cccfe0c1e00" "fcc0f80c0ccc7800" "3860c0f8cccc7800" "fccc0c1830303000"
+    "78cccc78cccc7800" "78cccc7c0c187000" "0030300000303000" "0030300000303060"
+    "183060c060301800" "0000fc0000fc0000" "6030180c18306000" "78cc0c1830003000"
+    "7cc6dededec07800" "3078ccccfccccc00" "fc66667c6666fc00" "3c66c0c0c0663c00"
+    "f86c6666666cf800" "fe6268786862fe00" "fe6268786860f000" "3c66c0c0ce663e00"
+    "ccccccfccccccc00" "7830303030307800" "1e0c0c0ccccc7800" "e6666c786c66e600"
+    "f06060606266fe00" "c6eefefed6c6c600" "c6e6f6decec6c600" "386cc6c6c66c3800"
+    "fc66667c6060f000" "78ccccccdc781c00" "fc66667c6c66e600" "78cce0701ccc7800"
+    "fcb4303030307800" "ccccccccccccfc00" "cccccccccc783000" "c6c6c6d6feeec600"
+    "c6c66c38386cc600" "cccccc7830307800" "fec68c183266fe00" "7860606060607800"
+    "c06030180c060200" "7818181818187800" "10386cc600000000" "00000000000000ff"
+    "3030180000000000" "0000780c7ccc7600" "e060607c6666dc00" "000078ccc0cc7800"
+    "1c0c0c7ccccc7600" "000078ccfcc07800" "386c60f06060f000" "000076cccc7c0cf8"
+    "e0606c766666e600" "3000703030307800" "0c000c0c0ccccc78" "e060666c786ce600"
+    "7030303030307800" "0000ccfefed6c600" "0000f8cccccccc00" "000078cccccc7800"
+    "0000dc66667c60f0" "000076cccc7c0c1e" "0000dc766660f000" "00007cc0780cf800"
+    "10307c3030341800" "0000cccccccc7600" "0000cccccc783000" "0000c6d6fefe6c00"
+    "0000c66c386cc600" "0000cccccc7c0cf8" "0000fc983064fc00" "1c3030e030301c00"
+    "1818180018181800" "e030301c3030e000" "76dc000000000000"
+)
+
+# Standard VGA DAC contents after a mode set: 16 EGA colours, 16 greys, then
+# 24 hues at three saturations for each of three intensities (6-bit values).
+_EGA_COLOURS = (
+    (0, 0, 0), (0, 0, 42), (0, 42, 0), (0, 42, 42), (42, 0, 0), (42, 0, 42), (42, 21, 0), (42, 42, 42),
+    (21, 21, 21), (21, 21, 63), (21, 63, 21), (21, 63, 63), (63, 21, 21), (63, 21, 63), (63, 63, 21), (63, 63, 63),
+)
+_GREYS = (0, 5, 8, 11, 14, 17, 20, 24, 28, 32, 36, 40, 45, 50, 56, 63)
+_HUE_RAMPS = (
+    (0, 16, 31, 47, 63), (31, 39, 47, 55, 63), (45, 49, 54, 58, 63),
+    (0, 7, 14, 21, 28), (14, 17, 21, 24, 28), (20, 22, 24, 26, 28),
+    (0, 4, 8, 12, 16), (8, 10, 12, 14, 16), (11, 12, 13, 15, 16),
+)
+
+
+def default_palette():
+    palette = [tuple(colour) for colour in _EGA_COLOURS]
+    palette += [(grey, grey, grey) for grey in _GREYS]
+    for ramp in _HUE_RAMPS:
+        low, high = ramp[0], ramp[4]
+        for step in range(24):
+            segment, index = divmod(step, 4)
+            rising = ramp[index]
+            falling = ramp[4 - index]
+            palette.append((
+                (rising, high, high, falling, low, low)[segment],
+                (low, low, rising, high, high, falling)[segment],
+                (high, falling, low, low, rising, high)[segment],
+            ))
+    palette += [(0, 0, 0)] * (256 - len(palette))
+    return palette
+
+
+# Set 1 make codes for the keys type_keys understands, with their ASCII value.
+_SCANCODE_ROWS = (
+    (0x02, "1234567890-="), (0x10, "qwertyuiop[]"), (0x1E, "asdfghjkl;'`"), (0x2B, "\\zxcvbnm,./"),
+)
+_SHIFTED = dict(zip('!@#$%^&*()_+{}:"~|<>?', "1234567890-=[];'`\\,./"))
+NAMED_KEYS = {
+    "enter": (0x1C, 0x0D), "esc": (0x01, 0x1B), "space": (0x39, 0x20), "tab": (0x0F, 0x09),
+    "backspace": (0x0E, 0x08), "up": (0x48, 0xE0), "down": (0x50, 0xE0), "left": (0x4B, 0xE0),
+    "right": (0x4D, 0xE0),
+}
+_EXTENDED_KEYS = {0x48, 0x50, 0x4B, 0x4D}
+
+
+def key_code(key):
+    """(scancode, ascii) for one character or a NAMED_KEYS name; raises ValueError."""
+    if key.lower() in NAMED_KEYS:
+        return NAMED_KEYS[key.lower()]
+    if len(key) != 1:
+        raise ValueError(f"Unknown key {key!r}.")
+    if key == "\n":
+        return NAMED_KEYS["enter"]
+    base = _SHIFTED.get(key, key.lower())
+    if base == " ":
+        return NAMED_KEYS["space"]
+    for first, characters in _SCANCODE_ROWS:
+        if base in characters:
+            return first + characters.index(base), ord(key)
+    raise ValueError(f"Unknown key {key!r}.")
+
+
+def parse_keys(text):
+    """Split text into keys; {name} stands for a NAMED_KEYS entry, e.g. "y{enter}"."""
+    keys = []
+    position = 0
+    while position < len(text):
+        if text[position] == "{" and "}" in text[position:]:
+            end = text.index("}", position)
+            keys.append(text[position + 1:end])
+            position = end + 1
+        else:
+            keys.append(text[position])
+            position += 1
+    return [key_code(key) for key in keys]
+
+
+def floppy_geometry(size):
+    """(cylinders, heads, sectors per track) for a floppy image of size bytes."""
+    for total, geometry in ((163840, (40, 1, 8)), (184320, (40, 1, 9)), (327680, (40, 2, 8)),
+                            (368640, (40, 2, 9)), (737280, (80, 2, 9)), (1228800, (80, 2, 15)),
+                            (2949120, (80, 2, 36))):
+        if size == total:
+            return geometry
+    return 80, 2, 18
+
+
+class VirtualPC:
+    def __init__(self, speed=DEFAULT_SPEED):
+        """speed is the number of instructions that count as one second of guest time."""
+        self.cpu = CPU(port_in=self.port_in, port_out=self.port_out)
+        self.speed = speed
+        self.ticks_per_instruction = 1.0 / (speed * TICK_SECONDS)
+        self.instructions = 0
+        self.clock = 0.0
+        self.next_tick = 1.0
+        self.pending_ticks = 0
+        self.floppy = None
+        self.geometry = (80, 2, 18)
+        self.debugcon = bytearray()
+        self.teletype = []
+        self.exit_code = None
+        self.stop_reason = None
+        self.stop_message = ""
+        self.keys = deque()
+        self.key_buffer = deque()
+        self.scancodes = deque()
+        self.held_key = None
+        self.key_latch = 0
+        self.palette = default_palette()
+        self.dac_write = 0
+        self.dac_read = 0
+        self.dac_pending = []
+        self.retrace = 0
+        self.ports = {}
+        self._reset_bios()
+
+    # Setup
+
+    def _reset_bios(self):
+        memory = self.cpu.memory
+        for vector in range(256):
+            memory[vector * 4:vector * 4 + 4] = bytes((vector, 0, BIOS_SEGMENT & 0xFF, BIOS_SEGMENT >> 8))
+        base = BIOS_SEGMENT << 4
+        memory[base:base + 2 * CHAIN_RETURN] = b"\xcf" * (2 * CHAIN_RETURN)
+        # Jumping to the reset vector reboots, which ends the run.
+        memory[0xFFFF0:0xFFFF2] = b"\xcd\x19"
+        self._write_bda16(0x10, 0x0021)
+        self._write_bda16(0x13, 640)
+        self.set_video_mode(0x03)
+
+    def load_binary(self, data, address=0x1000):
+        """Load a flat binary at 0000:address and start it there, as the generated loader does."""
+        if address + len(data) > 0xA0000:
+            raise ValueError("The binary does not fit in conventional memory.")
+        self.cpu.memory[address:address + len(data)] = data
+        self._start(0, address)
+
+    def load_floppy(self, image):
+        """Insert a floppy image and boot its first sector at 0000:7C00."""
+        self.floppy = bytearray(image)
+        self.geometry = floppy_geometry(len(image))
+        self.cpu.memory[0x7C00:0x7E00] = bytes(self.floppy[:512]).ljust(512, b"\0")
+        self._start(0, 0x7C00)
+        self.cpu.regs[DX] = 0x0000
+
+    def _start(self, segment, offset):
+        cpu = self.cpu
+        for register in (ES, CS, SS, DS):
+            cpu.sregs[register] = segment
+        cpu.regs[SP] = 0x7C00
+        cpu.ip = offset
+        cpu.flags = 0x0002 | IF
+
+    def type_keys(self, keys):
+        """Queue (scancode, ascii) pairs, or text for parse_keys, as key presses."""
+        if isinstance(keys, str):
+            keys = parse_keys(keys)
+        self.keys.extend(keys)
+
+    # Running
+
+    def stop(self, reason, message=""):
+        self.stop_reason = reason
+        self.stop_message = message
+
+    def run(self, max_instructions=20_000_000):
+        """Run until the guest halts with interrupts off, exits through port 0xF4, reboots,
+        powers off, waits for a key that was not queued, fails, or max_instructions pass.
+
+        Returns the stop reason: "halted", "exit", "reboot", "shutdown", "keyboard",
+        "error" or "limit". A run stopped for "keyboard" or "limit" can be resumed.
+        """
+        cpu = self.cpu
+        sregs = cpu.sregs
+        step = cpu.step
+        per_instruction = self.ticks_per_instruction
+        limit = self.instructions + max_instructions
+        self.stop_reason = None
+        self.stop_message = ""
+        count = self.instructions
+        try:
+            while self.stop_reason is None:
+                if count >= limit:
+                    self.stop("limit", f"Stopped after {max_instructions} instructions.")
+                    break
+                if sregs[CS] == BIOS_SEGMENT and cpu.ip < CHAIN_RETURN:
+                    self.instructions = count
+                    self.bios_call(cpu.ip)
+                    continue
+                step()
+                count += 1
+                self.clock += per_instruction
+                if cpu.halted:
+                    if not cpu.flags & IF:
+                        self.stop("halted", f"HLT with interrupts disabled at {sregs[CS]:04X}:{cpu.start_ip:04X}.")
+                        break
+                    self.clock = max(self.clock, self.next_tick)
+                    cpu.halted = False
+                if self.clock >= self.next_tick or self.pending_ticks or self.scancodes:
+                    self._timer_events()
+        except CPUError as error:
+            self.stop("error", str(error))
+        self.instructions = count
+        return self.stop_reason
+
+    def _timer_events(self):
+        cpu = self.cpu
+        while self.clock >= self.next_tick:
+            self.pending_ticks += 1
+            self.next_tick += 1.0
+            self._keyboard_tick()
+        if not cpu.flags & IF:
+            return
+        if self.pending_ticks:
+            self.pending_ticks -= 1
+            cpu.interrupt(0x08)
+        elif self.scancodes:
+            self.key_latch = self.scancodes.popleft()
+            cpu.interrupt(0x09)
+
+    def _keyboard_tick(self):
+        """Press and release queued keys through IRQ 1 for programs that hook int 0x09."""
+        if self._vector_is_bios(0x09):
+            return
+        if self.held_key is not None:
+            key, release = self.held_key
+            if self.next_tick >= release:
+                prefix = (0xE0,) if key[0] in _EXTENDED_KEYS else ()
+                self.scancodes.extend(prefix + (key[0] | 0x80,))
+                self.held_key = None
+        elif self.keys:
+            key = self.keys.popleft()
+            prefix = (0xE0,) if key[0] in _EXTENDED_KEYS else ()
+            self.scancodes.extend(prefix + (key[0],))
+            self.held_key = (key, self.next_tick + KEY_HOLD_TICKS)
+
+    def _vector_is_bios(self, vector):
+        cpu = self.cpu
+        return cpu.read16(0, vector * 4) == vector and cpu.read16(0, vector * 4 + 2) == BIOS_SEGMENT
+
+    @property
+    def seconds(self):
+        """Guest time since power-on, including time skipped by HLT and int 0x15 waits."""
+        return self.clock * TICK_SECONDS
+
+    def advance_time(self, seconds):
+        self.clock += seconds / TICK_SECONDS
+
+    # Ports
+
+    def port_in(self, port, word):
+        if port == 0x60:
+            return self.key_latch
+        if port == 0x64:
+            return 0x1D if self.scancodes else 0x1C
+        if port == 0x3DA:
+            self.retrace ^= 0x09
+            return self.retrace
+        if port == 0x3C9:
+            if not self.dac_pending:
+                self.dac_pending = list(self.palette[self.dac_read])
+                self.dac_read = (self.dac_read + 1) & 0xFF
+            return self.dac_pending.pop(0)
+        if port == 0x40:
+            return int(self.clock * 65536) & 0xFF
+        if port == DEBUGCON_PORT:
+            return DEBUGCON_PORT
+        if port in self.ports:
+            return self.ports[port]
+        return 0xFFFF if word else 0xFF
+
+    def port_out(self, port, value, word):
+        if port == DEBUGCON_PORT:
+            self.debugcon.append(value & 0xFF)
+        elif port == DEBUG_EXIT_PORT:
+            # The value QEMU's isa-debug-exit device would report as guest_exit_code.
+            self.exit_code = value & 0xFF
+            self.stop("exit", f"Guest exited with code {self.exit_code}.")
+        elif port == 0x3C8:
+            self.dac_write = value & 0xFF
+            self.dac_pending = []
+        elif port == 0x3C7:
+            self.dac_read = value & 0xFF
+            self.dac_pending = []
+        elif port == 0x3C9:
+            self.dac_pending.append(value & 0x3F)
+            if len(self.dac_pending) == 3:
+                self.palette[self.dac_write] = tuple(self.dac_pending)
+                self.dac_write = (self.dac_write + 1) & 0xFF
+                self.dac_pending = []
+        elif word:
+            self.ports[port] = value & 0xFF
+            self.ports[port + 1] = (value >> 8) & 0xFF
+        else:
+            self.ports[port] = value & 0xFF
+
+    # BIOS
+
+    def _bda8(self, offset):
+        return self.cpu.memory[0x400 + offset]
+
+    def _write_bda8(self, offset, value):
+        self.cpu.memory[0x400 + offset] = value & 0xFF
+
+    def _bda16(self, offset):
+        return self.cpu.read16(0x40, offset)
+
+    def _write_bda16(self, offset, value):
+        self.cpu.write16(0x40, offset, value)
+
+    def _return_flag(self, flag, value):
+        """Set or clear flag in the FLAGS word the caller's IRET will restore."""
+        cpu = self.cpu
+        offset = (cpu.regs[SP] + 4) & 0xFFFF
+        flags = cpu.read16(cpu.sregs[SS], offset)
+        cpu.write16(cpu.sregs[SS], offset, flags | flag if value else flags & ~flag)
+
+    def bios_call(self, vector):
+        cpu = self.cpu
+        handler = {
+            0x00: self._bios_fault, 0x06: self._bios_fault, 0x08: self._bios_timer,
+            0x09: self._bios_keyboard_irq, 0x10: self._bios_video, 0x11: self._bios_equipment,
+            0x12: self._bios_memory, 0x13: self._bios_disk, 0x15: self._bios_system,
+            0x16: self._bios_keyboard, 0x19: self._bios_reboot, 0x1A: self._bios_clock,
+        }.get(vector)
+        # Handlers return False to stay in the stub instead of returning to the caller.
+        if handler is None or handler(vector) is not False:
+            cpu.iret()
+
+    def _caller(self):
+        cpu = self.cpu
+        return f"{cpu.read16(cpu.sregs[SS], cpu.regs[SP] + 2):04X}:{cpu.read16(cpu.sregs[SS], cpu.regs[SP]):04X}"
+
+    def _bios_fault(self, vector):
+        name = "Divide error" if vector == 0 else "Invalid opcode"
+        self.stop("error", f"{name} at {self._caller()}.")
+        return False
+
+    def _bios_reboot(self, vector):
+        self.stop("reboot", "The guest rebooted.")
+        return False
+
+    def _bios_timer(self, vector):
+        ticks = self._bda16(0x6C) | (self._bda16(0x6E) << 16)
+        ticks += 1
+        if ticks >= TICKS_PER_DAY:
+            ticks = 0
+            self._write_bda8(0x70, 1)
+        self._write_bda16(0x6C, ticks & 0xFFFF)
+        self._write_bda16(0x6E, ticks >> 16)
+        if not self._vector_is_bios(0x1C):
+            # Chain to the program's int 0x1C handler, which returns through an IRET stub.
+            cpu = self.cpu
+            cpu.ip = CHAIN_RETURN + 0x08
+            cpu.interrupt(0x1C)
+            return False
+
+    def _bios_keyboard_irq(self, vector):
+        # Reached when a program's own handler chains to the BIOS one.
+        if self.held_key is not None and self.key_latch == self.held_key[0][0]:
+            self.key_buffer.append(self.held_key[0])
+
+    def _bios_equipment(self, vector):
+        self.cpu.regs[AX] = self._bda16(0x10)
+
+    def _bios_memory(self, vector):
+        self.cpu.regs[AX] = self._bda16(0x13)
+
+    def _bios_system(self, vector):
+        cpu = self.cpu
+        ah = cpu.regs[AX] >> 8
+        al = cpu.regs[AX] & 0xFF
+        if ah == 0x86:
+            self.advance_time(((cpu.regs[CX] << 16) | cpu.regs[DX]) / 1_000_000)
+            self._return_flag(CF, False)
+        elif ah == 0x53:
+            if al == 0x00:
+                cpu.regs[AX] = 0x0102
+                cpu.regs[BX] = 0x504D
+                cpu.regs[CX] = 0
+            elif al == 0x07 and cpu.regs[CX] == 3:
+                self.stop("shutdown", "The guest switched itself off through APM.")
+                return False
+            self._return_flag(CF, False)
+        else:
+            cpu.set_reg8(4, 0x86)
+            self._return_flag(CF, True)
+
+    def _bios_keyboard(self, vector):
+        cpu = self.cpu
+        ah = cpu.regs[AX] >> 8
+        if not self.key_buffer and self.keys:
+            self.key_buffer.append(self.keys.popleft())
+        if ah in (0x00, 0x10):
+            if not self.key_buffer:
+                self.stop("keyboard", "The guest is waiting for a key press.")
+                return False
+            cpu.regs[AX] = self._key_word(self.key_buffer.popleft(), ah == 0x10)
+        elif ah in (0x01, 0x11):
+            if self.key_buffer:
+                cpu.regs[AX] = self._key_word(self.key_buffer[0], ah == 0x11)
+            self._return_flag(ZF, not self.key_buffer)
+        elif ah in (0x02, 0x12):
+            cpu.regs[AX] = cpu.regs[AX] & 0xFF00
+        elif ah == 0x05:
+            self.key_buffer.append((cpu.regs[CX] >> 8, cpu.regs[CX] & 0xFF))
+            cpu.regs[AX] = cpu.regs[AX] & 0xFF00
+        return True
+
+    @staticmethod
+    def _key_word(key, enhanced):
+        scancode, ascii_code = key
+        if ascii_code == 0xE0 and not enhanced:
+            ascii_code = 0
+        return (scancode << 8) | ascii_code
+
+    def _bios_clock(self, vector):
+        cpu = self.cpu
+        ah = cpu.regs[AX] >> 8
+        ticks = self._bda16(0x6C) | (self._bda16(0x6E) << 16)
+        if ah == 0x00:
+            cpu.regs[CX] = ticks >> 16
+            cpu.regs[DX] = ticks & 0xFFFF
+            cpu.set_reg8(AX, self._bda8(0x70))
+            self._write_bda8(0x70, 0)
+        elif ah == 0x01:
+            self._write_bda16(0x6C, cpu.regs[DX])
+            self._write_bda16(0x6E, cpu.regs[CX])
+        elif ah == 0x02:
+            seconds = int(ticks * TICK_SECONDS)
+            bcd = lambda value: ((value // 10) << 4) | (value % 10)
+            cpu.regs[CX] = (bcd(seconds // 3600 % 24) << 8) | bcd(seconds // 60 % 60)
+            cpu.regs[DX] = bcd(seconds % 60) << 8
+            self._return_flag(CF, False)
+        elif ah == 0x04:
+            # The same date QEMU runs are given by screenshot tests.
+            cpu.regs[CX] = 0x2000
+            cpu.regs[DX] = 0x0101
+            self._return_flag(CF, False)
+        return True
+
+    def _bios_disk(self, vector):
+        cpu = self.cpu
+        ah = cpu.regs[AX] >> 8
+        drive = cpu.regs[DX] & 0xFF
+        status = 0
+        if self.floppy is None or drive != 0:
+            status = 0x80 if ah not in (0x00,) else 0
+        elif ah in (0x02, 0x03):
+            count = cpu.regs[AX] & 0xFF
+            cylinder = (cpu.regs[CX] >> 8) | ((cpu.regs[CX] & 0xC0) << 2)
+            sector = cpu.regs[CX] & 0x3F
+            head = cpu.regs[DX] >> 8
+            cylinders, heads, sectors = self.geometry
+            if not sector or sector > sectors or head >= heads or cylinder >= cylinders:
+                status = 0x04
+            else:
+                start = ((cylinder * heads + head) * sectors + sector - 1) * 512
+                size = count * 512
+                segment, offset = cpu.sregs[ES], cpu.regs[BX]
+                if ah == 0x02:
+                    data = bytes(self.floppy[start:start + size]).ljust(size, b"\0")
+                    for index, byte in enumerate(data):
+                        cpu.write8(segment, offset + index, byte)
+                else:
+                    self.floppy[start:start + size] = bytes(
+                        cpu.read8(segment, offset + index) for index in range(size)
+                    )
+                cpu.regs[AX] = count
+        elif ah == 0x08:
+            cylinders, heads, sectors = self.geometry
+            cpu.regs[BX] = (cpu.regs[BX] & 0xFF00) | 0x04
+            cpu.regs[CX] = (((cylinders - 1) & 0xFF) << 8) | (((cylinders - 1) >> 2) & 0xC0) | sectors
+            cpu.regs[DX] = ((heads - 1) << 8) | 1
+            cpu.regs[AX] = 0
+        elif ah == 0x15:
+            cpu.set_reg8(4, 0x01)
+            self._return_flag(CF, False)
+            return True
+        elif ah != 0x00:
+            status = 0x01
+        cpu.set_reg8(4, status)
+        self._return_flag(CF, bool(status))
+        return True
+
+    # Video
+
+    @property
+    def video_mode(self):
+        return self._bda8(0x49)
+
+    def columns(self):
+        return 40 if self.video_mode == GRAPHICS_MODE else TEXT_MODES.get(self.video_mode, 80)
+
+    def set_video_mode(self, mode, clear=True):
+        memory = self.cpu.memory
+        self._write_bda8(0x49, mode)
+        self._write_bda16(0x4A, 40 if mode == GRAPHICS_MODE else TEXT_MODES.get(mode, 80))
+        self._write_bda8(0x84, 24)
+        self._write_bda8(0x62, 0)
+        for page in range(8):
+            self._write_bda16(0x50 + page * 2, 0)
+        self.palette = default_palette()
+        if not clear:
+            return
+        if mode == GRAPHICS_MODE:
+            memory[0xA0000:0xB0000] = bytes(0x10000)
+        elif mode in TEXT_MODES:
+            memory[0xB8000:0xC0000] = b"\x20\x07" * 0x4000
+
+    def cursor(self, page=None):
+        page = self._bda8(0x62) if page is None else page & 7
+        position = self._bda16(0x50 + page * 2)
+        return position >> 8, position & 0xFF
+
+    def set_cursor(self, row, column, page=None):
+        page = self._bda8(0x62) if page is None else page & 7
+        self._write_bda16(0x50 + page * 2, ((row & 0xFF) << 8) | (column & 0xFF))
+
+    def _text_address(self, row, column, page=0):
+        return 0xB8000 + page * 0x1000 + (row * self.columns() + column) * 2
+
+    def put_char(self, row, column, character, colour=None, page=0):
+        """Write one character cell; colour is the text attribute, or the pixel colour in mode 13h."""
+        memory = self.cpu.memory
+        if self.video_mode == GRAPHICS_MODE:
+            glyph = FONT_8X8[(character - 0x20) * 8:(character - 0x1F) * 8] if 0x20 <= character < 0x7F else bytes(8)
+            colour = 0x0F if colour is None else colour
+            base = 0xA0000 + row * 8 * 320 + column * 8
+            for line, bits in enumerate(glyph):
+                start = base + line * 320
+                memory[start:start + 8] = bytes(colour if bits & (0x80 >> bit) else 0 for bit in range(8))
+        elif self.video_mode in TEXT_MODES:
+            address = self._text_address(row, column, page)
+            memory[address] = character & 0xFF
+            if colour is not None:
+                memory[address + 1] = colour & 0xFF
+
+    def scroll(self, lines, attribute, top, left, bottom, right, up=True):
+        """Scroll a window of character cells; lines 0 clears it."""
+        memory = self.cpu.memory
+        bottom = min(bottom, 24)
+        right = min(right, self.columns() - 1)
+        if top > bottom or left > right:
+            return
+        height = bottom - top + 1
+        if not lines or lines > height:
+            lines = height
+        graphics = self.video_mode == GRAPHICS_MODE
+        rows = range(top, bottom + 1) if up else range(bottom, top - 1, -1)
+        for row in rows:
+            source = row + lines if up else row - lines
+            inside = top <= source <= bottom
+            if graphics:
+                for line in range(8):
+                    start = 0xA0000 + (row * 8 + line) * 320 + left * 8
+                    width = (right - left + 1) * 8
+                    if inside:
+                        origin = 0xA0000 + (source * 8 + line) * 320 + left * 8
+                        memory[start:start + width] = memory[origin:origin + width]
+                    else:
+                        memory[start:start + width] = bytes((attribute,)) * width
+            else:
+                start = self._text_address(row, left)
+                width = (right - left + 1) * 2
+                if inside:
+                    origin = self._text_address(source, left)
+                    memory[start:start + width] = memory[origin:origin + width]
+                else:
+                    memory[start:start + width] = bytes((0x20, attribute)) * (width // 2)
+
+    def teletype_char(self, character, colour=None):
+        self.teletype.append(chr(character))
+        row, column = self.cursor()
+        columns = self.columns()
+        if character == 0x0D:
+            column = 0
+        elif character == 0x0A:
+            row += 1
+        elif character == 0x08:
+            column = max(0, column - 1)
+        elif character != 0x07:
+            self.put_char(row, column, character, colour if self.video_mode == GRAPHICS_MODE else None)
+            column += 1
+            if column >= columns:
+                column = 0
+                row += 1
+        if row > 24:
+            self.scroll(1, 0 if self.video_mode == GRAPHICS_MODE else 0x07, 0, 0, 24, columns - 1)
+            row = 24
+        self.set_cursor(row, column)
+
+    def set_pixel(self, x, y, colour):
+        if self.video_mode == GRAPHICS_MODE and 0 <= x < 320 and 0 <= y < 200:
+            address = 0xA0000 + y * 320 + x
+            if colour & 0x80:
+                self.cpu.memory[address] ^= colour & 0x7F
+            else:
+                self.cpu.memory[address] = colour & 0xFF
+
+    def _bios_video(self, vector):
+        cpu = self.cpu
+        regs = cpu.regs
+        ah = regs[AX] >> 8
+        al = regs[AX] & 0xFF
+        bh = regs[BX] >> 8
+        bl = regs[BX] & 0xFF
+        if ah == 0x00:
+            self.set_video_mode(al & 0x7F, clear=not al & 0x80)
+        elif ah == 0x01:
+            self._write_bda16(0x60, regs[CX])
+        elif ah == 0x02:
+            self.set_cursor(regs[DX] >> 8, regs[DX] & 0xFF, bh)
+        elif ah == 0x03:
+            row, column = self.cursor(bh)
+            regs[DX] = (row << 8) | column
+            regs[CX] = self._bda16(0x60)
+        elif ah == 0x05:
+            self._write_bda8(0x62, al & 7)
+        elif ah in (0x06, 0x07):
+            self.scroll(al, bh, regs[CX] >> 8, regs[CX] & 0xFF, regs[DX] >> 8, regs[DX] & 0xFF, up=ah == 0x06)
+        elif ah == 0x08:
+            row, column = self.cursor(bh)
+            if self.video_mode in TEXT_MODES:
+                address = self._text_address(row, column, bh & 7)
+                regs[AX] = (cpu.memory[address + 1] << 8) | cpu.memory[address]
+            else:
+                regs[AX] = 0
+        elif ah in (0x09, 0x0A):
+            row, column = self.cursor(bh)
+            for index in range(regs[CX]):
+                cell_row, cell_column = divmod(column + index, self.columns())
+                if row + cell_row > 24:
+                    break
+                colour = bl if ah == 0x09 or self.video_mode == GRAPHICS_MODE else None
+                self.put_char(row + cell_row, cell_column, al, colour, bh & 7)
+        elif ah == 0x0C:
+            self.set_pixel(regs[CX], regs[DX], al)
+        elif ah == 0x0D:
+            x, y = regs[CX], regs[DX]
+            value = cpu.memory[0xA0000 + y * 320 + x] if self.video_mode == GRAPHICS_MODE and x < 320 and y < 200 else 0
+            cpu.set_reg8(AX, value)
+        elif ah == 0x0E:
+            self.teletype_char(al, bl)
+        elif ah == 0x0F:
+            regs[AX] = (self.columns() << 8) | self.video_mode
+            regs[BX] = (self._bda8(0x62) << 8) | bl
+        elif ah == 0x10:
+            self._video_dac(al)
+        elif ah == 0x12 and bl == 0x10:
+            regs[BX] = 0x0003
+        elif ah == 0x13:
+            self._write_string(al, bh, bl)
+        elif ah == 0x1A and al == 0x00:
+            regs[AX] = (regs[AX] & 0xFF00) | 0x1A
+            regs[BX] = 0x0008
+        return True
+
+    def _video_dac(self, function):
+        cpu = self.cpu
+        regs = cpu.regs
+        if function == 0x10:
+            self.palette[regs[BX] & 0xFF] = (regs[DX] >> 8 & 0x3F, regs[CX] >> 8 & 0x3F, regs[CX] & 0x3F)
+        elif function == 0x12:
+            for index in range(regs[CX]):
+                offset = regs[DX] + index * 3
+                colour = tuple(cpu.read8(cpu.sregs[ES], offset + part) & 0x3F for part in range(3))
+                self.palette[(regs[BX] + index) & 0xFF] = colour
+        elif function == 0x15:
+            red, green, blue = self.palette[regs[BX] & 0xFF]
+            regs[DX] = (regs[DX] & 0x00FF) | (red << 8)
+            regs[CX] = (green << 8) | blue
+        elif function == 0x17:
+            for index in range(regs[CX]):
+                for part, value in enumerate(self.palette[(regs[BX] + index) & 0xFF]):
+                    cpu.write8(cpu.sregs[ES], regs[DX] + index * 3 + part, value)
+
+    def _write_string(self, mode, page, attribute):
+        cpu = self.cpu
+        regs = cpu.regs
+        saved = self.cursor(page)
+        self.set_cursor(regs[DX] >> 8, regs[DX] & 0xFF, page)
+        offset = regs[BP]
+        for _ in range(regs[CX]):
+            character = cpu.read8(cpu.sregs[ES], offset)
+            offset += 1
+            if mode & 2:
+                attribute = cpu.read8(cpu.sregs[ES], offset)
+                offset += 1
+            if character in (0x07, 0x08, 0x0A, 0x0D):
+                self.teletype_char(character)
+                continue
+            row, column = self.cursor(page)
+            self.put_char(row, column, character, attribute, page)
+            self.teletype.append(chr(character))
+            column += 1
+            if column >= self.columns():
+                column = 0
+                row = min(row + 1, 24)
+            self.set_cursor(row, column, page)
+        if not mode & 1:
+            self.set_cursor(*saved, page=page)
+
+    # Results
+
+    def text_lines(self, page=0):
+        """The text-mode screen as strings, without trailing spaces."""
+        columns = self.columns()
+        base = 0xB8000 + page * 0x1000
+        memory = self.cpu.memory
+        return [
+            bytes(memory[base + (row * columns + column) * 2] for column in range(columns))
+            .decode("cp437").rstrip()
+            for row in range(25)
+        ]
+
+    def teletype_text(self):
+        return "".join(self.teletype)
+
+    def screen_image(self, scale=1):
+        """The mode 13h screen as an RGBImage; scale 2 matches QEMU's 640x400 screendumps."""
+        if self.video_mode != GRAPHICS_MODE:
+            raise ValueError(f"Video mode {self.video_mode:#04x} has no pixel framebuffer here; use text_lines.")
+        colours = [bytes(component << 2 | (component & 1) * 3 for component in colour) for colour in self.palette]
+        frame = self.cpu.memory[0xA0000:0xA0000 + 64000]
+        rows = []
+        for y in range(200):
+            line = b"".join(colours[index] * scale for index in frame[y * 320:(y + 1) * 320])
+            rows.extend([line] * scale)
+        return RGBImage(320 * scale, 200 * scale, b"".join(rows))
+
+
+def assemble(source, nasm_path, origin=0x1000):
+    """Assemble NASM source as a flat binary at origin and return its bytes; raises ValueError."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "snippet.asm")
+        output_path = os.path.join(work_dir, "snippet.bin")
+        with open(source_path, "w", encoding="utf-8") as handle:
+            handle.write(f"[bits 16]\n[org {origin:#x}]\n{source}\n")
+        result = subprocess.run(
+            [nasm_path, "-f", "bin", source_path, "-o", output_path],
+            shell=False, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise ValueError(result.stderr.strip() or "NASM failed.")
+        with open(output_path, "rb") as handle:
+            return handle.read()
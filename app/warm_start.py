@@ -0,0 +1,239 @@
+"""Resume QEMU from a VM state saved right after BIOS POST instead of cold-booting.
+
+The snapshot boots a read-only parking floppy whose boot sector moves itself to
+0x0600, marks 0x04F0 with "WC" and waits for a key. When boot.img is the first
+hard disk, it is attached through a qcow2 overlay that also holds the saved
+state, so every restore reads the current boot.img through it. When it is the
+floppy, the state lives on a small qcow2 disk of its own and a restore swaps
+boot.img into drive A over QMP. Sending a key makes the parked code load sector
+0 of the boot drive to 0x7c00 and jump to it with DL set to that drive, exactly
+as the BIOS would on a cold boot.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+from .boot_image import FLOPPY_SIZE
+from .qmp import QMPClient, QMPError, free_port, qmp_argument
+
+SNAPSHOT_NAME = "oc-warm"
+PARKING_DRIVE_ID = "parking"
+# Listener ports change on every run but never the devices a snapshot holds.
+_PORT_RE = re.compile(r"(port=|:)\d+(?=,|$)")
+PARKING_MARKER = (0x57, 0x43)
+
+# 16-bit boot sector, hand-assembled; offsets are from 0x7c00.
+PARKING_CODE = bytes([
+    0xFA,                                # 00 cli
+    0x31, 0xC0,                          # 01 xor ax, ax
+    0x8E, 0xD8,                          # 03 mov ds, ax
+    0x8E, 0xC0,                          # 05 mov es, ax
+    0x8E, 0xD0,                          # 07 mov ss, ax
+    0xBC, 0x00, 0x7C,                    # 09 mov sp, 0x7c00
+    0xFB,                                # 0C sti
+    0xFC,                                # 0D cld
+    0xBE, 0x00, 0x7C,                    # 0E mov si, 0x7c00
+    0xBF, 0x00, 0x06,                    # 11 mov di, 0x0600
+    0xB9, 0x00, 0x01,                    # 14 mov cx, 256
+    0xF3, 0xA5,                          # 17 rep movsw
+    0xEA, 0x1E, 0x06, 0x00, 0x00,        # 19 jmp 0:0x061e (park)
+    0xC7, 0x06, 0xF0, 0x04, 0x57, 0x43,  # 1E park: mov word [0x4f0], "WC"
+    0x30, 0xE4,                          # 24 xor ah, ah
+    0xCD, 0x16,                          # 26 int 0x16
+    0xBE, 0x05, 0x00,                    # 28 mov si, 5
+    0xB8, 0x01, 0x02,                    # 2B read: mov ax, 0x0201
+    0xBB, 0x00, 0x7C,                    # 2E mov bx, 0x7c00
+    0xB9, 0x01, 0x00,                    # 31 mov cx, 1
+    0xBA, 0x00, 0x00,                    # 34 mov dx, drive
+    0xCD, 0x13,                          # 37 int 0x13
+    0x73, 0x0A,                          # 39 jnc go
+    0x31, 0xC0,                          # 3B xor ax, ax
+    0xCD, 0x13,                          # 3D int 0x13 (clears the disk-changed error)
+    0x4E,                                # 3F dec si
+    0x75, 0xE9,                          # 40 jnz read
+    0xF4,                                # 42 halt: hlt
+    0xEB, 0xFD,                          # 43 jmp halt
+    0xC7, 0x06, 0xF0, 0x04, 0x00, 0x00,  # 45 go: mov word [0x4f0], 0
+    0xB2, 0x00,                          # 4B mov dl, drive
+    0xEA, 0x00, 0x7C, 0x00, 0x00,        # 4D jmp 0:0x7c00
+])
+
+
+def parking_code(drive_number):
+    """PARKING_CODE that boots BIOS drive drive_number (0 for A, 0x80 for the first hard disk)."""
+    code = bytearray(PARKING_CODE)
+    code[0x35] = drive_number
+    code[0x4C] = drive_number
+    return bytes(code)
+
+
+def parking_boot_sector(drive_number=0):
+    return parking_code(drive_number).ljust(510, b"\0") + b"\x55\xaa"
+
+
+class WarmStart:
+    def __init__(self, qemu_path, project_dir, drive_id, boot_drive="disk"):
+        self.qemu_path = qemu_path
+        self.drive_id = drive_id
+        self.floppy = boot_drive == "floppy"
+        self.drive_number = 0x00 if self.floppy else 0x80
+        self.image_path = os.path.abspath(os.path.join(project_dir, "build", "boot.img"))
+        self.warm_dir = os.path.abspath(os.path.join(project_dir, "build", ".warm"))
+        self.parking_path = os.path.join(self.warm_dir, "parking.img")
+        name = "state.qcow2" if self.floppy else "boot-overlay.qcow2"
+        self.state_path = os.path.join(self.warm_dir, name)
+        self.manifest_path = os.path.join(self.warm_dir, "warm.json")
+
+    def qemu_img_path(self):
+        name = "qemu-img.exe" if sys.platform == "win32" else "qemu-img"
+        sibling = os.path.join(os.path.dirname(self.qemu_path), name)
+        if os.path.isfile(sibling):
+            return sibling
+        return shutil.which("qemu-img")
+
+    def drive_args(self):
+        if self.floppy:
+            return [
+                "-drive", f"id={self.drive_id},if=floppy,index=0,format=raw,readonly=on,"
+                          f"file={self.parking_path}",
+                "-drive", f"id=warmstate,if=none,format=qcow2,file={self.state_path}",
+                "-boot", "order=a",
+            ]
+        return [
+            "-drive", f"id={PARKING_DRIVE_ID},if=floppy,index=0,format=raw,readonly=on,"
+                      f"file={self.parking_path}",
+            "-drive", f"id={self.drive_id},if=ide,index=0,format=qcow2,file={self.state_path}",
+            "-boot", "order=a",
+        ]
+
+    def signature(self, machine_args, extra_args=()):
+        """Identify everything a saved state depends on; any change forces a new snapshot.
+
+        -loadvm needs the same devices the state was saved with, so the extra
+        run arguments (debug console, gdb stub) are part of it too.
+        """
+        try:
+            stat = os.stat(self.qemu_path)
+            qemu = [self.qemu_path, stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            qemu = [self.qemu_path]
+        return {
+            "qemu": qemu,
+            "machine": list(machine_args),
+            "extra": [_PORT_RE.sub(r"\g<1>*", str(arg)) for arg in extra_args],
+            "boot_drive": "floppy" if self.floppy else "disk",
+            "drives": self.drive_args(),
+            "image": self.image_path,
+            "parking": hashlib.sha256(parking_code(self.drive_number)).hexdigest(),
+        }
+
+    def is_ready(self, machine_args, extra_args=()):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            return False
+        return manifest == self.signature(machine_args, extra_args) and os.path.isfile(self.state_path)
+
+    def invalidate(self):
+        if os.path.isfile(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def prepare(self, machine_args, timeout=20.0, extra_args=()):
+        """Boot the parking floppy headless with extra_args and save its state; raises QMPError or OSError."""
+        qemu_img = self.qemu_img_path()
+        if not qemu_img:
+            raise OSError("qemu-img was not found next to QEMU or on PATH")
+        os.makedirs(self.warm_dir, exist_ok=True)
+        self.invalidate()
+        with open(self.parking_path, "wb") as handle:
+            handle.write(parking_boot_sector(self.drive_number))
+            handle.truncate(FLOPPY_SIZE)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        if self.floppy:
+            create = [qemu_img, "create", "-f", "qcow2", self.state_path, "1M"]
+        else:
+            create = [qemu_img, "create", "-f", "qcow2", "-F", "raw", "-b", self.image_path, self.state_path]
+        created = subprocess.run(
+            create,
+            shell=False, capture_output=True, text=True,
+        )
+        if created.returncode != 0:
+            raise OSError(created.stderr.strip() or "qemu-img could not create the state disk.")
+
+        port = free_port()
+        proc = subprocess.Popen(
+            [*machine_args, *self.drive_args(), "-display", "none", "-qmp", qmp_argument(port),
+             *extra_args],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        qmp = QMPClient(port)
+        try:
+            try:
+                qmp.connect(timeout=timeout, proc=proc)
+            except QMPError as error:
+                if proc.poll() is not None and proc.stderr is not None:
+                    raise QMPError(proc.stderr.read().decode(errors="replace").strip() or str(error))
+                raise
+            deadline = time.monotonic() + timeout
+            while not self._parked(qmp):
+                if time.monotonic() >= deadline:
+                    raise QMPError("The parking boot sector did not start; POST may have failed.")
+                time.sleep(0.05)
+            qmp.command("stop")
+            error = qmp.human(f"savevm {SNAPSHOT_NAME}").strip()
+            if error:
+                raise QMPError(error)
+            qmp.command("quit")
+        finally:
+            qmp.close()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            if proc.stderr is not None:
+                proc.stderr.close()
+        with open(self.manifest_path, "w", encoding="utf-8") as handle:
+            json.dump(self.signature(machine_args, extra_args), handle, indent=1)
+
+    @staticmethod
+    def _parked(qmp):
+        output = qmp.human("xp /2bx 0x4f0").lower()
+        expected = " ".join(f"0x{byte:02x}" for byte in PARKING_MARKER)
+        return expected in output
+
+    def launch(self, machine_args, qmp_port, timeout=10.0, spawn=subprocess.Popen):
+        """Start QEMU from the saved state, insert boot.img if it is the floppy and
+        release the parked boot sector.
+
+        spawn starts the process from its command line. Returns the process
+        and its connected QMPClient.
+        """
+        proc = spawn(
+            [*machine_args, *self.drive_args(), "-loadvm", SNAPSHOT_NAME,
+             "-qmp", qmp_argument(qmp_port)]
+        )
+        qmp = QMPClient(qmp_port)
+        try:
+            qmp.connect(timeout=timeout, proc=proc)
+            if self.floppy:
+                qmp.command(
+                    "blockdev-change-medium", device=self.drive_id, filename=self.image_path,
+                    format="raw", **{"read-only-mode": "read-write"},
+                )
+            qmp.command("send-key", keys=[{"type": "qcode", "data": "ret"}])
+        except QMPError:
+            qmp.close()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            raise
+        return proc, qmp
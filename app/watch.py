@@ -0,0 +1,54 @@
+"""Polling project watcher shared by the IDE toggle and the headless watch command."""
+
+import os
+import time
+
+
+class ProjectWatcher:
+    """Report project file changes once a burst of saves has settled."""
+
+    IGNORED_DIRS = {"build", ".git", "__pycache__"}
+
+    def __init__(self, project_dir, debounce=0.75):
+        self.project_dir = os.path.abspath(project_dir)
+        self.debounce = debounce
+        self.pending = set()
+        self.last_change = None
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        state = {}
+        for root, dirs, files in os.walk(self.project_dir):
+            dirs[:] = [name for name in dirs if name not in self.IGNORED_DIRS]
+            for file in files:
+                path = os.path.normpath(os.path.join(root, file))
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def poll(self, now=None):
+        """Return the changed paths after debounce seconds of quiet, else an empty list."""
+        now = time.monotonic() if now is None else now
+        current = self.snapshot()
+        changed = {
+            path for path in current.keys() | self.state.keys()
+            if current.get(path) != self.state.get(path)
+        }
+        self.state = current
+        if changed:
+            self.pending |= changed
+            self.last_change = now
+            return []
+        if self.pending and now - self.last_change >= self.debounce:
+            settled = sorted(self.pending)
+            self.pending = set()
+            return settled
+        return []
+
+
+def affects_build(changed, build_inputs):
+    """True when a change touches a file the boot image is built from."""
+    return any(path in build_inputs for path in changed)
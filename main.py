@@ -2,14 +2,8 @@ import ctypes
 import os
 import sys
 
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QApplication
-
+from app import cli
 from app.compiler import Compiler
-from app.editor import IDEWindow
-from app.launcher import Launcher
-from app.theme import apply_application_palette, build_app_stylesheet
 
 def get_icon_path():
     icon_names = ("icon-blue.png", "icon.png")
@@ -32,7 +26,24 @@ def get_icon_path():
 
     return None
 
-def main():
+def get_root_dir():
+    if hasattr(sys, 'frozen'):
+        if hasattr(sys, '_MEIPASS') and sys._MEIPASS not in sys.path:
+            sys.path.insert(0, sys._MEIPASS)
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def run_ide():
+    # Qt is imported here so headless commands never pay for it.
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QIcon
+    from PyQt6.QtWidgets import QApplication
+
+    from app.editor import IDEWindow
+    from app.launcher import Launcher
+    from app.theme import apply_application_palette, build_app_stylesheet
+
     if sys.platform == 'win32':
         sys.argv += ['-platform', 'windows:darkmode=2']
 
@@ -53,14 +64,7 @@ def main():
     if icon_path:
         app.setWindowIcon(QIcon(icon_path))
 
-    if hasattr(sys, 'frozen'):
-        root_dir = os.path.dirname(sys.executable)
-        if hasattr(sys, '_MEIPASS') and sys._MEIPASS not in sys.path:
-            sys.path.insert(0, sys._MEIPASS)
-    else:
-        root_dir = os.path.dirname(os.path.abspath(__file__))
-
-    compiler = Compiler(root_dir)
+    compiler = Compiler(get_root_dir())
 
     ide = IDEWindow(compiler)
     launcher = Launcher(ide)
@@ -70,5 +74,11 @@ def main():
     sys.exit(app.exec())
 
 
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS:
+        sys.exit(cli.run(sys.argv[1:], get_root_dir()))
+    run_ide()
+
+
 if __name__ == "__main__":
     main()
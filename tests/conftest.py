@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The repository root holds the app package; make it importable however pytest is started.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qt_app():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
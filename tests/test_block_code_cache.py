@@ -0,0 +1,132 @@
+"""Cached block rendering against a cold re-render after random canvas edits."""
+
+import glob
+import os
+import random
+
+import pytest
+from PyQt6.QtWidgets import QCheckBox, QComboBox, QSpinBox
+
+from app.block import BlockCanvas, VisualBlock, load_block_definitions
+
+BLOCKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "blocks")
+VARIABLE_NAMES = ("score", "lives", "title", "buffer")
+VARIABLE_TYPES = ("byte", "word", "text")
+# Blocks whose output depends on the type of a variable named in their inputs.
+TYPED_BLOCKS = (
+    ("Move Register", {"DESTINATION": "%var[score]", "SOURCE": "%var[lives]"}),
+    ("Print to Screen (Text)", {"TEXT": "%var[score]"}),
+    ("Print to Screen (Graphics)", {"TEXT": "%var[title]"}),
+)
+VALUES = ("%var[score]", "%var[lives]", "%var[title]", "%var[buffer]", "%var[missing]",
+          "7", "0x20", "[bx]", "ax", "label_a", "Hello")
+
+
+def catalog():
+    definitions, _ = load_block_definitions(sorted(glob.glob(os.path.join(BLOCKS_DIR, "*.json"))))
+    return definitions
+
+
+def cold_code(canvas):
+    for item in canvas.items():
+        if isinstance(item, VisualBlock):
+            item._code_cache = None
+    return canvas.generate_code(), list(canvas.node_spans)
+
+
+class Session:
+    def __init__(self, rng, definitions):
+        self.rng = rng
+        self.definitions = definitions
+        self.variables = [{"name": name, "type": rng.choice(VARIABLE_TYPES)} for name in VARIABLE_NAMES]
+        self.canvas = BlockCanvas()
+        self.canvas.variable_provider = lambda: [dict(item) for item in self.variables]
+
+    def blocks(self):
+        return [item for item in self.canvas.items() if isinstance(item, VisualBlock)]
+
+    def add_block(self, definition=None):
+        definition = definition or self.rng.choice(self.definitions)
+        return self.canvas.add_new_block(
+            VisualBlock.from_definition(definition), (self.rng.randint(-900, 900), 0))
+
+    def add_typed_chain(self):
+        by_name = {definition["name"]: definition for definition in self.definitions}
+        previous = self.canvas.start_block
+        for name, inputs in TYPED_BLOCKS:
+            block = self.add_block(by_name[name])
+            for key, value in inputs.items():
+                block.set_input_value(key, value)
+            self.canvas.connect_sockets(previous.output_socket, block.input_socket)
+            previous = block
+
+    def change_input(self):
+        candidates = [block for block in self.blocks() if block.input_widgets and not block.is_start]
+        if not candidates:
+            return
+        block = self.rng.choice(candidates)
+        name = self.rng.choice(list(block.input_widgets))
+        widget = block.input_widgets[name]
+        if isinstance(widget, QSpinBox):
+            value = self.rng.randint(widget.minimum(), min(widget.maximum(), 500))
+        elif isinstance(widget, QCheckBox):
+            value = self.rng.choice(("0", "1"))
+        elif isinstance(widget, QComboBox) and widget.count() and self.rng.random() < 0.5:
+            value = widget.itemText(self.rng.randrange(widget.count()))
+        else:
+            value = self.rng.choice(VALUES)
+        block.set_input_value(name, value)
+
+    def change_variable_type(self):
+        variable = self.rng.choice(self.variables)
+        variable["type"] = self.rng.choice([kind for kind in VARIABLE_TYPES if kind != variable["type"]])
+
+    def rename_variable(self):
+        variable = self.rng.choice(self.variables)
+        variable["name"] = self.rng.choice(VARIABLE_NAMES + ("missing",))
+
+    def connect(self):
+        outputs = [block.output_socket for block in self.blocks() if block.output_socket]
+        inputs = [block.input_socket for block in self.blocks() if block.input_socket]
+        if outputs and inputs:
+            self.canvas.connect_sockets(self.rng.choice(outputs), self.rng.choice(inputs))
+
+    def disconnect(self):
+        edges = {edge for block in self.blocks() if block.output_socket for edge in block.output_socket.edges}
+        if edges:
+            self.canvas.remove_connection(self.rng.choice(sorted(edges, key=id)), notify=True)
+
+    def remove(self):
+        candidates = [block for block in self.blocks() if not block.is_start]
+        if candidates:
+            self.canvas.remove_node(self.rng.choice(candidates))
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_cached_code_matches_cold_render_after_random_edits(qt_app, seed):
+    rng = random.Random(seed)
+    definitions = catalog()
+    entry = next(definition for definition in definitions if definition.get("flow_input") is False)
+    session = Session(rng, definitions)
+    session.add_typed_chain()
+    for _ in range(6):
+        session.add_block()
+    session.canvas.add_new_block(VisualBlock.from_definition(entry), (0, 400))
+    edits = (
+        (session.add_block, 2),
+        (session.change_input, 6),
+        (session.change_variable_type, 4),
+        (session.rename_variable, 1),
+        (session.connect, 5),
+        (session.disconnect, 2),
+        (session.remove, 1),
+    )
+    actions = [action for action, weight in edits for _ in range(weight)]
+    canvas = session.canvas
+    canvas.generate_code()
+    for step in range(150):
+        action = rng.choice(actions)
+        action()
+        cached = canvas.generate_code(), list(canvas.node_spans)
+        assert canvas.entry_blocks == {block for block in session.blocks() if block.is_entry}
+        assert cached == cold_code(canvas), f"seed {seed}, step {step}: {action.__name__}"
@@ -0,0 +1,142 @@
+"""Compiled block templates against the original replace-then-normalize renderer."""
+
+import glob
+import os
+import re
+
+import pytest
+
+from app.block import BlockCanvas, VisualBlock, load_block_definitions
+
+BLOCKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "blocks")
+VARIABLES = [
+    {"name": "score", "type": "word"},
+    {"name": "lives", "type": "byte"},
+    {"name": "title", "type": "text"},
+]
+VALUE_SETS = [None, "%var[score]", "%var[lives]", "%var[title]", "7", "[bx]", "it's"]
+
+
+def catalog():
+    definitions, _ = load_block_definitions(sorted(glob.glob(os.path.join(BLOCKS_DIR, "*.json"))))
+    return definitions
+
+
+def legacy_render(block, template):
+    """render_template as it was before templates were compiled."""
+    code = str(template)
+    for key, value in block.input_values().items():
+        code = code.replace(f"{{{key}}}", block.render_input_value(key, value))
+    return legacy_normalize(block, code)
+
+
+def legacy_normalize(block, code):
+    output = []
+    explicit_memory = re.compile(
+        r"^(\s*)(mov|add|sub|cmp|and|or|xor|test)\s+(byte|word)\s+"
+        r"(\[[^,]+\])\s*,\s*(\[[^\]]+\])(\s*;.*)?$",
+        re.IGNORECASE,
+    )
+    implicit_move = re.compile(
+        r"^(\s*)mov\s+(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\]"
+        r"(\s*;.*)?$",
+        re.IGNORECASE,
+    )
+    variable_shift = re.compile(
+        r"^(\s*)(shl|shr|sal|sar|rol|ror)\s+(byte|word)\s+"
+        r"(\[[^,]+\])\s*,\s*\[([A-Za-z_][\w.$@?]*)\](\s*;.*)?$",
+        re.IGNORECASE,
+    )
+    for line in str(code).splitlines():
+        match = explicit_memory.match(line)
+        if match:
+            indent, opcode, size, destination, source, comment = match.groups()
+            register = "al" if size.lower() == "byte" else "ax"
+            output.extend((
+                f"{indent}push ax",
+                f"{indent}mov {register}, {source}",
+                f"{indent}{opcode} {size} {destination}, {register}{comment or ''}",
+                f"{indent}pop ax",
+            ))
+            continue
+        match = implicit_move.match(line)
+        if match:
+            indent, destination, source_name, comment = match.groups()
+            source_type = block.variable_info(source_name).get("type", "byte")
+            size = "word" if source_type == "word" else "byte"
+            register = "ax" if size == "word" else "al"
+            output.extend((
+                f"{indent}push ax",
+                f"{indent}mov {register}, [{source_name}]",
+                f"{indent}mov {size} {destination}, {register}{comment or ''}",
+                f"{indent}pop ax",
+            ))
+            continue
+        match = variable_shift.match(line)
+        if match:
+            indent, opcode, size, destination, source_name, comment = match.groups()
+            output.extend((
+                f"{indent}push cx",
+                f"{indent}mov cl, [{source_name}]",
+                f"{indent}{opcode} {size} {destination}, cl{comment or ''}",
+                f"{indent}pop cx",
+            ))
+            continue
+        output.append(line)
+    return "\n".join(output)
+
+
+@pytest.fixture
+def canvas(qt_app):
+    scene = BlockCanvas()
+    scene.variable_provider = lambda: VARIABLES
+    return scene
+
+
+@pytest.mark.parametrize("definition", catalog(), ids=lambda definition: definition["name"])
+def test_compiled_templates_match_legacy_rendering(canvas, definition):
+    block = VisualBlock.from_definition(definition)
+    canvas.addItem(block)
+    templates = [block.asm_template, *block.req_funcs]
+    for value in VALUE_SETS:
+        if value is not None:
+            for name in block.input_widgets:
+                block.set_input_value(name, value)
+        for template in templates:
+            assert block.render_template(template) == legacy_render(block, template), (
+                f"{definition['name']} with inputs {block.input_values()}"
+            )
+
+
+def test_every_input_combination_of_memory_operands(canvas):
+    definition = {
+        "name": "Memory Pair",
+        "asm_code": "{OP} {SIZE} {DEST}, {SRC} ; pair\nmov {DEST}, {SRC}\nshl word {DEST}, {SRC}",
+        "inputs": [{"name": "OP"}, {"name": "SIZE"}, {"name": "DEST"}, {"name": "SRC"}],
+    }
+    block = VisualBlock.from_definition(definition)
+    canvas.addItem(block)
+    for op in ("mov", "add", "cmp", "shl"):
+        for size in ("byte", "word"):
+            for destination in ("%var[score]", "ax", "[di]"):
+                for source in ("%var[lives]", "%var[score]", "5"):
+                    for name, value in (("OP", op), ("SIZE", size), ("DEST", destination), ("SRC", source)):
+                        block.set_input_value(name, value)
+                    assert block.render_template(block.asm_template) == legacy_render(block, block.asm_template)
+
+
+def test_substituted_values_are_not_expanded_again(canvas):
+    # The legacy renderer replaced inputs one after another, so a value that
+    # contained another input's placeholder was expanded too. Compiled
+    # templates substitute once and keep such text literally.
+    definition = {
+        "name": "Cascade",
+        "asm_code": "mov ax, {A}\nmov bx, {B}",
+        "inputs": [{"name": "A"}, {"name": "B"}],
+    }
+    block = VisualBlock.from_definition(definition)
+    canvas.addItem(block)
+    block.set_input_value("A", "{B}")
+    block.set_input_value("B", "5")
+    assert block.render_template(block.asm_template) == "mov ax, {B}\nmov bx, 5"
+    assert legacy_render(block, block.asm_template) == "mov ax, 5\nmov bx, 5"
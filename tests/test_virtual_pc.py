@@ -0,0 +1,275 @@
+"""Hand-encoded 16-bit programs run through VirtualPC; no NASM or QEMU needed."""
+
+from app.cpu8086 import AF, AX, BX, CF, CX, DI, DX, OF, PF, SF, SI, ZF
+from app.virtual_pc import VirtualPC
+
+ORIGIN = 0x1000
+HALT = bytes([0xFA, 0xF4])  # cli; hlt
+
+
+def run(code, pc=None, limit=10_000):
+    pc = pc or VirtualPC()
+    pc.load_binary(bytes(code) + HALT, ORIGIN)
+    return pc, pc.run(limit)
+
+
+def flag(pc, mask):
+    return bool(pc.cpu.flags & mask)
+
+
+def test_add_overflow_sets_sign_overflow_aux_and_parity():
+    pc, reason = run([0xB8, 0xFF, 0x7F,    # mov ax, 0x7fff
+                      0x05, 0x01, 0x00])   # add ax, 1
+    assert reason == "halted"
+    assert pc.cpu.regs[AX] == 0x8000
+    assert flag(pc, OF) and flag(pc, SF) and flag(pc, AF) and flag(pc, PF)
+    assert not flag(pc, CF) and not flag(pc, ZF)
+
+
+def test_sub_borrow_sets_carry():
+    pc, _ = run([0xB0, 0x00,               # mov al, 0
+                 0x2C, 0x01])              # sub al, 1
+    assert pc.cpu.regs[AX] & 0xFF == 0xFF
+    assert flag(pc, CF) and flag(pc, SF) and flag(pc, AF)
+    assert not flag(pc, OF) and not flag(pc, ZF)
+
+
+def test_dec_overflows_and_keeps_carry():
+    pc, _ = run([0xF9,                     # stc
+                 0xB0, 0x80,               # mov al, 0x80
+                 0xFE, 0xC8])              # dec al
+    assert pc.cpu.regs[AX] & 0xFF == 0x7F
+    assert flag(pc, OF) and flag(pc, CF)
+
+
+def test_idiv_truncates_towards_zero():
+    pc, _ = run([0xB8, 0xF9, 0xFF,         # mov ax, -7
+                 0x99,                     # cwd
+                 0xBB, 0x02, 0x00,         # mov bx, 2
+                 0xF7, 0xFB])              # idiv bx
+    assert pc.cpu.regs[AX] == 0xFFFD
+    assert pc.cpu.regs[DX] == 0xFFFF
+
+
+def test_divide_by_zero_enters_vector_0():
+    pc, reason = run([0x31, 0xDB,          # xor bx, bx
+                      0xF7, 0xF3])         # div bx
+    assert reason == "error"
+    assert pc.stop_message == "Divide error at 0000:1002."
+
+
+def test_mul_sets_carry_and_overflow_for_wide_results():
+    pc, _ = run([0xB0, 0x10,               # mov al, 0x10
+                 0xB3, 0x10,               # mov bl, 0x10
+                 0xF6, 0xE3])              # mul bl
+    assert pc.cpu.regs[AX] == 0x0100
+    assert flag(pc, CF) and flag(pc, OF)
+
+
+def test_three_operand_imul():
+    pc, _ = run([0xBB, 0xFD, 0xFF,         # mov bx, -3
+                 0x69, 0xC3, 0xE8, 0x03])  # imul ax, bx, 1000
+    assert pc.cpu.regs[AX] == (-3000) & 0xFFFF
+    assert not flag(pc, CF) and not flag(pc, OF)
+
+
+def test_sar_keeps_sign_and_shifts_into_carry():
+    pc, _ = run([0xB0, 0x81,               # mov al, 0x81
+                 0xD0, 0xF8])              # sar al, 1
+    assert pc.cpu.regs[AX] & 0xFF == 0xC0
+    assert flag(pc, CF)
+
+
+def test_rcl_rotates_through_carry():
+    pc, _ = run([0xF9,                     # stc
+                 0xB0, 0x80,               # mov al, 0x80
+                 0xD0, 0xD0])              # rcl al, 1
+    assert pc.cpu.regs[AX] & 0xFF == 0x01
+    assert flag(pc, CF)
+
+
+def test_shift_by_cl():
+    pc, _ = run([0xBB, 0x34, 0x12,         # mov bx, 0x1234
+                 0xB1, 0x04,               # mov cl, 4
+                 0xD3, 0xC3])              # rol bx, cl
+    assert pc.cpu.regs[BX] == 0x2341
+
+
+def test_daa_adjusts_packed_bcd():
+    pc, _ = run([0xB0, 0x19,               # mov al, 0x19
+                 0x04, 0x28,               # add al, 0x28
+                 0x27])                    # daa
+    assert pc.cpu.regs[AX] & 0xFF == 0x47
+    assert not flag(pc, CF)
+
+
+def test_cmp_jumps_on_below():
+    pc, _ = run([0xB8, 0x01, 0x00,         # mov ax, 1
+                 0x3D, 0x02, 0x00,         # cmp ax, 2
+                 0x72, 0x03,               # jb taken
+                 0xBB, 0x01, 0x00,         # mov bx, 1
+                 0xB9, 0x07, 0x00])        # taken: mov cx, 7
+    assert pc.cpu.regs[BX] == 0
+    assert pc.cpu.regs[CX] == 7
+
+
+def test_rep_stosb_fills_and_advances():
+    pc, _ = run([0xBF, 0x00, 0x20,         # mov di, 0x2000
+                 0xB9, 0x05, 0x00,         # mov cx, 5
+                 0xB0, 0xAA,               # mov al, 0xaa
+                 0xFC,                     # cld
+                 0xF3, 0xAA])              # rep stosb
+    assert pc.cpu.memory[0x2000:0x2006] == b"\xaa" * 5 + b"\0"
+    assert pc.cpu.regs[CX] == 0
+    assert pc.cpu.regs[DI] == 0x2005
+
+
+def test_repe_cmpsb_stops_at_first_difference():
+    pc = VirtualPC()
+    pc.cpu.memory[0x3000:0x3004] = b"abXd"
+    pc.cpu.memory[0x3100:0x3104] = b"abYd"
+    pc, _ = run([0xBE, 0x00, 0x30,         # mov si, 0x3000
+                 0xBF, 0x00, 0x31,         # mov di, 0x3100
+                 0xB9, 0x04, 0x00,         # mov cx, 4
+                 0xFC,                     # cld
+                 0xF3, 0xA6], pc)          # repe cmpsb
+    assert pc.cpu.regs[CX] == 1
+    assert pc.cpu.regs[SI] == 0x3003
+    assert pc.cpu.regs[DI] == 0x3103
+    assert not flag(pc, ZF)
+
+
+def test_repne_scasb_finds_byte():
+    pc = VirtualPC()
+    pc.cpu.memory[0x3000:0x3005] = b"abcde"
+    pc, _ = run([0xBF, 0x00, 0x30,         # mov di, 0x3000
+                 0xB0, 0x63,               # mov al, 'c'
+                 0xB9, 0x0A, 0x00,         # mov cx, 10
+                 0xFC,                     # cld
+                 0xF2, 0xAE], pc)          # repne scasb
+    assert pc.cpu.regs[DI] == 0x3003
+    assert pc.cpu.regs[CX] == 7
+    assert flag(pc, ZF)
+
+
+def test_std_movsw_copies_backwards():
+    pc = VirtualPC()
+    pc.cpu.memory[0x3000:0x3004] = b"\x11\x22\x33\x44"
+    pc, _ = run([0xBE, 0x02, 0x30,         # mov si, 0x3002
+                 0xBF, 0x02, 0x31,         # mov di, 0x3102
+                 0xB9, 0x02, 0x00,         # mov cx, 2
+                 0xFD,                     # std
+                 0xF3, 0xA5], pc)          # rep movsw
+    assert pc.cpu.memory[0x3100:0x3104] == b"\x11\x22\x33\x44"
+    assert pc.cpu.regs[SI] == 0x2FFE
+
+
+def test_int10_teletype_writes_screen_and_moves_cursor():
+    pc, _ = run([0xB4, 0x0E,               # mov ah, 0x0e
+                 0xB0, 0x48,               # mov al, 'H'
+                 0xCD, 0x10,               # int 0x10
+                 0xB0, 0x69,               # mov al, 'i'
+                 0xCD, 0x10,               # int 0x10
+                 0xB0, 0x0D,               # mov al, 13
+                 0xCD, 0x10,               # int 0x10
+                 0xB0, 0x0A,               # mov al, 10
+                 0xCD, 0x10,               # int 0x10
+                 0xB4, 0x03,               # mov ah, 3
+                 0xB7, 0x00,               # mov bh, 0
+                 0xCD, 0x10])              # int 0x10
+    assert pc.teletype_text() == "Hi\r\n"
+    assert pc.text_lines()[0] == "Hi"
+    assert pc.cpu.regs[DX] == 0x0100
+
+
+def test_int10_mode13_pixels_round_trip():
+    pc, _ = run([0xB8, 0x13, 0x00,         # mov ax, 0x0013
+                 0xCD, 0x10,               # int 0x10
+                 0xB4, 0x0C,               # mov ah, 0x0c
+                 0xB0, 0x04,               # mov al, 4
+                 0xB9, 0x0A, 0x00,         # mov cx, 10
+                 0xBA, 0x14, 0x00,         # mov dx, 20
+                 0xCD, 0x10,               # int 0x10
+                 0xB4, 0x0D,               # mov ah, 0x0d
+                 0xCD, 0x10])              # int 0x10
+    assert pc.video_mode == 0x13
+    assert pc.cpu.memory[0xA0000 + 20 * 320 + 10] == 4
+    assert pc.cpu.regs[AX] & 0xFF == 4
+    assert pc.screen_image().width == 320
+
+
+def test_int16_reads_queued_key():
+    pc = VirtualPC()
+    pc.type_keys("a")
+    pc, _ = run([0xB4, 0x01,               # mov ah, 1
+                 0xCD, 0x16,               # int 0x16
+                 0x89, 0xC3,               # mov bx, ax
+                 0xB4, 0x00,               # mov ah, 0
+                 0xCD, 0x16], pc)          # int 0x16
+    assert pc.cpu.regs[BX] == 0x1E61
+    assert pc.cpu.regs[AX] == 0x1E61
+
+
+def test_int16_status_sets_zf_without_keys():
+    pc, _ = run([0xB4, 0x01,               # mov ah, 1
+                 0xCD, 0x16])              # int 0x16
+    assert flag(pc, ZF)
+
+
+def test_int16_wait_stops_for_keyboard_and_resumes():
+    pc = VirtualPC()
+    pc.load_binary(bytes([0xB4, 0x00, 0xCD, 0x16]) + HALT, ORIGIN)
+    assert pc.run(10_000) == "keyboard"
+    pc.type_keys("{enter}")
+    assert pc.run(10_000) == "halted"
+    assert pc.cpu.regs[AX] == 0x1C0D
+
+
+def test_int1a_sets_and_reads_tick_count():
+    pc, _ = run([0xB4, 0x01,               # mov ah, 1
+                 0xB9, 0x01, 0x00,         # mov cx, 1
+                 0xBA, 0x02, 0x00,         # mov dx, 2
+                 0xCD, 0x1A,               # int 0x1a
+                 0x31, 0xC9,               # xor cx, cx
+                 0x31, 0xD2,               # xor dx, dx
+                 0xB4, 0x00,               # mov ah, 0
+                 0xCD, 0x1A])              # int 0x1a
+    assert pc.cpu.regs[CX] == 1
+    assert pc.cpu.regs[DX] == 2
+
+
+def test_int1a_date_is_fixed():
+    pc, _ = run([0xB4, 0x04,               # mov ah, 4
+                 0xCD, 0x1A])              # int 0x1a
+    assert pc.cpu.regs[CX] == 0x2000
+    assert pc.cpu.regs[DX] == 0x0101
+    assert not flag(pc, CF)
+
+
+def test_debugcon_port_collects_output():
+    pc, _ = run([0xB0, 0x4F,               # mov al, 'O'
+                 0xE6, 0xE9,               # out 0xe9, al
+                 0xBA, 0xE9, 0x00,         # mov dx, 0xe9
+                 0xB0, 0x4B,               # mov al, 'K'
+                 0xEE,                     # out dx, al
+                 0xE4, 0xE9])              # in al, 0xe9
+    assert bytes(pc.debugcon) == b"OK"
+    assert pc.cpu.regs[AX] & 0xFF == 0xE9
+
+
+def test_exit_port_ends_run_with_code():
+    pc, reason = run([0xB0, 0x03,          # mov al, 3
+                      0xE6, 0xF4,          # out 0xf4, al
+                      0xB0, 0x58,          # mov al, 'X'
+                      0xE6, 0xE9])         # out 0xe9, al
+    assert reason == "exit"
+    assert pc.exit_code == 3
+    assert pc.debugcon == bytearray()
+
+
+def test_instruction_limit_can_resume():
+    pc = VirtualPC()
+    pc.load_binary(bytes([0xEB, 0xFE]), ORIGIN)  # jmp $
+    assert pc.run(100) == "limit"
+    assert pc.run(100) == "limit"
+    assert pc.instructions == 200